@@ -55,11 +55,15 @@ SIMPLE_JWT = {
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+    ),
+    # Курсорная пагинация всех списков API (shop/pagination.py)
+    'DEFAULT_PAGINATION_CLASS': 'shop.pagination.KeysetCursorPagination',
+    'PAGE_SIZE': 20,
 }
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'shop.middleware.CacheMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -144,3 +148,33 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Время жизни снимка главной страницы (секунды)
+HOMEPAGE_SNAPSHOT_TTL = 60 * 5
+
+
+# Кеш со счетчиками попаданий/промахов (shop/cache_metrics.py); в продакшене -
+# shop.cache_metrics.MetricsRedisCache или MetricsPyMemcacheCache с LOCATION
+CACHES = {
+    'default': {
+        'BACKEND': 'shop.cache_metrics.MetricsLocMemCache',
+    }
+}
+
+# Строки "метод путь статус время cache пространство=попадания/промахи" от CacheMetricsMiddleware
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'shop.cache': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
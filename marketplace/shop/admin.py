@@ -265,11 +265,11 @@ class ProductAdmin(ExportToExcelMixin, admin.ModelAdmin):
     list_filter = ("category", "brand")
     search_fields = ("name", "slug")
     inlines = [ProductVariantInline]
-    readonly_fields = ("created_at", "updated_at")
+    readonly_fields = ("avg_rating", "review_count", "created_at", "updated_at")
     fieldsets = (
         (None, {
             'fields': ('name', 'slug', 'photo', 'category', 'brand', 'default_price',
-                       'avg_rating', 'description', 'manual', 'video_url',
+                       'avg_rating', 'review_count', 'description', 'manual', 'video_url',
                        'created_at', 'updated_at')
         }),
     )
@@ -0,0 +1,274 @@
+"""
+Пакетная запись списков объектов через API (POST / PATCH .../bulk/).
+
+Обычный сериализатор с many=True проверяет каждую строку отдельно: на
+каждое поле-ссылку (PrimaryKeyRelatedField) и на каждую проверку
+уникальности (UniqueValidator, UniqueTogetherValidator) уходит свой запрос.
+BulkListSerializer делает те же проверки для всего пакета: объекты по
+ссылкам загружаются одним in_bulk на поле, уникальность проверяется одним
+запросом на ограничение (и внутри самого пакета). Запись - bulk_create /
+bulk_update в одной транзакции. Ошибки возвращаются списком по строкам, как
+у ListSerializer; если ошибка есть хотя бы в одной строке, не пишется ничего.
+
+Файлы в пакете не загружаются: поле файла принимает имя уже загруженного
+файла в хранилище.
+"""
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.validators import UniqueValidator, UniqueTogetherValidator
+
+BULK_MAX_ROWS = 500
+
+
+class PreloadedQuerySet:
+    """Подменяет queryset у PrimaryKeyRelatedField: get(pk=...) ищет в заранее загруженном словаре"""
+
+    def __init__(self, model, objects):
+        self.model = model
+        self.objects = objects
+
+    def get(self, pk):
+        try:
+            key = self.model._meta.pk.to_python(pk)
+        except DjangoValidationError:
+            raise ValueError(pk)
+        try:
+            return self.objects[key]
+        except KeyError:
+            raise self.model.DoesNotExist
+
+
+class StoredFileField(serializers.FileField):
+    """Файл передается именем уже загруженного файла в хранилище модели"""
+    default_error_messages = {
+        'not_stored': 'Файл не найден в хранилище.',
+    }
+
+    def __init__(self, storage, **kwargs):
+        self.storage = storage
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str) or not data:
+            self.fail('invalid')
+        if not self.storage.exists(data):
+            self.fail('not_stored')
+        return data
+
+
+def _pk_value(value):
+    return getattr(value, 'pk', value)
+
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    ListSerializer для пакетной записи. updating=True - частичное обновление:
+    каждая строка содержит id существующего объекта.
+    """
+
+    def __init__(self, *args, updating=False, **kwargs):
+        self.updating = updating
+        super().__init__(*args, **kwargs)
+        self.model = self.child.Meta.model
+        self.row_instances = []
+        self.unique_checks = []
+        self._detach_row_queries()
+
+    def _detach_row_queries(self):
+        """Убирает из строкового сериализатора проверки, делающие запрос на строку"""
+        for name, field in list(self.child.fields.items()):
+            if field.read_only:
+                continue
+            unique = [v for v in field.validators if isinstance(v, UniqueValidator)]
+            if unique:
+                field.validators = [v for v in field.validators if not isinstance(v, UniqueValidator)]
+                self.unique_checks.append(((field.source,), name, unique[0].message))
+            if isinstance(field, serializers.FileField):
+                self.child.fields[name] = StoredFileField(
+                    self.model._meta.get_field(field.source).storage,
+                    required=field.required,
+                    allow_null=field.allow_null,
+                    **({'source': field.source} if field.source != name else {}),
+                )
+
+        validators = []
+        for validator in self.child.validators:
+            if isinstance(validator, UniqueTogetherValidator):
+                fields = tuple(validator.fields)
+                message = validator.message.format(field_names=', '.join(fields))
+                self.unique_checks.append((fields, api_settings.NON_FIELD_ERRORS_KEY, message))
+            else:
+                validators.append(validator)
+        self.child.validators = validators
+
+    def _preload_related(self, rows):
+        """Объекты по ссылкам для всех строк - один запрос на поле"""
+        for name, field in self.child.fields.items():
+            if field.read_only or not isinstance(field, serializers.PrimaryKeyRelatedField):
+                continue
+            model = field.queryset.model
+            pks = set()
+            for row in rows:
+                try:
+                    pks.add(model._meta.pk.to_python(row[name]))
+                except (KeyError, TypeError, DjangoValidationError):
+                    continue
+            pks.discard(None)
+            field.queryset = PreloadedQuerySet(model, field.queryset.in_bulk(pks))
+
+    def _load_instances(self, rows):
+        """Обновляемые объекты - одним запросом; ошибки по строкам без id или с повтором"""
+        ids = [row.get('id') if isinstance(row, dict) else None for row in rows]
+        found = self.model.objects.in_bulk([pk for pk in ids if _is_id(pk)])
+        seen = set()
+        for pk in ids:
+            instance = found.get(pk) if _is_id(pk) else None
+            if instance is None or pk in seen:
+                instance = None
+            seen.add(pk)
+            self.row_instances.append(instance)
+        self._instances = iter(self.row_instances)
+
+    def run_child_validation(self, data):
+        # Проверенные строки копятся, чтобы уникальность проверить и при ошибках в других строках
+        self._rows.append(None)
+        if self.updating:
+            self.child.instance = next(self._instances)
+            if self.child.instance is None:
+                raise serializers.ValidationError({'id': ['Объект не найден или повторяется в пакете.']})
+        self._rows[-1] = super().run_child_validation(data)
+        return self._rows[-1]
+
+    def to_internal_value(self, data):
+        self._rows = []
+        if isinstance(data, list):
+            rows = [row for row in data if isinstance(row, dict)]
+            self._preload_related(rows)
+            if self.updating:
+                self._load_instances(data)
+        try:
+            validated = super().to_internal_value(data)
+        except serializers.ValidationError as exc:
+            if not isinstance(exc.detail, list):
+                raise
+            errors = exc.detail
+        else:
+            errors = [{} for _ in validated]
+        self._check_unique(errors)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return validated
+
+    def _unique_value(self, index, attrs, fields):
+        instance = self.row_instances[index] if self.updating else None
+        value = []
+        for name in fields:
+            if name in attrs:
+                value.append(_pk_value(attrs[name]))
+            elif instance is not None:
+                value.append(getattr(instance, self.model._meta.get_field(name).attname))
+            else:
+                value.append(None)
+        return tuple(value)
+
+    def _check_unique(self, errors):
+        """Дописывает в errors (по строкам) нарушения уникальности внутри пакета и с базой"""
+        for fields, key, message in self.unique_checks:
+            rows = {}
+            for index, attrs in enumerate(self._rows):
+                if attrs is None:
+                    continue
+                value = self._unique_value(index, attrs, fields)
+                if None in value:
+                    continue
+                if value in rows:
+                    errors[index].setdefault(key, []).append(message)
+                else:
+                    rows[value] = index
+            if not rows:
+                continue
+
+            # Одно условие IN на поле дает надмножество, точное совпадение - по кортежу
+            lookup = {f'{name}__in': {value[i] for value in rows} for i, name in enumerate(fields)}
+            for pk, *value in self.model.objects.filter(**lookup).values_list('pk', *fields):
+                index = rows.get(tuple(value))
+                if index is None:
+                    continue
+                instance = self.row_instances[index] if self.updating else None
+                if instance is None or instance.pk != pk:
+                    errors[index].setdefault(key, []).append(message)
+
+    def create(self, validated_data):
+        objects = [self.model(**attrs) for attrs in validated_data]
+        self.model.objects.bulk_create(objects)
+        return objects
+
+    def update(self, instances, validated_data):
+        # Исходные значения ссылок - для сброса кешей прежних владельцев
+        foreign_keys = [field for field in self.model._meta.concrete_fields if field.is_relation]
+        self.previous = {
+            instance.pk: {field.name: getattr(instance, field.attname) for field in foreign_keys}
+            for instance in instances
+        }
+        # bulk_update не вызывает pre_save, поэтому auto_now выставляется вручную
+        now = timezone.now()
+        fields = {'updated_at'}
+        for instance, attrs in zip(instances, validated_data):
+            for name, value in attrs.items():
+                setattr(instance, name, value)
+            instance.updated_at = now
+            fields.update(attrs)
+        self.model.objects.bulk_update(instances, sorted(fields))
+        return instances
+
+    def save(self, **kwargs):
+        if self.updating:
+            self.instance = self.row_instances
+        return super().save(**kwargs)
+
+
+class BulkWriteMixin:
+    """
+    POST .../bulk/ - создание, PATCH .../bulk/ - частичное обновление списка
+    объектов. Побочные эффекты, которые для одиночной записи делают сигналы,
+    выполняет bulk_saved() представления - один раз на пакет.
+    """
+    bulk_max_rows = BULK_MAX_ROWS
+
+    def bulk_saved(self, objects, created, previous):
+        """previous - {pk: {поле-ссылка: прежний id}} для обновленных объектов"""
+
+    @action(detail=False, methods=['post', 'patch'])
+    def bulk(self, request):
+        updating = request.method == 'PATCH'
+        serializer = BulkListSerializer(
+            child=self.get_serializer_class()(),
+            data=request.data,
+            partial=updating,
+            updating=updating,
+            allow_empty=False,
+            max_length=self.bulk_max_rows,
+            context=self.get_serializer_context(),
+        )
+        serializer.is_valid(raise_exception=True)
+        try:
+            with transaction.atomic():
+                objects = serializer.save()
+                self.bulk_saved(objects, not updating, getattr(serializer, 'previous', {}))
+        except IntegrityError:
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: ['Данные изменились во время записи, повторите запрос.']
+            })
+        return Response(
+            self.get_serializer(objects, many=True).data,
+            status=status.HTTP_200_OK if updating else status.HTTP_201_CREATED,
+        )
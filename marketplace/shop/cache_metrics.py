@@ -0,0 +1,232 @@
+"""
+Метрики кеша по пространствам имен.
+
+Пространство имен - префикс ключа до первого двоеточия (catalog, homepage,
+facets, fragment, variants, sampling, typeahead) или имя фрагмента для
+{% cache %} (template.product_reviews). Попадания, промахи, записи и
+удаления считает сам бэкенд кеша (Metrics*Cache ниже, подключается в
+CACHES), время пересчета - модули кеширования через recompute().
+Вытеснения - это явные удаления и сбросы версий, а для LocMemCache еще и
+записи, удаленные при переполнении (_cull).
+
+Счетчики копятся в памяти процесса и раз в FLUSH_INTERVAL секунд
+(из CacheMetricsMiddleware) складываются в общий кеш через incr, так что
+snapshot() показывает сумму по всем процессам.
+"""
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.memcached import PyMemcacheCache
+from django.core.cache.backends.redis import RedisCache
+
+EVENTS = ('hits', 'misses', 'sets', 'evictions', 'recomputes', 'recompute_ms')
+
+FLUSH_INTERVAL = 10
+
+_PREFIX = 'metrics'
+_NAMESPACES_KEY = f'{_PREFIX}:namespaces'
+_MISSING = object()
+
+
+def _counters():
+    return defaultdict(lambda: dict.fromkeys(EVENTS, 0))
+
+
+_lock = threading.Lock()
+_pending = _counters()
+_totals = _counters()
+_last_flush = time.monotonic()
+# depth - вложенные вызовы бэкенда (get_many через get), request - счетчики текущего запроса
+_local = threading.local()
+
+
+def namespace(key):
+    if key.startswith('template.cache.'):
+        return 'template.' + key.split('.')[2]
+    return key.split(':', 1)[0]
+
+
+def record(name, event, count=1):
+    if name == _PREFIX or not count:
+        return
+    with _lock:
+        _pending[name][event] += count
+        _totals[name][event] += count
+    request_counters = getattr(_local, 'request', None)
+    if request_counters is not None:
+        request_counters[name][event] += count
+
+
+@contextmanager
+def recompute(name):
+    """Учитывает пересчет значения (например, при промахе) и его длительность"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, 'recomputes')
+        record(name, 'recompute_ms', round((time.perf_counter() - started) * 1000))
+
+
+def _key(name, event):
+    return f'{_PREFIX}:{name}:{event}'
+
+
+def flush(force=False):
+    """Переносит накопленные в процессе счетчики в общий кеш"""
+    global _pending, _last_flush
+    with _lock:
+        if not force and time.monotonic() - _last_flush < FLUSH_INTERVAL:
+            return
+        pending, _pending = _pending, _counters()
+        _last_flush = time.monotonic()
+    if not pending:
+        return
+
+    known = cache.get(_NAMESPACES_KEY) or []
+    if not set(pending) <= set(known):
+        cache.set(_NAMESPACES_KEY, sorted(set(known) | set(pending)), None)
+    for name, counts in pending.items():
+        for event, count in counts.items():
+            if count and not cache.add(_key(name, event), count, None):
+                try:
+                    cache.incr(_key(name, event), count)
+                except ValueError:
+                    cache.set(_key(name, event), count, None)
+
+
+def _summary(counts):
+    lookups = counts['hits'] + counts['misses']
+    return dict(
+        counts,
+        hit_ratio=round(counts['hits'] / lookups, 4) if lookups else None,
+        avg_recompute_ms=round(counts['recompute_ms'] / counts['recomputes'], 1) if counts['recomputes'] else None,
+    )
+
+
+def snapshot():
+    """Счетчики всех процессов: {пространство имен: {событие: значение, hit_ratio, ...}}"""
+    flush(force=True)
+    names = cache.get(_NAMESPACES_KEY) or []
+    values = cache.get_many([_key(name, event) for name in names for event in EVENTS])
+    return {
+        name: _summary({event: values.get(_key(name, event), 0) for event in EVENTS})
+        for name in names
+    }
+
+
+def local_totals():
+    """Счетчики текущего процесса с момента запуска"""
+    with _lock:
+        return {name: dict(counts) for name, counts in _totals.items()}
+
+
+def reset():
+    global _pending
+    names = cache.get(_NAMESPACES_KEY) or []
+    cache.delete_many([_key(name, event) for name in names for event in EVENTS] + [_NAMESPACES_KEY])
+    with _lock:
+        _pending = _counters()
+
+
+def start_request():
+    """Начинает сбор счетчиков одного запроса (для строки в логе)"""
+    _local.request = _counters()
+
+
+def finish_request():
+    counters = getattr(_local, 'request', None)
+    _local.request = None
+    return counters or {}
+
+
+class MetricsMixin:
+    """Подмешивается к бэкенду кеша и считает операции по пространствам имен"""
+
+    @contextmanager
+    def _nested(self):
+        # Базовые get_many / set_many / delete_many (и add файлового кеша) вызывают
+        # get / set / delete - такие вложенные операции не считаются дважды
+        _local.depth = getattr(_local, 'depth', 0) + 1
+        try:
+            yield
+        finally:
+            _local.depth -= 1
+
+    def _record(self, key, event):
+        if not getattr(_local, 'depth', 0):
+            record(namespace(key), event)
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version=version)
+        self._record(key, 'misses' if value is _MISSING else 'hits')
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        with self._nested():
+            found = super().get_many(keys, version=version)
+        for key in keys:
+            self._record(key, 'hits' if key in found else 'misses')
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        result = super().set(key, value, timeout=timeout, version=version)
+        self._record(key, 'sets')
+        return result
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._nested():
+            failed = super().set_many(data, timeout=timeout, version=version)
+        for key in data:
+            if key not in failed:
+                self._record(key, 'sets')
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._nested():
+            added = super().add(key, value, timeout=timeout, version=version)
+        if added:
+            self._record(key, 'sets')
+        return added
+
+    def delete(self, key, version=None):
+        deleted = super().delete(key, version=version)
+        if deleted:
+            self._record(key, 'evictions')
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        with self._nested():
+            result = super().delete_many(keys, version=version)
+        for key in keys:
+            self._record(key, 'evictions')
+        return result
+
+
+class MetricsLocMemCache(MetricsMixin, LocMemCache):
+    def _cull(self):
+        before = set(self._cache)
+        super()._cull()
+        for made_key in before - set(self._cache):
+            # Ключ вида "префикс:версия:ключ" (стандартная KEY_FUNCTION)
+            record(namespace(made_key.split(':', 2)[-1]), 'evictions')
+
+
+class MetricsFileBasedCache(MetricsMixin, FileBasedCache):
+    pass
+
+
+class MetricsRedisCache(MetricsMixin, RedisCache):
+    pass
+
+
+class MetricsPyMemcacheCache(MetricsMixin, PyMemcacheCache):
+    pass
@@ -0,0 +1,148 @@
+"""
+Поддержка денормализованных карточек товаров (ProductCard).
+
+Карточка пересчитывается точечно: при изменении товара - целиком, при
+изменении вариантов - только цены и цвета, при изменении отзывов - только
+счетчик и средняя оценка, при переименовании категории/бренда - одно UPDATE по всем
+карточкам этой категории/бренда, при переименовании цвета - одно UPDATE
+(bulk_update, на больших каталогах - по пачке) цветов всех карточек с этим цветом.
+"""
+from django.db.models import Min, Max
+
+from .models import Product, ProductVariant, ProductCard
+
+CARD_FIELDS = [
+    'name', 'slug', 'photo', 'description',
+    'category', 'category_name', 'category_slug',
+    'brand', 'brand_name',
+    'default_price', 'min_price', 'max_price',
+    'review_count', 'avg_rating', 'colors', 'created_at',
+]
+
+
+def _variant_colors(product_ids):
+    """product_ids - список id или подзапрос"""
+    colors = {}
+    for product_id, name, color in (
+        ProductVariant.objects.filter(product_id__in=product_ids)
+        .order_by('product_id', 'color_id')
+        .values_list('product_id', 'color__name', 'color__color')
+        .distinct()
+    ):
+        colors.setdefault(product_id, []).append({'name': name, 'color': color})
+    return colors
+
+
+def _variant_summaries(product_ids):
+    prices = {
+        row['product_id']: (row['min_price'], row['max_price'])
+        for row in ProductVariant.objects.filter(product_id__in=product_ids)
+        .order_by()
+        .values('product_id')
+        .annotate(min_price=Min('price'), max_price=Max('price'))
+    }
+    return prices, _variant_colors(product_ids)
+
+
+def refresh_cards(product_ids):
+    """Полный пересчет карточек для набора товаров (константное число запросов)"""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return 0
+
+    products = Product.objects.filter(pk__in=product_ids).select_related('category', 'brand')
+    prices, colors = _variant_summaries(product_ids)
+
+    cards = []
+    for product in products:
+        min_price, max_price = prices.get(product.pk, (None, None))
+        cards.append(ProductCard(
+            product=product,
+            name=product.name,
+            slug=product.slug,
+            photo=product.photo.name,
+            description=product.description,
+            category=product.category,
+            category_name=product.category.name,
+            category_slug=product.category.slug,
+            brand=product.brand,
+            brand_name=product.brand.name,
+            default_price=product.default_price,
+            min_price=min_price,
+            max_price=max_price,
+            review_count=product.review_count,
+            avg_rating=product.avg_rating,
+            colors=colors.get(product.pk, []),
+            created_at=product.created_at,
+        ))
+    ProductCard.objects.bulk_create(
+        cards,
+        update_conflicts=True,
+        unique_fields=['product'],
+        update_fields=CARD_FIELDS,
+    )
+    return len(cards)
+
+
+def refresh_variant_summary(product_id):
+    prices, colors = _variant_summaries([product_id])
+    min_price, max_price = prices.get(product_id, (None, None))
+    ProductCard.objects.filter(pk=product_id).update(
+        min_price=min_price,
+        max_price=max_price,
+        colors=colors.get(product_id, []),
+    )
+
+
+def refresh_variant_summaries(product_ids):
+    """Цены и цвета для набора товаров (пакетная запись вариантов)"""
+    product_ids = list(product_ids)
+    prices, colors = _variant_summaries(product_ids)
+    cards = []
+    for product_id in product_ids:
+        min_price, max_price = prices.get(product_id, (None, None))
+        cards.append(ProductCard(
+            pk=product_id, min_price=min_price, max_price=max_price, colors=colors.get(product_id, []),
+        ))
+    ProductCard.objects.bulk_update(cards, ['min_price', 'max_price', 'colors'])
+
+
+def refresh_review_summary(product_id):
+    # Агрегаты отзывов уже посчитаны на товаре (см. shop/ratings.py)
+    product = Product.objects.filter(pk=product_id).values('review_count', 'avg_rating').first()
+    if product:
+        ProductCard.objects.filter(pk=product_id).update(**product)
+
+
+def rename_category(category):
+    ProductCard.objects.filter(category=category).update(
+        category_name=category.name,
+        category_slug=category.slug,
+    )
+
+
+def rename_brand(brand):
+    ProductCard.objects.filter(brand=brand).update(brand_name=brand.name)
+
+
+def rename_color(color):
+    # Цвета всех затронутых товаров одним запросом (id товаров - подзапросом) и одно UPDATE
+    colors = _variant_colors(ProductVariant.objects.filter(color=color).values('product_id'))
+    ProductCard.objects.bulk_update(
+        [ProductCard(pk=product_id, colors=product_colors) for product_id, product_colors in colors.items()],
+        ['colors'],
+    )
+
+
+def rebuild(chunk_size=1000):
+    """Пересоздает все карточки, возвращает их количество"""
+    ids = Product.objects.order_by('pk').values_list('pk', flat=True)
+    total = 0
+    chunk = []
+    for pk in ids.iterator(chunk_size=chunk_size):
+        chunk.append(pk)
+        if len(chunk) >= chunk_size:
+            total += refresh_cards(chunk)
+            chunk = []
+    total += refresh_cards(chunk)
+    return total
@@ -0,0 +1,69 @@
+"""
+Версионированный кеш страниц и выборок каталога.
+
+У каждой категории, бренда и товара есть своя версия в кеше
+(catalog:version:<модель>:<id>), а у каждой модели - общая версия списка
+(catalog:version:<модель>:*). Закешированное значение хранится под ключом,
+в который входят версии всех его зависимостей, поэтому сигналы не ищут и
+не удаляют старые записи: они только увеличивают версии (bump), и
+следующий запрос просто не находит устаревший ключ.
+
+Если ключ версии вытеснен из кеша, он заводится заново со значением от
+текущего времени - так новая версия не совпадет ни с одной из прежних.
+"""
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+
+from . import cache_metrics
+
+CATALOG_CACHE_TTL = 60 * 60
+
+_MISSING = object()
+
+
+def _version_key(model_name, pk=None):
+    return f'catalog:version:{model_name}:{"*" if pk is None else pk}'
+
+
+def get_versions(dependencies):
+    """Текущие версии для списка зависимостей [(модель, id или None), ...]"""
+    keys = [_version_key(model_name, pk) for model_name, pk in dependencies]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump(model_name, *pks):
+    """Инвалидирует объекты модели с указанными id и все списки этой модели"""
+    for pk in (*pks, None):
+        try:
+            cache.incr(_version_key(model_name, pk))
+            cache_metrics.record('catalog', 'evictions')
+        except ValueError:
+            # Версии нет - значит, и записей с ней в кеше быть не может
+            pass
+
+
+def cache_key(name, dependencies, params=None):
+    payload = json.dumps([params or {}, get_versions(dependencies)], sort_keys=True, default=str)
+    return f'catalog:{name}:{hashlib.md5(payload.encode()).hexdigest()}'
+
+
+def cached(name, dependencies, builder, params=None, ttl=CATALOG_CACHE_TTL):
+    """
+    Возвращает закешированное значение builder() для текущих версий зависимостей.
+    params - параметры запроса, от которых зависит значение (фильтры, курсор).
+    """
+    key = cache_key(name, dependencies, params)
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        with cache_metrics.recompute('catalog'):
+            value = builder()
+        cache.set(key, value, ttl)
+    return value
@@ -0,0 +1,108 @@
+"""
+Условные GET-запросы (ETag / Last-Modified) по TimeStampedModel.updated_at.
+
+Валидаторы страницы считаются без рендеринга: ETag - хеш от id и
+updated_at показанных объектов (или от max(updated_at) и количества строк
+для списков), Last-Modified - наибольший updated_at. Если клиент прислал
+совпадающие If-None-Match / If-Modified-Since, отдается 304 без шаблона и
+сериализации - так же, как в django.views.decorators.http.condition.
+"""
+import hashlib
+import json
+
+from django.db.models import Max, Count
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+
+class Validators:
+    def __init__(self, parts, last_modified):
+        payload = json.dumps(parts, sort_keys=True, default=str)
+        self.etag = quote_etag(hashlib.md5(payload.encode()).hexdigest())
+        self.last_modified = int(last_modified.timestamp()) if last_modified else None
+
+
+def queryset_stats(queryset):
+    """max(updated_at) и количество строк - меняются при добавлении, изменении и удалении"""
+    return queryset.order_by().aggregate(last_modified=Max('updated_at'), count=Count('pk'))
+
+
+def get_validators(objects=(), stats=None, extra=(), related=()):
+    """
+    objects - показанные объекты (учитываются модель, id и updated_at каждого),
+    stats - результат queryset_stats для списка, related - queryset_stats связанных
+    объектов, вложенных в ответ, extra - прочее, от чего зависит ответ.
+    """
+    objects = [obj for obj in objects if obj is not None]
+    parts = sorted({
+        (obj._meta.label_lower, obj.pk, obj.updated_at.isoformat()) for obj in objects
+    })
+    modified = [obj.updated_at for obj in objects]
+    for item in (stats, *related):
+        if item and item['last_modified']:
+            modified.append(item['last_modified'])
+    return Validators([parts, stats, list(related), list(extra)], max(modified, default=None))
+
+
+def respond(request, validators, render):
+    """304, если у клиента актуальная версия, иначе render() с заголовками ETag / Last-Modified"""
+    response = get_conditional_response(
+        request,
+        etag=validators.etag,
+        last_modified=validators.last_modified,
+    )
+    if response is None:
+        response = render()
+    if request.method in ('GET', 'HEAD'):
+        if validators.last_modified and not response.has_header('Last-Modified'):
+            response.headers['Last-Modified'] = http_date(validators.last_modified)
+        response.headers.setdefault('ETag', validators.etag)
+    return response
+
+
+def viewer(request):
+    # Разметка зависит от пользователя (кнопки администратора, избранное)
+    return request.user.pk if request.user.is_authenticated else None
+
+
+class ConditionalGetMixin:
+    """ETag / Last-Modified для list и retrieve у ModelViewSet над TimeStampedModel"""
+
+    def _render_format(self, request):
+        return request.accepted_renderer.format if getattr(request, 'accepted_renderer', None) else None
+
+    def get_related_objects(self, instance):
+        """Связанные объекты, вложенные в представление instance"""
+        return ()
+
+    def get_related_stats(self, queryset):
+        """queryset_stats связанных объектов, вложенных в представления списка"""
+        return ()
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        extra = (request.get_full_path(), self._render_format(request), viewer(request))
+        if getattr(self.paginator, 'validates_by_page', False):
+            # Курсорная страница не сдвигается от изменений вне ее - хватает
+            # самих показанных объектов и ссылок, без агрегата по всей таблице
+            page = self.paginate_queryset(queryset)
+            validators = get_validators(
+                [*page, *(related for obj in page for related in self.get_related_objects(obj))],
+                extra=(*extra, self.paginator.get_next_link(), self.paginator.get_previous_link()),
+            )
+        else:
+            validators = get_validators(
+                stats=queryset_stats(queryset),
+                related=self.get_related_stats(queryset),
+                extra=extra,
+            )
+        return respond(request, validators, lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        validators = get_validators(
+            [instance, *self.get_related_objects(instance)],
+            extra=(request.get_full_path(), self._render_format(request)),
+        )
+        return respond(request, validators, lambda: Response(self.get_serializer(instance).data))
@@ -0,0 +1,96 @@
+"""
+Счетчики фасетов (категории, бренды, диапазоны цен) для каталога.
+
+Все счетчики считаются одним GROUP BY-запросом по (категория, бренд,
+ценовой диапазон), дальше суммируются в Python. Фасеты "дизъюнктивные":
+счетчики категорий учитывают все фильтры, кроме выбранной категории
+(иначе все остальные категории показывали бы 0), аналогично для брендов.
+Результат кешируется по нормализованному набору фильтров.
+"""
+import hashlib
+import json
+
+from django.db.models import Case, When, Value, IntegerField, Count
+
+from . import singleflight
+
+# Границы ценовых диапазонов: (от, до), None - без ограничения
+PRICE_BUCKETS = [
+    (None, 1000),
+    (1000, 3000),
+    (3000, 5000),
+    (5000, 10000),
+    (10000, None),
+]
+
+FACETS_CACHE_TTL = 60 * 5
+
+
+def _price_bucket():
+    whens = [
+        When(default_price__lt=upper, then=Value(position))
+        for position, (lower, upper) in enumerate(PRICE_BUCKETS)
+        if upper is not None
+    ]
+    return Case(*whens, default=Value(len(PRICE_BUCKETS) - 1), output_field=IntegerField())
+
+
+def compute_facets(queryset, category_id=None, brand_id=None):
+    """
+    queryset - карточки товаров (ProductCard) со всеми фильтрами, кроме категории и бренда.
+    category_id / brand_id - выбранные значения этих фильтров (или None).
+    """
+    rows = (
+        queryset
+        .order_by()
+        .annotate(price_bucket=_price_bucket())
+        .values('category_id', 'category_name', 'brand_id', 'brand_name', 'price_bucket')
+        .annotate(count=Count('pk'))
+    )
+
+    categories = {}
+    brands = {}
+    prices = [0] * len(PRICE_BUCKETS)
+    total = 0
+    for row in rows:
+        in_category = category_id is None or row['category_id'] == category_id
+        in_brand = brand_id is None or row['brand_id'] == brand_id
+        if in_brand:
+            key = (row['category_id'], row['category_name'])
+            categories[key] = categories.get(key, 0) + row['count']
+        if in_category:
+            key = (row['brand_id'], row['brand_name'])
+            brands[key] = brands.get(key, 0) + row['count']
+        if in_category and in_brand:
+            prices[row['price_bucket']] += row['count']
+            total += row['count']
+
+    def _sorted(counts):
+        return [
+            {'id': pk, 'name': name, 'count': count}
+            for (pk, name), count in sorted(counts.items(), key=lambda item: (-item[1], item[0][1]))
+        ]
+
+    return {
+        'categories': _sorted(categories),
+        'brands': _sorted(brands),
+        'prices': [
+            {'min': lower, 'max': upper, 'count': count}
+            for (lower, upper), count in zip(PRICE_BUCKETS, prices)
+        ],
+        'total': total,
+    }
+
+
+def cache_key(filters):
+    """Ключ кеша по нормализованным фильтрам (пустые значения отбрасываются)"""
+    normalized = {name: str(value) for name, value in filters.items() if value not in (None, '')}
+    digest = hashlib.md5(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+    return f'facets:{digest}'
+
+
+def get_facets(queryset, filters, category_id=None, brand_id=None):
+    key = cache_key(dict(filters, category=category_id, brand=brand_id))
+    return singleflight.get_or_compute(
+        key, lambda: compute_facets(queryset, category_id, brand_id), FACETS_CACHE_TTL
+    )
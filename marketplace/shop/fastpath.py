@@ -0,0 +1,207 @@
+"""
+Быстрое чтение списков API без экземпляров моделей и ModelSerializer.
+
+Для list в формате JSON queryset превращается в values_list() ровно с
+нужными колонками, а строки - в легкие кортежи (Row), у которых, как у
+модели, есть pk, updated_at и _meta: этого достаточно курсорной пагинации,
+ETag (shop/conditional.py) и кешу фрагментов (shop/fragments.py).
+
+Представление строки собирается списком заранее подготовленных
+преобразователей - to_representation тех же полей сериализатора, что и на
+обычном пути, поэтому JSON совпадает с ответом сериализатора байт в байт
+(это проверяет shop/tests.py). Если в сериализаторе есть поле, которое так
+не собрать (вложенный сериализатор, SerializerMethodField, source через
+точку), используется обычный путь.
+"""
+from collections import namedtuple
+from functools import lru_cache, partial
+from operator import attrgetter
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import FileField
+from django.db.models.query import ValuesListIterable
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+# Ключ контекста сериализатора с функцией представления строки
+CONTEXT_KEY = 'row_representation'
+
+
+class RowIterable(ValuesListIterable):
+    row_class = None
+
+    def __iter__(self):
+        make = self.row_class._make
+        for values in super().__iter__():
+            yield make(values)
+
+
+@lru_cache(maxsize=None)
+def row_iterable(model, columns):
+    """Класс итерации values_list(*columns), отдающий Row вместо кортежей"""
+    base = namedtuple(f'{model.__name__}Row', columns)
+    row_class = type(base.__name__, (base,), {
+        '__slots__': (),
+        '_meta': model._meta,
+        'pk': property(attrgetter(model._meta.pk.attname)),
+    })
+    return type(f'{model.__name__}RowIterable', (RowIterable,), {'row_class': row_class})
+
+
+def _plain_converter(field, request):
+    return field.to_representation
+
+
+def _file_converter(field, storage, request):
+    # Как serializers.FileField.to_representation, но по имени файла из БД
+    use_url = getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL)
+
+    def convert(name):
+        if not name:
+            return None
+        if not use_url:
+            return name
+        url = storage.url(name)
+        return request.build_absolute_uri(url) if request is not None else url
+    return convert
+
+
+def _datetime_converter(field, request):
+    # DateTimeField.to_representation, но текущая зона определяется один раз на запрос
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+        return field.to_representation
+
+    def convert(value):
+        if not timezone.is_aware(value):
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+
+def _converter(model, field):
+    """
+    (колонка, фабрика преобразователя по запросу или None - значение как есть);
+    None - поле так не собирается
+    """
+    if field.source == '*' or '.' in field.source:
+        return None
+    try:
+        model_field = model._meta.get_field(field.source)
+    except FieldDoesNotExist:
+        return None
+    if not model_field.concrete or model_field.many_to_many:
+        return None
+
+    if isinstance(field, serializers.PrimaryKeyRelatedField):
+        if field.pk_field is not None:
+            return model_field.attname, partial(_plain_converter, field.pk_field)
+        return model_field.attname, None
+    if isinstance(field, (serializers.RelatedField, serializers.ManyRelatedField, serializers.BaseSerializer)):
+        return None
+    if isinstance(field, serializers.FileField):
+        if not isinstance(model_field, FileField):
+            return None
+        return model_field.attname, partial(_file_converter, field, model_field.storage)
+    if isinstance(field, serializers.DateTimeField):
+        return model_field.attname, partial(_datetime_converter, field)
+    return model_field.attname, partial(_plain_converter, field)
+
+
+@lru_cache(maxsize=256)
+def _compile(serializer_class, fields, expand, extra_columns):
+    serializer = serializer_class(context={'fields': fields, 'expand': expand})
+    model = serializer.Meta.model
+    converters = []
+    for field in serializer._readable_fields:
+        converter = _converter(model, field)
+        if converter is None:
+            return None
+        converters.append((field.field_name, *converter))
+
+    columns = tuple(dict.fromkeys([
+        model._meta.pk.attname, 'updated_at', *extra_columns, *(column for _, column, _ in converters),
+    ]))
+    return columns, [(name, columns.index(column), factory) for name, column, factory in converters]
+
+
+def compile_serializer(serializer_class, context, extra_columns=()):
+    """
+    (columns, represent) для сериализатора или None, если он так не собирается.
+    Поля сериализатора зависят только от ?fields= / ?expand= контекста (как и
+    ключ фрагментов), поэтому разбор полей кешируется; к запросу привязываются
+    лишь URL файлов и часовой пояс. extra_columns - колонки, нужные помимо
+    полей (например, ключ курсора).
+    """
+    compiled = _compile(
+        serializer_class, tuple(context.get('fields') or ()), tuple(context.get('expand') or ()),
+        tuple(extra_columns),
+    )
+    if compiled is None:
+        return None
+    columns, converters = compiled
+    request = context.get('request')
+    fields = [
+        (name, index, factory(request) if factory is not None else None) for name, index, factory in converters
+    ]
+
+    def represent(row):
+        data = {}
+        for name, index, convert in fields:
+            value = row[index]
+            # Как Serializer.to_representation: None не передается в поле
+            if value is None or convert is None:
+                data[name] = value
+            else:
+                data[name] = convert(value)
+        return data
+    return columns, represent
+
+
+class FastListMixin:
+    """
+    list() через values_list() для ModelViewSet с FragmentListMixin.
+    Отключается атрибутом fast_list = False (или as_view(fast_list=False)).
+    """
+    fast_list = True
+
+    def get_fast_list(self):
+        """(columns, represent) для текущего запроса или None - обычный путь"""
+        if not hasattr(self, '_fast_list'):
+            self._fast_list = None
+            request = getattr(self, 'request', None)
+            renderer = getattr(request, 'accepted_renderer', None)
+            if self.fast_list and self.action == 'list' and renderer is not None and renderer.format == 'json':
+                serializer_class = self.get_serializer_class()
+                self._fast_list = compile_serializer(
+                    serializer_class, super().get_serializer_context(),
+                    self._cursor_columns(serializer_class.Meta.model),
+                )
+        return self._fast_list
+
+    def _cursor_columns(self, model):
+        # Курсор строится по значению поля сортировки (shop/pagination.py)
+        get_ordering = getattr(self.paginator, 'get_ordering', None)
+        if get_ordering is None:
+            return ()
+        return (model._meta.get_field(get_ordering(self.request, self).lstrip('-')).attname,)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fast_list = self.get_fast_list()
+        if fast_list is None:
+            return queryset
+        columns = fast_list[0]
+        queryset = queryset.values_list(*columns)
+        queryset._iterable_class = row_iterable(queryset.model, columns)
+        return queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        fast_list = self.get_fast_list()
+        if fast_list is not None:
+            context[CONTEXT_KEY] = fast_list[1]
+        return context
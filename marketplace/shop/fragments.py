@@ -0,0 +1,94 @@
+"""
+Кеш готовых JSON-фрагментов сериализованных объектов для списков API.
+
+Каждый объект сериализуется и рендерится в JSON один раз, фрагмент лежит
+в кеше под ключом (сериализатор, модель, pk, updated_at). Ответ списка
+собирается склейкой фрагментов, а объекты, которых нет в кеше,
+сериализуются одной пачкой (many=True). Измененный объект получает новый
+updated_at и, значит, новый ключ - старый фрагмент просто истекает.
+
+Вместо объектов могут прийти строки values() (shop/fastpath.py): тогда
+представление строит функция из контекста, а не сериализатор.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from . import cache_metrics, fastpath
+
+FRAGMENT_TTL = 60 * 60 * 24
+
+# Заглушка на месте списка результатов в обертке пагинатора
+_PLACEHOLDER = '\x00fragments\x00'
+
+
+def _key(prefix, obj, expand=()):
+    key = f'{prefix}:{obj._meta.label_lower}:{obj.pk}:{obj.updated_at.isoformat()}'
+    # Развернутые связанные объекты (?expand=, shop/sparse.py) входят во фрагмент целиком
+    for name in expand:
+        related = getattr(obj, name)
+        key += f':{related.updated_at.isoformat() if related is not None else ""}'
+    return key
+
+
+def _prefix(serializer_class, context):
+    # URL файлов в представлении абсолютные, поэтому фрагмент зависит от хоста
+    request = context.get('request')
+    origin = request.build_absolute_uri('/') if request is not None else ''
+    shape = [context.get('fields') or (), context.get('expand') or ()]
+    digest = hashlib.md5(
+        f'{serializer_class.__module__}.{serializer_class.__qualname__}:{origin}:{shape}'.encode()
+    ).hexdigest()
+    return f'fragment:{digest}'
+
+
+def get_fragments(serializer_class, objects, context, renderer_class=JSONRenderer):
+    """JSON-фрагменты (bytes) для объектов в том же порядке"""
+    objects = list(objects)
+    prefix = _prefix(serializer_class, context)
+    expand = context.get('expand') or ()
+    keys = [_key(prefix, obj, expand) for obj in objects]
+    fragments = cache.get_many(keys)
+
+    missing = [(key, obj) for key, obj in zip(keys, objects) if key not in fragments]
+    if missing:
+        with cache_metrics.recompute('fragment'):
+            represent = context.get(fastpath.CONTEXT_KEY)
+            if represent is not None:
+                data = [represent(obj) for _, obj in missing]
+            else:
+                data = serializer_class([obj for _, obj in missing], many=True, context=context).data
+            renderer = renderer_class()
+            rendered = {key: renderer.render(item) for (key, _), item in zip(missing, data)}
+        cache.set_many(rendered, FRAGMENT_TTL)
+        fragments.update(rendered)
+    return [fragments[key] for key in keys]
+
+
+def join(fragments):
+    return b'[' + b','.join(fragments) + b']'
+
+
+class FragmentListMixin:
+    """list() для ModelViewSet, собирающий JSON-ответ из кешированных фрагментов"""
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+
+        # Рендерер представления (например, shop.renderers.FastJSONRenderer), без отступов
+        renderer_class = type(request.accepted_renderer)
+        renderer = renderer_class()
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        objects = page if page is not None else queryset
+        body = join(get_fragments(
+            self.get_serializer_class(), objects, self.get_serializer_context(), renderer_class
+        ))
+
+        if page is not None:
+            envelope = renderer.render(self.get_paginated_response(_PLACEHOLDER).data)
+            body = envelope.replace(renderer.render(_PLACEHOLDER), body, 1)
+        return HttpResponse(body, content_type='application/json')
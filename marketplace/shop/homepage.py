@@ -0,0 +1,104 @@
+"""
+Снимок данных главной страницы.
+
+Все агрегаты главной (счетчики, популярные категории/товары/бренды,
+товар дня) собираются одним "обновлятелем" и кладутся в кеш на
+HOMEPAGE_SNAPSHOT_TTL секунд. Представление index только читает снимок,
+поэтому при прогретом кеше не делает запросов к БД.
+"""
+from django.conf import settings
+from django.db.models import Count, Avg, Q
+from django.utils import timezone
+
+from .models import Category, Brand, ProductCard
+from . import singleflight
+from .sampling import RandomPool
+
+SNAPSHOT_KEY = 'homepage:snapshot'
+
+# Пул товаров без отзывов для блока случайных товаров (обновляется сигналами)
+REVIEWLESS_PRODUCTS = RandomPool(
+    'reviewless_products',
+    ProductCard.objects.filter(review_count=0),
+    fields=('name', 'slug', 'photo'),
+)
+
+
+def get_ttl():
+    return getattr(settings, 'HOMEPAGE_SNAPSHOT_TTL', 60 * 5)
+
+
+def _product(card):
+    return {
+        'name': card['name'],
+        'slug': card['slug'],
+        'photo': card['photo'],
+        'description': card['description'],
+        'avg_rating': card['avg_rating'],
+    }
+
+
+def build_snapshot():
+    card_fields = ('name', 'slug', 'photo', 'description', 'avg_rating')
+
+    categories = list(
+        Category.objects.annotate(product_count=Count('product'))
+        .order_by('-product_count')
+        .values('id', 'name', 'slug', 'photo', 'product_count')[:12]
+    )
+    top_brands = list(
+        Brand.objects.annotate(product_count=Count('product'))
+        .filter(product_count__gt=0)
+        .order_by('-product_count')
+        .values('id', 'name', 'photo', 'product_count')[:6]
+    )
+    popular_products = [
+        _product(card) for card in
+        ProductCard.objects.filter(avg_rating__gt=3)
+        .order_by('-avg_rating')
+        .values(*card_fields)[:8]
+    ]
+    featured_product = (
+        ProductCard.objects.filter(
+            Q(name__icontains='новинка') | Q(name__icontains='хит'),
+            avg_rating__gte=4
+        )
+        .order_by('-avg_rating', '-created_at')
+        .values(*card_fields)
+        .first()
+    )
+    stats = ProductCard.objects.aggregate(
+        total_products=Count('pk'),
+        average_rating=Avg('avg_rating'),
+    )
+
+    return {
+        'total_categories': Category.objects.count(),
+        'total_products': stats['total_products'],
+        'total_brands': Brand.objects.count(),
+        'categories': categories,
+        'popular_products': popular_products,
+        'top_brands': top_brands,
+        'average_rating': round(stats['average_rating'] or 0, 1),
+        'featured_categories': list(Category.objects.values('id', 'name', 'slug', 'photo')[:3]),
+        'featured_product': _product(featured_product) if featured_product else None,
+        'built_at': timezone.now(),
+    }
+
+
+def refresh_snapshot():
+    snapshot = build_snapshot()
+    singleflight.set_value(SNAPSHOT_KEY, snapshot, get_ttl())
+    return snapshot
+
+
+def get_snapshot():
+    # После истечения TTL снимок пересобирает один воркер, остальные отдают прежний
+    return singleflight.get_or_compute(SNAPSHOT_KEY, build_snapshot, get_ttl())
+
+
+def get_context(snapshot, reviewless_count=4):
+    """Контекст шаблона: случайные товары без отзывов выбираются из пула в кеше"""
+    context = dict(snapshot)
+    context['products_without_reviews'] = REVIEWLESS_PRODUCTS.sample(reviewless_count)
+    return context
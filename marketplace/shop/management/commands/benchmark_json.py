@@ -0,0 +1,87 @@
+import statistics
+import time
+from io import BytesIO
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.parsers import JSONParser
+from rest_framework.test import APIRequestFactory
+
+from shop import renderers
+from shop.models import Product
+from shop.serializers import ProductSerializer
+from shop.views import ProductViewSet
+
+# Без кеша: иначе список собирается из готовых фрагментов и рендерер почти не работает
+NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+def _measure(func, iterations):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает стандартные JSONRenderer / JSONParser DRF с shop.renderers '
+        'на данных ProductViewSet.list'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100, help='Товаров на странице списка')
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def handle(self, *args, **options):
+        page_size, iterations = options['page_size'], options['iterations']
+        if renderers.orjson is None:
+            self.stdout.write(self.style.WARNING('orjson не установлен - быстрый рендерер работает через json'))
+
+        factory = APIRequestFactory()
+        request = factory.get('/', HTTP_HOST='localhost')
+        products = list(Product.objects.order_by('pk')[:page_size])
+        if not products:
+            raise CommandError('Нет товаров - заполните базу (populate_db)')
+        data = {
+            'next': None,
+            'previous': None,
+            'results': ProductSerializer(products, many=True, context={'request': request}).data,
+        }
+
+        standard = JSONRenderer().render(data)
+        fast = renderers.FastJSONRenderer().render(data)
+        if standard != fast:
+            raise CommandError('Вывод FastJSONRenderer отличается от JSONRenderer')
+        self.stdout.write(f'{len(products)} товаров, {len(standard) / 1024:.1f} КБ JSON, вывод совпадает')
+
+        rows = [
+            ('render', JSONRenderer().render, renderers.FastJSONRenderer().render, data),
+            ('parse', lambda body: JSONParser().parse(BytesIO(body)),
+             lambda body: renderers.FastJSONParser().parse(BytesIO(body)), standard),
+        ]
+        for name, slow, quick, argument in rows:
+            self._report(name, _measure(lambda: slow(argument), iterations),
+                         _measure(lambda: quick(argument), iterations))
+
+        # Весь запрос к списку: выборка, сериализация и рендеринг
+        def list_view(renderer_classes):
+            view = ProductViewSet.as_view({'get': 'list'}, renderer_classes=renderer_classes)
+            return lambda: view(factory.get('/', {'page_size': page_size}, HTTP_HOST='localhost'))
+
+        with override_settings(CACHES=NO_CACHE):
+            self._report(
+                'ProductViewSet.list',
+                _measure(list_view([JSONRenderer]), iterations),
+                _measure(list_view([renderers.FastJSONRenderer]), iterations),
+            )
+
+    def _report(self, name, slow, quick):
+        slow_ms, quick_ms = statistics.median(slow) * 1000, statistics.median(quick) * 1000
+        self.stdout.write(
+            f'{name:<22} DRF {slow_ms:8.2f} мс ({1000 / slow_ms:7.0f}/с)   '
+            f'shop.renderers {quick_ms:8.2f} мс ({1000 / quick_ms:7.0f}/с)   x{slow_ms / quick_ms:.2f}'
+        )
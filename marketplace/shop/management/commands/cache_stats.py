@@ -0,0 +1,36 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from shop import cache_metrics
+
+
+class Command(BaseCommand):
+    help = 'Показывает счетчики кеша (попадания, промахи, записи, вытеснения, время пересчета) по пространствам имен'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Вывести в JSON, как отдает /shop/cache-metrics/')
+        parser.add_argument('--reset', action='store_true', help='Обнулить счетчики после вывода')
+
+    def handle(self, *args, **options):
+        metrics = cache_metrics.snapshot()
+        if options['json']:
+            self.stdout.write(json.dumps({'namespaces': metrics}, indent=2, ensure_ascii=False))
+        elif not metrics:
+            self.stdout.write('Счетчиков пока нет')
+        else:
+            self.stdout.write(
+                f"{'пространство':<34}{'попадания':>10}{'промахи':>10}{'доля':>8}"
+                f"{'записи':>10}{'вытеснения':>12}{'пересчеты':>11}{'мс/пересчет':>13}"
+            )
+            for name, counts in sorted(metrics.items()):
+                ratio = f"{counts['hit_ratio']:.0%}" if counts['hit_ratio'] is not None else '-'
+                avg = counts['avg_recompute_ms'] if counts['avg_recompute_ms'] is not None else '-'
+                self.stdout.write(
+                    f"{name:<34}{counts['hits']:>10}{counts['misses']:>10}{ratio:>8}"
+                    f"{counts['sets']:>10}{counts['evictions']:>12}{counts['recomputes']:>11}{avg:>13}"
+                )
+
+        if options['reset']:
+            cache_metrics.reset()
+            self.stdout.write(self.style.SUCCESS('Счетчики обнулены'))
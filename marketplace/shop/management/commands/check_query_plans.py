@@ -0,0 +1,258 @@
+import json
+import re
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.urls import resolve, reverse
+
+from shop import facets, homepage
+from shop.models import Product, ProductCard, ProductRanking, ProductVariant, Review
+from shop.pagination import KeysetPaginator, KEYSET_ORDERINGS
+from shop.views import PRODUCTS_PER_PAGE, ProductViewSet
+
+# Таблицы, полный проход по которым недопустим (справочники маленькие)
+LARGE_TABLES = [
+    Product._meta.db_table,
+    ProductCard._meta.db_table,
+    ProductRanking._meta.db_table,
+    ProductVariant._meta.db_table,
+    Review._meta.db_table,
+]
+
+# Пути, в которых полный проход допустим, и почему. Те же запросы (тот же SQL)
+# в других путях - например, счетчики фасетов каталога без фильтров внутри
+# product_list - тоже считаются допустимыми
+ALLOWED_SCANS = {
+    'homepage: снимок': 'агрегаты по всему каталогу; снимок собирается раз в HOMEPAGE_SNAPSHOT_TTL '
+                        'и отдается из кеша (shop/homepage.py)',
+    'homepage: пул без отзывов': 'id всех товаров без отзывов читаются при пересборке пула, раз в его ttl '
+                                 '(shop/sampling.py)',
+    'facets: весь каталог': 'счетчики без фильтров - GROUP BY по всем карточкам; кешируются на '
+                            'FACETS_CACHE_TTL (shop/facets.py)',
+    'api products: search': 'SearchFilter ищет через icontains; поиск каталога идет через FTS (product_list ?q=)',
+}
+
+# Кеши отключены, чтобы каждый запрос пути дошел до БД
+NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+class QueryLog:
+    """execute_wrapper: SELECT-запросы пути (SQL -> параметры) без повторов"""
+
+    def __init__(self):
+        self.queries = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip()[:6].upper() == 'SELECT':
+            self.queries.setdefault(sql, params)
+        return execute(sql, params, many, context)
+
+
+class HotPaths:
+    """
+    Горячие пути каталога: страницы и API вызываются через URL теми же
+    представлениями, что и в проде, поэтому планы строятся по настоящим
+    запросам (фильтры, сортировки, FTS, фасеты, курсоры).
+    """
+
+    def __init__(self):
+        variant = ProductVariant.objects.select_related('product', 'category').order_by('pk').first()
+        if variant is None:
+            raise CommandError('В базе нет вариантов товаров - проверять нечего (populate_db)')
+        self.variant = variant
+        self.product = variant.product
+        self.category = variant.category
+        self.term = re.findall(r'\w+', self.product.name)[0]
+        host = next((host for host in settings.ALLOWED_HOSTS if host and host[0] not in '*.'), 'localhost')
+        self.factory = RequestFactory(HTTP_HOST=host)
+
+    def get(self, path, **params):
+        url = f'{path}?{urlencode(params)}' if params else path
+        request = self.factory.get(url)
+        request.user = AnonymousUser()
+        match = resolve(path)
+        response = match.func(request, *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        if response.status_code != 200:
+            raise CommandError(f'{url}: HTTP {response.status_code}')
+        return response
+
+    def follow(self, path, **params):
+        """Первая страница списка API и следующая по курсору из ответа"""
+        # Списки с кешем фрагментов отдают готовое тело, поэтому читаем JSON из ответа
+        next_link = json.loads(self.get(path, **params).content)['next']
+        if next_link:
+            params['cursor'] = parse_qs(urlsplit(next_link).query)['cursor'][0]
+            self.get(path, **params)
+
+    def card_cursor(self, queryset, ordering):
+        # Курсор после первой страницы - как его строит product_list / category_products
+        paginator = KeysetPaginator(queryset, ordering, PRODUCTS_PER_PAGE)
+        return paginator.encode_cursor(paginator.page_queryset(None)[0])
+
+    def paths(self):
+        """(имя, вызов); сначала пути из ALLOWED_SCANS"""
+        product_list = reverse('product_list')
+        api_products = reverse('product-list')
+        cards = ProductCard.objects.all()
+        in_category = ProductCard.objects.filter(category=self.category)
+        api_orderings = [
+            prefix + field for field in ['id', *ProductViewSet.ordering_fields] for prefix in ('', '-')
+        ]
+
+        paths = [
+            ('homepage: снимок', homepage.build_snapshot),
+            ('homepage: пул без отзывов', homepage.REVIEWLESS_PRODUCTS.build),
+            ('facets: весь каталог', lambda: facets.compute_facets(cards)),
+            ('api products: search', lambda: self.get(api_products, search=self.term)),
+            ('index', lambda: self.get(reverse('index'))),
+        ]
+        for sort in KEYSET_ORDERINGS:
+            paths += [
+                (f'product_list: {sort}', lambda sort=sort: self.get(product_list, sort=sort)),
+                (f'product_list: cursor {sort}', lambda sort=sort: self.get(
+                    product_list, sort=sort, cursor=self.card_cursor(cards, sort)
+                )),
+            ]
+        paths += [
+            ('product_list: category', lambda: self.get(product_list, category=self.category.pk)),
+            ('product_list: brand', lambda: self.get(product_list, brand=self.product.brand_id)),
+            ('product_list: price range', lambda: self.get(product_list, min_price=1000, max_price=5000)),
+            ('product_list: search', lambda: self.get(product_list, q=self.term, sort='default_price')),
+            ('product_list: search by relevance', lambda: self.get(product_list, q=self.term)),
+            ('product_list: search + category', lambda: self.get(product_list, q=self.term, category=self.category.pk)),
+            ('category_products', lambda: self.get(reverse('category_detail', args=[self.category.slug]))),
+            ('category_products: cursor', lambda: self.get(
+                reverse('category_detail', args=[self.category.slug]),
+                cursor=self.card_cursor(in_category, '-created_at'),
+            )),
+            ('product_detail', lambda: self.get(reverse('product_detail', args=[self.product.slug]))),
+            ('product_variant_detail', lambda: self.get(reverse('product_variant_detail', args=[self.variant.slug]))),
+            ('brand_list', lambda: self.get(reverse('brand_list'))),
+        ]
+        # Списки API: курсорная пагинация (KeysetCursorPagination), первая и следующая страницы
+        for ordering in api_orderings:
+            paths.append((f'api products: ordering {ordering}', lambda ordering=ordering: self.follow(
+                api_products, ordering=ordering
+            )))
+        paths += [
+            ('api products: category', lambda: self.follow(api_products, category=self.category.pk)),
+            ('api products: brand', lambda: self.follow(api_products, brand=self.product.brand_id)),
+            ('api products: price', lambda: self.follow(api_products, default_price=self.product.default_price)),
+            ('api products: fields + expand', lambda: self.follow(
+                api_products, fields='id,name,category,brand', expand='category,brand'
+            )),
+            ('api products: top_rated', lambda: self.follow(reverse('product-top-rated'))),
+            ('api products: top_rated by category', lambda: self.follow(
+                reverse('product-top-rated'), category=self.category.pk
+            )),
+            ('api products: discounted', lambda: self.follow(reverse('product-discounted'))),
+            ('api products: detail', lambda: self.get(reverse('product-detail', args=[self.product.pk]))),
+            ('api products: full', lambda: self.get(reverse('product-full', args=[self.product.pk]))),
+            ('api products: multi', lambda: self.get(reverse('product-multi-get'), ids=self.product.pk)),
+            ('api variants', lambda: self.follow(reverse('productvariant-list'))),
+            ('api variants: by product', lambda: self.follow(reverse('productvariant-list'), product=self.product.pk)),
+            ('api reviews', lambda: self.follow(reverse('review-list'))),
+            ('api reviews: by product', lambda: self.follow(reverse('review-list'), product=self.product.pk)),
+        ]
+        return paths
+
+
+def capture(run):
+    """SELECT-запросы, выполненные вызовом run()"""
+    log = QueryLog()
+    with override_settings(CACHES=NO_CACHE), connection.execute_wrapper(log):
+        run()
+    return log.queries
+
+
+def explain(sql, params):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'EXPLAIN {sql}', params)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return '\n'.join(row[-1] for row in cursor.fetchall())
+
+
+def _filtered(sql):
+    return ' WHERE ' in sql
+
+
+def _page(sql):
+    """Страница всей таблицы (без фильтров) с LIMIT"""
+    return not _filtered(sql) and re.search(r' LIMIT \d+$', sql) is not None
+
+
+def full_scans(plan, sql):
+    """Таблицы из LARGE_TABLES, которые план читает целиком"""
+    if connection.vendor == 'postgresql':
+        return [table for table in LARGE_TABLES if re.search(rf'Seq Scan on {table}\b', plan)]
+    # SQLite: "SCAN table" без сортировки во временном B-дереве - это обход
+    # первичного ключа, который для страницы всей таблицы останавливается на
+    # LIMIT; с фильтром такой обход читает строки подряд до LIMIT совпадений,
+    # поэтому фильтрованные запросы должны идти через SEARCH по индексу
+    if _page(sql) and 'TEMP B-TREE' not in plan:
+        return []
+    if _filtered(sql):
+        # С фильтром любой SCAN (даже по индексу) перебирает строки и отбрасывает
+        # не подошедшие - нужен SEARCH по индексу фильтра
+        return [table for table in LARGE_TABLES if re.search(rf'\bSCAN {table}\b', plan)]
+    # SQLite: "SCAN table" без индекса - полный проход; "SCAN table USING INDEX" -
+    # упорядоченный обход индекса, который останавливается на LIMIT
+    return [
+        table for table in LARGE_TABLES
+        if re.search(rf'\bSCAN {table}\b(?! USING (COVERING )?INDEX)', plan)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Вызывает горячие страницы и API каталога, выполняет EXPLAIN для их запросов и падает, '
+        'если какой-то запрос сканирует большую таблицу целиком (кроме ALLOWED_SCANS)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Печатать запросы и планы целиком')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f'Проверка планов не поддерживается для {connection.vendor}')
+
+        failures = []
+        allowed = set()
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # На маленькой базе планировщик предпочтет Seq Scan даже при наличии индекса
+                cursor.execute('SET enable_seqscan = off')
+            try:
+                for name, run in HotPaths().paths():
+                    queries = capture(run)
+                    if name in ALLOWED_SCANS:
+                        allowed.update(queries)
+                    scans = set()
+                    for sql, params in queries.items():
+                        plan = explain(sql, params)
+                        query_scans = [] if sql in allowed else full_scans(plan, sql)
+                        scans.update(query_scans)
+                        if options['verbose_plans'] or query_scans:
+                            self.stdout.write(f'{sql}\n{plan}')
+                    if scans:
+                        failures.append(name)
+                        self.stdout.write(self.style.ERROR(f'FULL SCAN  {name}: {", ".join(sorted(scans))}'))
+                    elif name in ALLOWED_SCANS:
+                        self.stdout.write(self.style.WARNING(f'allowed    {name}: {ALLOWED_SCANS[name]}'))
+                    else:
+                        self.stdout.write(self.style.SUCCESS(f'ok         {name} (запросов: {len(queries)})'))
+            finally:
+                if connection.vendor == 'postgresql':
+                    cursor.execute('SET enable_seqscan = on')
+
+        if failures:
+            raise CommandError(f'Полный проход по таблице в {len(failures)} путях: {", ".join(failures)}')
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop import cards
+
+
+class Command(BaseCommand):
+    help = 'Пересоздает денормализованные карточки товаров (ProductCard)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        total = cards.rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено карточек: {total} за {time.monotonic() - started:.2f} с'
+        ))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop import search
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс товаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            self.stdout.write(self.style.WARNING(
+                'Полнотекстовый индекс не поддерживается для этой СУБД, используется поиск по LIKE'
+            ))
+            return
+
+        started = time.monotonic()
+        total = search.rebuild_index(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано товаров: {total} за {time.monotonic() - started:.2f} с'
+        ))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop import cards, rankings, ratings
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает агрегаты отзывов (количество, среднюю оценку, гистограмму) у всех товаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        total = ratings.recompute(chunk_size=options['chunk_size'])
+        # Карточки копируют review_count и avg_rating с товара
+        cards.rebuild(chunk_size=options['chunk_size'])
+        # Байесовский рейтинг считается из тех же агрегатов
+        rankings.rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано товаров: {total} за {time.monotonic() - started:.2f} с'
+        ))
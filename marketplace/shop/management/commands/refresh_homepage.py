@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop import homepage
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает снимок данных главной страницы и кладет его в кеш'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        snapshot = homepage.refresh_snapshot()
+        self.stdout.write(self.style.SUCCESS(
+            f"Снимок главной обновлен за {time.monotonic() - started:.2f} с "
+            f"(товаров: {snapshot['total_products']}, TTL: {homepage.get_ttl()} с)"
+        ))
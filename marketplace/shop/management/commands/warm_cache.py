@@ -0,0 +1,105 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from shop import homepage
+from shop.models import Category, Brand, ProductCard
+
+# Первые страницы списков API, которые чаще всего запрашивают клиенты
+API_LISTS = [
+    ('product-list', ''),
+    ('product-list', '?ordering=-created_at'),
+    ('product-list', '?ordering=default_price'),
+    ('product-list', '?ordering=-avg_rating'),
+    ('product-top-rated', ''),
+    ('product-discounted', ''),
+    ('productvariant-list', ''),
+    ('category-list', ''),
+    ('brand-list', ''),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогревает кеши каталога (главная, категории, бренды, популярные товары, списки API) '
+        'после деплоя или populate_db: запрашивает страницы у работающего сайта по HTTP, '
+        'поэтому кеши заполняют сами процессы веб-сервера'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000',
+                            help='Адрес работающего сайта, к которому идут запросы')
+        parser.add_argument('--products', type=int, default=100,
+                            help='Сколько самых популярных страниц товаров прогреть')
+        parser.add_argument('--concurrency', type=int, default=4, help='Число параллельных запросов')
+        parser.add_argument('--timeout', type=float, default=30, help='Таймаут одного запроса, с')
+
+    def urls(self, products):
+        yield reverse('index')
+        yield reverse('product_list')
+        yield reverse('brand_list')
+        for slug in Category.objects.values_list('slug', flat=True):
+            yield reverse('category_detail', args=[slug])
+        for pk in Brand.objects.values_list('pk', flat=True):
+            yield reverse('brand_detail', args=[pk])
+        for slug in ProductCard.objects.order_by('-review_count', '-avg_rating').values_list('slug', flat=True)[:products]:
+            yield reverse('product_detail', args=[slug])
+        for name, query in API_LISTS:
+            yield reverse(name) + query
+
+    def handle(self, *args, **options):
+        base_url = options['base_url'].rstrip('/')
+        timeout = options['timeout']
+
+        def fetch(url):
+            # Ошибка одного URL (HTTP-статус, отказ в соединении, таймаут) не прерывает прогрев
+            started = time.monotonic()
+            try:
+                with urlopen(Request(base_url + url, headers={'Accept': 'text/html,application/json'}),
+                             timeout=timeout) as response:
+                    response.read()
+                    status, error = response.status, None
+            except HTTPError as exc:
+                status, error = exc.code, None
+            except (URLError, OSError) as exc:
+                status, error = None, getattr(exc, 'reason', exc)
+            return url, status, error, time.monotonic() - started
+
+        started = time.monotonic()
+        # Снимок главной пишется в кеш этого процесса; процессы сайта увидят его, только
+        # если кеш общий (Redis, Memcached, файлы). Страницы ниже прогревает сам сайт
+        if isinstance(caches['default'], LocMemCache):
+            self.stdout.write(self.style.WARNING(
+                'Кеш LocMemCache живет внутри процесса: снимок главной соберет сам веб-сервер, '
+                'а каждый его процесс прогреется только теми запросами, которые попали к нему'
+            ))
+        else:
+            homepage.refresh_snapshot()
+        urls = list(self.urls(options['products']))
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(fetch, urls))
+        elapsed = time.monotonic() - started
+
+        failed = [result for result in results if result[1] is None or result[1] >= 400]
+        for url, status, error, _ in failed:
+            self.stdout.write(self.style.ERROR(f'{status or "ошибка"} {url}' + (f': {error}' if error else '')))
+        if options['verbosity'] > 1:
+            for url, status, _, duration in results:
+                self.stdout.write(f'{status or "---"} {duration * 1000:8.1f} мс  {url}')
+
+        durations = sorted(duration for *_, duration in results)
+        p95 = durations[int(len(durations) * 0.95)] if durations else 0
+        style = self.style.WARNING if failed else self.style.SUCCESS
+        self.stdout.write(style(
+            f'Прогрето {len(results) - len(failed)} из {len(results)} страниц за {elapsed:.2f} с, '
+            f'ошибок: {len(failed)} '
+            f'(медиана {statistics.median(durations or [0]) * 1000:.1f} мс, '
+            f'p95 {p95 * 1000:.1f} мс, максимум {max(durations or [0]) * 1000:.1f} мс)'
+        ))
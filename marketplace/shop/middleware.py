@@ -1,11 +1,18 @@
 # middleware.py
 
+import logging
+import time
+
 from django.utils.deprecation import MiddlewareMixin
 from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.exceptions import TokenError
 from django.http import JsonResponse
 from django.shortcuts import redirect
 
+from shop import cache_metrics
+
+cache_logger = logging.getLogger('shop.cache')
+
 class TokenExpirationMiddleware(MiddlewareMixin):
     def process_request(self, request):
         access_token = request.COOKIES.get("access_token")
@@ -19,4 +26,30 @@ class TokenExpirationMiddleware(MiddlewareMixin):
                 response.delete_cookie("refresh_token")
                 return response
 
-        return None
\ No newline at end of file
+        return None
+
+
+class CacheMetricsMiddleware(MiddlewareMixin):
+    """Пишет в лог обращения к кешу за запрос и периодически сбрасывает счетчики в общий кеш"""
+
+    def process_request(self, request):
+        request._cache_started = time.monotonic()
+        cache_metrics.start_request()
+
+    def process_response(self, request, response):
+        counters = cache_metrics.finish_request()
+        if counters:
+            cache_logger.info(
+                '%s %s %s %.1fms cache %s',
+                request.method,
+                request.get_full_path(),
+                response.status_code,
+                (time.monotonic() - getattr(request, '_cache_started', time.monotonic())) * 1000,
+                ' '.join(
+                    f"{name}={counts['hits']}/{counts['misses']}"
+                    + (f"+{counts['recompute_ms']}ms" if counts['recomputes'] else '')
+                    for name, counts in sorted(counters.items())
+                ),
+            )
+        cache_metrics.flush()
+        return response
@@ -0,0 +1,52 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE shop_product_fts USING fts5("
+            "name, description, brand, category, "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            "INSERT INTO shop_product_fts (rowid, name, description, brand, category) "
+            "SELECT p.id, p.name, p.description, b.name, c.name FROM shop_product p "
+            "JOIN shop_brand b ON b.id = p.brand_id "
+            "JOIN shop_category c ON c.id = p.category_id"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE shop_product_fts ("
+            "product_id bigint PRIMARY KEY REFERENCES shop_product (id) ON DELETE CASCADE, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX shop_product_fts_document_idx ON shop_product_fts USING GIN (document)"
+        )
+        schema_editor.execute(
+            "INSERT INTO shop_product_fts (product_id, document) "
+            "SELECT p.id, "
+            "setweight(to_tsvector('simple', p.name), 'A') || "
+            "setweight(to_tsvector('simple', b.name || ' ' || c.name), 'B') || "
+            "setweight(to_tsvector('simple', p.description), 'C') "
+            "FROM shop_product p "
+            "JOIN shop_brand b ON b.id = p.brand_id "
+            "JOIN shop_category c ON c.id = p.category_id"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute("DROP TABLE IF EXISTS shop_product_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+
+def fill_product_cards(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    ProductVariant = apps.get_model('shop', 'ProductVariant')
+    Review = apps.get_model('shop', 'Review')
+    ProductCard = apps.get_model('shop', 'ProductCard')
+
+    prices = {
+        row['product_id']: (row['min_price'], row['max_price'])
+        for row in ProductVariant.objects.order_by().values('product_id')
+        .annotate(min_price=Min('price'), max_price=Max('price'))
+    }
+    colors = {}
+    for product_id, name, color in (
+        ProductVariant.objects.order_by('product_id', 'color_id')
+        .values_list('product_id', 'color__name', 'color__color').distinct()
+    ):
+        colors.setdefault(product_id, []).append({'name': name, 'color': color})
+    review_counts = dict(
+        Review.objects.order_by().values('product_id')
+        .annotate(count=Count('id')).values_list('product_id', 'count')
+    )
+
+    cards = []
+    for product in Product.objects.select_related('category', 'brand').iterator(chunk_size=1000):
+        min_price, max_price = prices.get(product.pk, (None, None))
+        cards.append(ProductCard(
+            product_id=product.pk,
+            name=product.name,
+            slug=product.slug,
+            photo=product.photo.name,
+            description=product.description,
+            category_id=product.category_id,
+            category_name=product.category.name,
+            category_slug=product.category.slug,
+            brand_id=product.brand_id,
+            brand_name=product.brand.name,
+            default_price=product.default_price,
+            min_price=min_price,
+            max_price=max_price,
+            review_count=review_counts.get(product.pk, 0),
+            avg_rating=product.avg_rating,
+            colors=colors.get(product.pk, []),
+            created_at=product.created_at,
+        ))
+    ProductCard.objects.bulk_create(cards, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0002_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCard',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='shop.product', verbose_name='Товар')),
+                ('name', models.CharField(max_length=255, verbose_name='Название')),
+                ('slug', models.SlugField(verbose_name='URL')),
+                ('photo', models.CharField(max_length=100, verbose_name='Фото')),
+                ('description', models.TextField(verbose_name='Описание')),
+                ('category_name', models.CharField(max_length=255, verbose_name='Название категории')),
+                ('category_slug', models.SlugField(verbose_name='URL категории')),
+                ('brand_name', models.CharField(max_length=255, verbose_name='Название бренда')),
+                ('default_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Цена')),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Минимальная цена варианта')),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Максимальная цена варианта')),
+                ('review_count', models.PositiveIntegerField(default=0, verbose_name='Количество отзывов')),
+                ('avg_rating', models.FloatField(default=0.0, verbose_name='Средний рейтинг')),
+                ('colors', models.JSONField(default=list, verbose_name='Цвета')),
+                ('created_at', models.DateTimeField(verbose_name='Дата создания товара')),
+                ('brand', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.brand', verbose_name='Бренд')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.category', verbose_name='Категория')),
+            ],
+            options={
+                'verbose_name': 'Карточка товара',
+                'verbose_name_plural': 'Карточки товаров',
+                'indexes': [models.Index(fields=['category', 'default_price'], name='shop_produc_categor_15951b_idx'), models.Index(fields=['brand', 'default_price'], name='shop_produc_brand_i_4cb053_idx'), models.Index(fields=['default_price', 'product'], name='shop_produc_default_9c70c9_idx'), models.Index(fields=['created_at', 'product'], name='shop_produc_created_0036ce_idx'), models.Index(fields=['avg_rating', 'product'], name='shop_produc_avg_rat_69e950_idx')],
+            },
+        ),
+        migrations.RunPython(fill_product_cards, migrations.RunPython.noop),
+    ]
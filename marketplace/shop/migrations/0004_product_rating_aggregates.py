@@ -0,0 +1,89 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:47
+
+from django.db import migrations, models
+from django.db.models import Case, Count, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+
+def _bucket_filter(number):
+    if number == 1:
+        return Q(rating__lt=1.5)
+    if number == 5:
+        return Q(rating__gte=4.5)
+    return Q(rating__gte=number - 0.5, rating__lt=number + 0.5)
+
+
+def fill_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    ProductCard = apps.get_model('shop', 'ProductCard')
+    Review = apps.get_model('shop', 'Review')
+
+    def review_subquery(aggregate, default, *filters):
+        reviews = (
+            Review.objects.filter(*filters, product=OuterRef('pk'))
+            .order_by().values('product').annotate(value=aggregate).values('value')
+        )
+        return Coalesce(Subquery(reviews), Value(default))
+
+    updates = {
+        'review_count': review_subquery(Count('id'), 0),
+        'rating_sum': review_subquery(Sum('rating'), 0.0),
+    }
+    for number in range(1, 6):
+        updates[f'rating_{number}'] = review_subquery(Count('id'), 0, _bucket_filter(number))
+    Product.objects.update(**updates)
+    Product.objects.update(avg_rating=Case(
+        When(review_count__gt=0, then=F('rating_sum') / F('review_count')),
+        default=Value(0.0),
+        output_field=FloatField(),
+    ))
+    ProductCard.objects.update(
+        review_count=Subquery(Product.objects.filter(pk=OuterRef('pk')).values('review_count')),
+        avg_rating=Subquery(Product.objects.filter(pk=OuterRef('pk')).values('avg_rating')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_product_card'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0, verbose_name='Оценок 1'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0, verbose_name='Оценок 2'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0, verbose_name='Оценок 3'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0, verbose_name='Оценок 4'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0, verbose_name='Оценок 5'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.FloatField(default=0.0, verbose_name='Сумма оценок'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество отзывов'),
+        ),
+        migrations.RunPython(fill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+
+# Как в shop/rankings.py на момент миграции
+PRIOR_WEIGHT = 10
+DEFAULT_PRIOR_MEAN = 3.0
+
+
+def fill_product_rankings(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    ProductRanking = apps.get_model('shop', 'ProductRanking')
+
+    totals = Product.objects.aggregate(count=Sum('review_count'), total=Sum('rating_sum'))
+    mean = totals['total'] / totals['count'] if totals['count'] else DEFAULT_PRIOR_MEAN
+    ProductRanking.objects.bulk_create(
+        (
+            ProductRanking(
+                product_id=pk,
+                category_id=category_id,
+                score=(PRIOR_WEIGHT * mean + rating_sum) / (PRIOR_WEIGHT + review_count),
+                review_count=review_count,
+            )
+            for pk, category_id, review_count, rating_sum in Product.objects.filter(review_count__gt=0)
+            .values_list('pk', 'category_id', 'review_count', 'rating_sum').iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRanking',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranking', serialize=False, to='shop.product', verbose_name='Товар')),
+                ('score', models.FloatField(verbose_name='Байесовская оценка')),
+                ('review_count', models.PositiveIntegerField(verbose_name='Количество отзывов')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.category', verbose_name='Категория')),
+            ],
+            options={
+                'verbose_name': 'Рейтинг товара',
+                'verbose_name_plural': 'Рейтинг товаров',
+                'indexes': [models.Index(fields=['score', 'product'], name='shop_produc_score_742863_idx'), models.Index(fields=['category', 'score', 'product'], name='shop_produc_categor_89d713_idx')],
+            },
+        ),
+        migrations.RunPython(fill_product_rankings, migrations.RunPython.noop),
+    ]
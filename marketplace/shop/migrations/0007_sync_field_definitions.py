@@ -0,0 +1,496 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_product_ranking'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='address',
+            name='city',
+            field=models.CharField(max_length=100, verbose_name='Город'),
+        ),
+        migrations.AlterField(
+            model_name='address',
+            name='country',
+            field=models.CharField(max_length=100, verbose_name='Страна'),
+        ),
+        migrations.AlterField(
+            model_name='address',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='Дата создания'),
+        ),
+        migrations.AlterField(
+            model_name='address',
+            name='index',
+            field=models.CharField(max_length=20, verbose_name='Индекс'),
+        ),
+        migrations.AlterField(
+            model_name='address',
+            name='map_link',
+            field=models.URLField(blank=True, null=True, verbose_name='Ссылка на карту'),
+        ),
+        migrations.AlterField(
+            model_name='address',
+            name='street',
+            field=models.CharField(max_length=255, verbose_name='Улица'),
+        ),
+        migrations.AlterField(
+            model_name='address',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата обновления'),
+        ),
+        migrations.AlterField(
+            model_name='address',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterField(
+            model_name='basket',
+            name='count',
+            field=models.PositiveIntegerField(verbose_name='Количество'),
+        ),
+        migrations.AlterField(
+            model_name='basket',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='Дата создания'),
+        ),
+        migrations.AlterField(
+            model_name='basket',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shop.product', verbose_name='Товар'),
+        ),
+        migrations.AlterField(
+            model_name='basket',
+            name='product_variant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shop.productvariant', verbose_name='Вариант товара'),
+        ),
+        migrations.AlterField(
+            model_name='basket',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата обновления'),
+        ),
+        migrations.AlterField(
+            model_name='basket',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterField(
+            model_name='basketorder',
+            name='basket',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shop.basket', verbose_name='Корзина'),
+        ),
+        migrations.AlterField(
+            model_name='basketorder',
+            name='count',
+            field=models.PositiveIntegerField(verbose_name='Количество'),
+        ),
+        migrations.AlterField(
+            model_name='basketorder',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='Дата создания'),
+        ),
+        migrations.AlterField(
+            model_name='basketorder',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shop.order', verbose_name='Заказ'),
+        ),
+        migrations.AlterField(
+            model_name='basketorder',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата обновления'),
+        ),
+        migrations.AlterField(
+            model_name='brand',
+            name='catalog_pdf',
+            field=models.FileField(blank=True, null=True, upload_to='brand_catalogs/', verbose_name='Каталог (PDF)'),
+        ),
+        migrations.AlterField(
+            model_name='brand',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='Дата создания'),
+        ),
+        migrations.AlterField(
+            model_name='brand',
+            name='description',
+            field=models.TextField(verbose_name='Описание'),
+        ),
+        migrations.AlterField(
+            model_name='brand',
+            name='name',
+            field=models.CharField(max_length=255, verbose_name='Название'),
+        ),
+        migrations.AlterField(
+            model_name='brand',
+            name='official_website',
+            field=models.URLField(blank=True, null=True, verbose_name='Официальный сайт'),
+        ),
+        migrations.AlterField(
+            model_name='brand',
+            name='photo',
+            field=models.ImageField(upload_to='brands/', verbose_name='Логотип'),
+        ),
+        migrations.AlterField(
+            model_name='brand',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата обновления'),
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='Дата создания'),
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='documentation',
+            field=models.FileField(blank=True, null=True, upload_to='category_docs/', verbose_name='Документация'),
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='name',
+            field=models.CharField(max_length=255, verbose_name='Название'),
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='photo',
+            field=models.ImageField(upload_to='categories/', verbose_name='Фото'),
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='slug',
+            field=models.SlugField(unique=True, verbose_name='URL'),
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата обновления'),
+        ),
+        migrations.AlterField(
+            model_name='color',
+            name='color',
+            field=models.CharField(max_length=20, verbose_name='HEX-код'),
+        ),
+        migrations.AlterField(
+            model_name='color',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='Дата создания'),
+        ),
+        migrations.AlterField(
+            model_name='color',
+            name='image',
+            field=models.ImageField(blank=True, null=True, upload_to='colors/', verbose_name='Изображение'),
+        ),
+        migrations.AlterField(
+            model_name='color',
+            name='name',
+            field=models.CharField(max_length=50, verbose_name='Название'),
+        ),
+        migrations.AlterField(
+            model_name='color',
+            name='palette_file',
+            field=models.FileField(blank=True, null=True, upload_to='color_palettes/', verbose_name='Палитра'),
+        ),
+        migrations.AlterField(
+            model_name='color',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата обновления'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='address',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='shop.address', verbose_name='Адрес'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='Дата создания'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='full_price',
+            field=models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Общая стоимость'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='invoice',
+            field=models.FileField(blank=True, null=True, upload_to='invoices/', verbose_name='Счет'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='tracking_url',
+            field=models.URLField(blank=True, null=True, verbose_name='Трек-номер'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата обновления'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='avg_rating',
+            field=models.FloatField(default=0.0, verbose_name='Средний рейтинг'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='brand',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shop.brand', verbose_name='Бренд'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shop.category', verbose_name='Категория'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='Дата создания'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='default_price',
+            field=models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Цена'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='description',
+            field=models.TextField(verbose_name='Описание'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='manual',
+            field=models.FileField(blank=True, null=True, upload_to='product_manuals/', verbose_name='Инструкция'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='name',
+            field=models.CharField(max_length=255, verbose_name='Название'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='photo',
+            field=models.ImageField(upload_to='products/', verbose_name='Фото'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='slug',
+            field=models.SlugField(unique=True, verbose_name='URL'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата обновления'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='video_url',
+            field=models.URLField(blank=True, null=True, verbose_name='Видео'),
+        ),
+        migrations.AlterField(
+            model_name='productcolor',
+            name='color',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shop.color', verbose_name='Цвет'),
+        ),
+        migrations.AlterField(
+            model_name='productcolor',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='Дата создания'),
+        ),
+        migrations.AlterField(
+            model_name='productcolor',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shop.product', verbose_name='Товар'),
+        ),
+        migrations.AlterField(
+            model_name='productcolor',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата обновления'),
+        ),
+        migrations.AlterField(
+            model_name='productorder',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='Дата создания'),
+        ),
+        migrations.AlterField(
+            model_name='productorder',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shop.order', verbose_name='Заказ'),
+        ),
+        migrations.AlterField(
+            model_name='productorder',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shop.product', verbose_name='Товар'),
+        ),
+        migrations.AlterField(
+            model_name='productorder',
+            name='product_variant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shop.productvariant', verbose_name='Вариант товара'),
+        ),
+        migrations.AlterField(
+            model_name='productorder',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата обновления'),
+        ),
+        migrations.AlterField(
+            model_name='productvariant',
+            name='brand',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shop.brand', verbose_name='Бренд'),
+        ),
+        migrations.AlterField(
+            model_name='productvariant',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shop.category', verbose_name='Категория'),
+        ),
+        migrations.AlterField(
+            model_name='productvariant',
+            name='color',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shop.color', verbose_name='Цвет'),
+        ),
+        migrations.AlterField(
+            model_name='productvariant',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='Дата создания'),
+        ),
+        migrations.AlterField(
+            model_name='productvariant',
+            name='description',
+            field=models.TextField(verbose_name='Описание'),
+        ),
+        migrations.AlterField(
+            model_name='productvariant',
+            name='images',
+            field=models.JSONField(verbose_name='Изображения'),
+        ),
+        migrations.AlterField(
+            model_name='productvariant',
+            name='name',
+            field=models.CharField(max_length=255, verbose_name='Название'),
+        ),
+        migrations.AlterField(
+            model_name='productvariant',
+            name='photo',
+            field=models.ImageField(upload_to='variants/', verbose_name='Фото'),
+        ),
+        migrations.AlterField(
+            model_name='productvariant',
+            name='price',
+            field=models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Цена'),
+        ),
+        migrations.AlterField(
+            model_name='productvariant',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shop.product', verbose_name='Товар'),
+        ),
+        migrations.AlterField(
+            model_name='productvariant',
+            name='product_url',
+            field=models.URLField(blank=True, null=True, verbose_name='Ссылка на товар'),
+        ),
+        migrations.AlterField(
+            model_name='productvariant',
+            name='slug',
+            field=models.SlugField(unique=True, verbose_name='URL'),
+        ),
+        migrations.AlterField(
+            model_name='productvariant',
+            name='technical_drawing',
+            field=models.FileField(blank=True, null=True, upload_to='technical_drawings/', verbose_name='Технический чертеж'),
+        ),
+        migrations.AlterField(
+            model_name='productvariant',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата обновления'),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='Дата создания'),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='description',
+            field=models.TextField(verbose_name='Отзыв'),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='name',
+            field=models.CharField(max_length=255, verbose_name='Имя'),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='photo',
+            field=models.ImageField(blank=True, null=True, upload_to='review_photos/', verbose_name='Фото'),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shop.product', verbose_name='Товар'),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='rating',
+            field=models.FloatField(verbose_name='Рейтинг'),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата обновления'),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='video_review_url',
+            field=models.URLField(blank=True, null=True, verbose_name='Видео-отзыв'),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, upload_to='avatars/', verbose_name='Аватар'),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='Дата создания'),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='phone',
+            field=models.CharField(blank=True, max_length=20, null=True, unique=True, verbose_name='Телефон'),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='resume',
+            field=models.FileField(blank=True, null=True, upload_to='resumes/', verbose_name='Резюме'),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='role',
+            field=models.CharField(choices=[('consumer', 'Покупатель'), ('seller', 'Продавец'), ('admin', 'Администратор')], default='consumer', max_length=10, verbose_name='Роль'),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата обновления'),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='profile', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='website',
+            field=models.URLField(blank=True, null=True, verbose_name='Веб-сайт'),
+        ),
+    ]
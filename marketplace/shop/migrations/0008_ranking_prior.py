@@ -0,0 +1,41 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:33
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+# Как в shop/rankings.py на момент миграции
+PRIOR_PK = 1
+DEFAULT_PRIOR_MEAN = 3.0
+
+
+def store_prior_mean(apps, schema_editor):
+    # Средняя оценка, как ее считала 0006_product_ranking при заполнении рейтинга
+    Product = apps.get_model('shop', 'Product')
+    RankingPrior = apps.get_model('shop', 'RankingPrior')
+
+    totals = Product.objects.aggregate(count=Sum('review_count'), total=Sum('rating_sum'))
+    mean = totals['total'] / totals['count'] if totals['count'] else DEFAULT_PRIOR_MEAN
+    RankingPrior.objects.create(pk=PRIOR_PK, mean=mean)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0007_sync_field_definitions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingPrior',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mean', models.FloatField(verbose_name='Средняя оценка')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата пересчета')),
+            ],
+            options={
+                'verbose_name': 'Средняя оценка рейтинга',
+                'verbose_name_plural': 'Средняя оценка рейтинга',
+            },
+        ),
+        migrations.RunPython(store_prior_mean, migrations.RunPython.noop),
+    ]
@@ -175,6 +175,35 @@ class Product(TimeStampedModel):
         "Средний рейтинг", 
         default=0.0
     )
+    # Агрегаты отзывов, обновляются атомарно при сохранении/удалении Review
+    review_count = models.PositiveIntegerField(
+        "Количество отзывов",
+        default=0
+    )
+    rating_sum = models.FloatField(
+        "Сумма оценок",
+        default=0.0
+    )
+    rating_1 = models.PositiveIntegerField(
+        "Оценок 1",
+        default=0
+    )
+    rating_2 = models.PositiveIntegerField(
+        "Оценок 2",
+        default=0
+    )
+    rating_3 = models.PositiveIntegerField(
+        "Оценок 3",
+        default=0
+    )
+    rating_4 = models.PositiveIntegerField(
+        "Оценок 4",
+        default=0
+    )
+    rating_5 = models.PositiveIntegerField(
+        "Оценок 5",
+        default=0
+    )
     category = models.ForeignKey(
         Category, 
         verbose_name="Категория", 
@@ -208,6 +237,14 @@ class Product(TimeStampedModel):
     class Meta:
         verbose_name = "Товар"
         verbose_name_plural = "Товары"
+        # Пути доступа каталога и API (проверяются командой check_query_plans)
+        indexes = [
+            models.Index(fields=['default_price']),
+            models.Index(fields=['avg_rating']),
+            models.Index(fields=['created_at']),
+            models.Index(fields=['category', 'default_price']),
+            models.Index(fields=['brand', 'default_price']),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -357,6 +394,11 @@ class Review(TimeStampedModel):
     class Meta:
         verbose_name = "Отзыв"
         verbose_name_plural = "Отзывы"
+        # Последние отзывы товара и версия блока отзывов (max(updated_at)) - поиском по индексу
+        indexes = [
+            models.Index(fields=['product', 'created_at']),
+            models.Index(fields=['product', 'updated_at']),
+        ]
 
     def __str__(self):
         return f"Отзыв от {self.name} на {self.product.name}"
@@ -474,4 +516,160 @@ class ProductOrder(TimeStampedModel):
     
     class Meta:
         verbose_name = "Товар в заказе"
-        verbose_name_plural = "Товары в заказах"
\ No newline at end of file
+        verbose_name_plural = "Товары в заказах"
+
+class ProductCard(models.Model):
+    """
+    Денормализованная карточка товара для страниц со списками.
+    Обновляется сигналами (см. shop/cards.py), списки читают только эту таблицу.
+    """
+    product = models.OneToOneField(
+        Product,
+        verbose_name="Товар",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="card"
+    )
+    name = models.CharField(
+        "Название",
+        max_length=255
+    )
+    slug = models.SlugField(
+        "URL"
+    )
+    photo = models.CharField(
+        "Фото",
+        max_length=100
+    )
+    description = models.TextField(
+        "Описание"
+    )
+    category = models.ForeignKey(
+        Category,
+        verbose_name="Категория",
+        on_delete=models.CASCADE,
+        related_name="+"
+    )
+    category_name = models.CharField(
+        "Название категории",
+        max_length=255
+    )
+    category_slug = models.SlugField(
+        "URL категории"
+    )
+    brand = models.ForeignKey(
+        Brand,
+        verbose_name="Бренд",
+        on_delete=models.CASCADE,
+        related_name="+"
+    )
+    brand_name = models.CharField(
+        "Название бренда",
+        max_length=255
+    )
+    default_price = models.DecimalField(
+        "Цена",
+        max_digits=10,
+        decimal_places=2
+    )
+    min_price = models.DecimalField(
+        "Минимальная цена варианта",
+        max_digits=10,
+        decimal_places=2,
+        blank=True,
+        null=True
+    )
+    max_price = models.DecimalField(
+        "Максимальная цена варианта",
+        max_digits=10,
+        decimal_places=2,
+        blank=True,
+        null=True
+    )
+    review_count = models.PositiveIntegerField(
+        "Количество отзывов",
+        default=0
+    )
+    avg_rating = models.FloatField(
+        "Средний рейтинг",
+        default=0.0
+    )
+    colors = models.JSONField(
+        "Цвета",
+        default=list
+    )
+    created_at = models.DateTimeField(
+        "Дата создания товара"
+    )
+
+    class Meta:
+        verbose_name = "Карточка товара"
+        verbose_name_plural = "Карточки товаров"
+        indexes = [
+            models.Index(fields=['category', 'default_price']),
+            models.Index(fields=['category', 'created_at']),
+            models.Index(fields=['brand', 'default_price']),
+            models.Index(fields=['default_price', 'product']),
+            models.Index(fields=['created_at', 'product']),
+            models.Index(fields=['avg_rating', 'product']),
+        ]
+
+    def __str__(self):
+        return self.name
+
+class ProductRanking(models.Model):
+    """
+    Байесовский рейтинг товара для top_rated (см. shop/rankings.py).
+    Строки есть только у товаров с отзывами, обновляются сигналами отзывов.
+    """
+    product = models.OneToOneField(
+        Product,
+        verbose_name="Товар",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="ranking"
+    )
+    category = models.ForeignKey(
+        Category,
+        verbose_name="Категория",
+        on_delete=models.CASCADE,
+        related_name="+"
+    )
+    score = models.FloatField(
+        "Байесовская оценка"
+    )
+    review_count = models.PositiveIntegerField(
+        "Количество отзывов"
+    )
+
+    class Meta:
+        verbose_name = "Рейтинг товара"
+        verbose_name_plural = "Рейтинг товаров"
+        # top_rated и top_rated по категории - проход по индексу от большей оценки
+        indexes = [
+            models.Index(fields=['score', 'product']),
+            models.Index(fields=['category', 'score', 'product']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.score:.3f}"
+
+class RankingPrior(models.Model):
+    """
+    Средняя оценка магазина (m в shop/rankings.py), с которой посчитаны строки
+    ProductRanking. Одна строка, меняется только полной перестройкой рейтинга.
+    """
+    mean = models.FloatField(
+        "Средняя оценка"
+    )
+    updated_at = models.DateTimeField(
+        "Дата пересчета",
+        auto_now=True
+    )
+
+    class Meta:
+        verbose_name = "Средняя оценка рейтинга"
+        verbose_name_plural = "Средняя оценка рейтинга"
+
+    def __str__(self):
+        return f"{self.mean:.3f}"
@@ -0,0 +1,50 @@
+"""
+Несколько объектов одним запросом: GET .../multi/?ids=3,1,2.
+
+Корзина, избранное и "недавно просмотренные" показывают десятки товаров;
+вместо запроса на каждый (/api/products/<pk>/) они выбираются одним in_bulk
+из того же queryset, что и у списка (с ?fields= / ?expand= и select_related
+развернутых связей из shop/sparse.py). Ответ - объекты в порядке ids и
+список id, которых нет: {"results": [...], "missing": [...]}.
+"""
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from . import conditional, sparse
+
+MAX_IDS = 100
+
+
+class MultiGetMixin:
+    """Действие multi для ModelViewSet; ETag - как у retrieve (conditional.ConditionalGetMixin)"""
+    multi_get_max_ids = MAX_IDS
+
+    def parse_ids(self, request):
+        pk_field = self.get_queryset().model._meta.pk
+        values = sparse.parse_list(request.query_params.get('ids'))
+        if not values:
+            raise ValidationError({'ids': ['Укажите id через запятую.']})
+        if len(values) > self.multi_get_max_ids:
+            raise ValidationError({'ids': [f'Не больше {self.multi_get_max_ids} id за запрос.']})
+        try:
+            return list(dict.fromkeys(pk_field.to_python(value) for value in values))
+        except DjangoValidationError:
+            raise ValidationError({'ids': ['id должны быть целыми числами.']})
+
+    @action(detail=False, methods=['get'], url_path='multi')
+    def multi_get(self, request):
+        ids = self.parse_ids(request)
+        found = self.get_queryset().in_bulk(ids)
+        objects = [found[pk] for pk in ids if pk in found]
+        missing = [pk for pk in ids if pk not in found]
+
+        validators = conditional.get_validators(
+            [*objects, *(related for obj in objects for related in self.get_related_objects(obj))],
+            extra=(request.get_full_path(), self._render_format(request), conditional.viewer(request)),
+        )
+        return conditional.respond(request, validators, lambda: Response({
+            'results': self.get_serializer(objects, many=True).data,
+            'missing': missing,
+        }))
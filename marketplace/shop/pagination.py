@@ -0,0 +1,216 @@
+"""
+Keyset (курсорная) пагинация для HTML-каталога и REST API.
+
+В отличие от django.core.paginator.Paginator не делает COUNT(*) и OFFSET:
+следующая страница выбирается условием "после последней показанной строки"
+по ключу сортировки и id, поэтому глубокие страницы не медленнее первой.
+Курсор - подписанный токен, в котором лежат сортировка, направление и
+значения ключа граничной строки. Подпись без метки времени, поэтому курсор
+одной и той же строки всегда одинаков (ключи кеша страниц, ETag).
+"""
+from django.core import signing
+from django.core.exceptions import EmptyResultSet
+from django.db.models import Q
+from django.http import Http404
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+# Поля, по которым разрешена keyset-пагинация (id - всегда второй ключ)
+KEYSET_ORDERINGS = [
+    'default_price', '-default_price',
+    'created_at', '-created_at',
+    'avg_rating', '-avg_rating',
+]
+
+_SALT = 'shop.pagination.cursor'
+
+
+class KeysetPage:
+    def __init__(self, object_list, has_next, has_previous, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    def __init__(self, queryset, ordering, per_page, orderings=KEYSET_ORDERINGS):
+        if ordering not in orderings:
+            raise ValueError(f"Сортировка {ordering!r} не поддерживает keyset-пагинацию")
+        self.queryset = queryset
+        self.ordering = ordering
+        self.per_page = per_page
+        self.descending = ordering.startswith('-')
+        self.field_name = ordering.lstrip('-')
+        self.field = queryset.model._meta.get_field(self.field_name)
+
+    def encode_cursor(self, obj, direction='next'):
+        value = self.field.value_to_string(obj)
+        return signing.Signer(salt=_SALT).sign_object([self.ordering, direction, value, obj.pk], compress=True)
+
+    def decode_cursor(self, token):
+        try:
+            ordering, direction, value, pk = signing.Signer(salt=_SALT).unsign_object(token)
+        except (signing.BadSignature, ValueError, TypeError):
+            return None
+        if ordering != self.ordering or direction not in ('next', 'prev'):
+            return None
+        try:
+            return direction, self.field.to_python(value), int(pk)
+        except Exception:
+            return None
+
+    def _after(self, value, pk, descending):
+        lookup = 'lt' if descending else 'gt'
+        if self.field.primary_key:
+            # Без OR, чтобы условие шло поиском по первичному ключу
+            return Q(**{f'pk__{lookup}': pk})
+        # Условие на одно поле (>= / <=) дает поиск по индексу сортировки,
+        # OR внутри лишь отсекает строки с тем же значением и меньшим id
+        return Q(**{f'{self.field_name}__{lookup}e': value}) & (
+            Q(**{f'{self.field_name}__{lookup}': value}) |
+            Q(**{self.field_name: value, f'pk__{lookup}': pk})
+        )
+
+    def page_queryset(self, cursor):
+        """Запрос одной страницы (на одну строку больше, чтобы узнать, есть ли еще)"""
+        direction = cursor[0] if cursor else 'next'
+        # Для перехода назад идем в обратном порядке и разворачиваем результат
+        descending = self.descending if direction == 'next' else not self.descending
+
+        if descending:
+            queryset = self.queryset.order_by(f'-{self.field_name}', '-pk')
+        else:
+            queryset = self.queryset.order_by(self.field_name, 'pk')
+        if cursor:
+            queryset = queryset.filter(self._after(cursor[1], cursor[2], descending))
+        return queryset[:self.per_page + 1]
+
+    def get_page(self, token=None):
+        cursor = self.decode_cursor(token) if token else None
+        if token and cursor is None:
+            # Подделанный курсор или курсор другой сортировки
+            raise Http404("Неверный курсор")
+        direction = cursor[0] if cursor else 'next'
+
+        rows = list(self.page_queryset(cursor))
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if direction == 'next':
+            has_next, has_previous = has_more, cursor is not None
+        else:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+
+        return KeysetPage(
+            rows,
+            has_next=has_next,
+            has_previous=has_previous,
+            next_cursor=self.encode_cursor(rows[-1], 'next') if has_next and rows else None,
+            previous_cursor=self.encode_cursor(rows[0], 'prev') if has_previous and rows else None,
+        )
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Курсорная пагинация DRF поверх KeysetPaginator.
+
+    Сортировка - первое поле из ?ordering=, если оно есть в ordering_fields
+    представления, иначе cursor_ordering представления (по умолчанию id).
+    Размер страницы - ?page_size= (не больше max_page_size) или
+    cursor_page_size представления. cursor_orderings представления заменяет
+    список допустимых сортировок. Ответ: {"next", "previous", "results"}.
+    """
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering_param = 'ordering'
+    default_ordering = 'id'
+    # ETag списка считается по объектам страницы (shop/conditional.py)
+    validates_by_page = True
+
+    def __init__(self):
+        self.page = None
+        self._memo = None
+
+    def get_orderings(self, view):
+        # Действие, листающее свою таблицу (top_rated), задает сортировки само
+        orderings = getattr(view, 'cursor_orderings', None)
+        if orderings:
+            return orderings
+        fields = ['id', *(getattr(view, 'ordering_fields', None) or ())]
+        return [prefix + field for field in fields for prefix in ('', '-')]
+
+    def get_ordering(self, request, view):
+        orderings = self.get_orderings(view)
+        requested = request.query_params.get(self.ordering_param, '').split(',')[0].strip()
+        if requested in orderings:
+            return requested
+        return getattr(view, 'cursor_ordering', None) or self.default_ordering
+
+    def get_page_size(self, request, view):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return getattr(view, 'cursor_page_size', None) or self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Повторный вызов для того же запроса (ConditionalGetMixin, затем
+        # FragmentListMixin) отдает уже выбранную страницу
+        try:
+            memo_key = str(queryset.query)
+        except EmptyResultSet:
+            memo_key = None
+        if memo_key is not None and self._memo == memo_key:
+            return list(self.page)
+
+        self.request = request
+        ordering = self.get_ordering(request, view)
+        paginator = KeysetPaginator(
+            queryset, ordering, self.get_page_size(request, view), self.get_orderings(view)
+        )
+        token = request.query_params.get(self.cursor_query_param)
+        if token and paginator.decode_cursor(token) is None:
+            raise NotFound("Неверный курсор")
+        self.page = paginator.get_page(token)
+        self._memo = memo_key
+        return list(self.page)
+
+    def _link(self, token):
+        if token is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, token)
+
+    def get_next_link(self):
+        return self._link(self.page.next_cursor)
+
+    def get_previous_link(self):
+        return self._link(self.page.previous_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        link = {'type': 'string', 'nullable': True, 'format': 'uri'}
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {'next': link, 'previous': link, 'results': schema},
+        }
@@ -0,0 +1,97 @@
+"""
+Таблица рейтинга товаров (ProductRanking) для /api/products/top_rated/.
+
+Сырой avg_rating шумный: товар с одной пятеркой обгоняет товар с сотней
+оценок 4.8. Поэтому товары ранжируются по байесовскому среднему
+
+    score = (C * m + rating_sum) / (C + review_count),
+
+где m - средняя оценка по всем отзывам магазина, а C - вес априорного
+среднего (сколько "виртуальных" отзывов с оценкой m добавляется каждому
+товару). С ростом числа отзывов score приближается к avg_rating.
+
+В таблице только товары с отзывами, индексы (score, product) и
+(category, score, product) отдают top_rated и top_rated по категории
+проходом по индексу. Строка товара пересчитывается сигналами при изменении
+его отзывов и категории. m хранится в БД (RankingPrior) и меняется только
+полной перестройкой (rebuild_rankings): иначе каждый отзыв сдвигал бы
+оценки всех товаров, а строки, пересчитанные сигналами, расходились бы с
+остальными.
+"""
+from django.db.models import Sum
+
+from .models import Product, ProductRanking, RankingPrior
+
+# Единственная строка RankingPrior
+PRIOR_PK = 1
+
+PRIOR_WEIGHT = 10
+
+# Априорное среднее, пока в магазине нет ни одного отзыва
+DEFAULT_PRIOR_MEAN = 3.0
+
+# Сортировки keyset-пагинации по таблице рейтинга (shop/pagination.py)
+ORDERINGS = ['-score']
+
+
+def compute_prior_mean():
+    """Средняя оценка по всем отзывам (из агрегатов на товарах, shop/ratings.py)"""
+    totals = Product.objects.aggregate(count=Sum('review_count'), total=Sum('rating_sum'))
+    if not totals['count']:
+        return DEFAULT_PRIOR_MEAN
+    return totals['total'] / totals['count']
+
+
+def prior_mean():
+    """m, с которым посчитан рейтинг (до первой перестройки - DEFAULT_PRIOR_MEAN)"""
+    mean = RankingPrior.objects.filter(pk=PRIOR_PK).values_list('mean', flat=True).first()
+    return DEFAULT_PRIOR_MEAN if mean is None else mean
+
+
+def bayesian_score(review_count, rating_sum, mean):
+    return (PRIOR_WEIGHT * mean + rating_sum) / (PRIOR_WEIGHT + review_count)
+
+
+def refresh(product_ids):
+    """Пересчет строк рейтинга для набора товаров (константное число запросов)"""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return 0
+
+    mean = prior_mean()
+    rankings = [
+        ProductRanking(
+            product_id=pk,
+            category_id=category_id,
+            score=bayesian_score(review_count, rating_sum, mean),
+            review_count=review_count,
+        )
+        for pk, category_id, review_count, rating_sum in Product.objects.filter(
+            pk__in=product_ids, review_count__gt=0
+        ).values_list('pk', 'category_id', 'review_count', 'rating_sum')
+    ]
+    # Товары, у которых не осталось отзывов, из рейтинга уходят
+    ranked = {ranking.product_id for ranking in rankings}
+    ProductRanking.objects.filter(pk__in=[pk for pk in product_ids if pk not in ranked]).delete()
+    ProductRanking.objects.bulk_create(
+        rankings,
+        update_conflicts=True,
+        unique_fields=['product'],
+        update_fields=['category', 'score', 'review_count'],
+    )
+    return len(rankings)
+
+
+def rebuild(chunk_size=1000):
+    """Пересчитывает m и весь рейтинг, возвращает число товаров в рейтинге"""
+    RankingPrior(pk=PRIOR_PK, mean=compute_prior_mean()).save()
+    ids = Product.objects.order_by('pk').values_list('pk', flat=True)
+    total = 0
+    chunk = []
+    for pk in ids.iterator(chunk_size=chunk_size):
+        chunk.append(pk)
+        if len(chunk) >= chunk_size:
+            total += refresh(chunk)
+            chunk = []
+    total += refresh(chunk)
+    return total
@@ -0,0 +1,110 @@
+"""
+Агрегаты отзывов на товаре: количество, сумма, средняя оценка и
+гистограмма по оценкам 1-5.
+
+При сохранении/удалении отзыва агрегаты меняются одним UPDATE с
+F-выражениями (без чтения товара), поэтому параллельные отзывы не теряют
+обновления. recompute() пересчитывает все с нуля пачками.
+"""
+from django.db.models import Case, When, Value, F, FloatField, Count, Sum, Q
+from django.utils import timezone
+
+from .models import Product, Review
+
+HISTOGRAM_FIELDS = ['rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5']
+
+AGGREGATE_FIELDS = ['review_count', 'rating_sum', 'avg_rating'] + HISTOGRAM_FIELDS
+
+
+def bucket(rating):
+    """Номер столбца гистограммы (1-5) для оценки, оценки округляются до целого"""
+    return min(5, max(1, int(rating + 0.5)))
+
+
+def _bucket_filter(number):
+    if number == 1:
+        return Q(rating__lt=1.5)
+    if number == 5:
+        return Q(rating__gte=4.5)
+    return Q(rating__gte=number - 0.5, rating__lt=number + 0.5)
+
+
+def _apply(product_id, count_delta, sum_delta, buckets):
+    """Одно атомарное изменение агрегатов товара"""
+    new_count = F('review_count') + count_delta
+    new_sum = F('rating_sum') + sum_delta
+    # Без отзывов сумма обнуляется точно, чтобы не копить погрешность float
+    has_reviews = Q(review_count__gt=-count_delta)
+    updates = {
+        'review_count': new_count,
+        'rating_sum': Case(When(has_reviews, then=new_sum), default=Value(0.0), output_field=FloatField()),
+        'avg_rating': Case(When(has_reviews, then=new_sum / new_count), default=Value(0.0), output_field=FloatField()),
+        # update() не трогает auto_now, а от updated_at зависят ETag / Last-Modified
+        'updated_at': timezone.now(),
+    }
+    for number, delta in buckets.items():
+        field = f'rating_{number}'
+        updates[field] = F(field) + delta
+    Product.objects.filter(pk=product_id).update(**updates)
+
+
+def review_added(product_id, rating):
+    _apply(product_id, 1, rating, {bucket(rating): 1})
+
+
+def review_removed(product_id, rating):
+    _apply(product_id, -1, -rating, {bucket(rating): -1})
+
+
+def review_changed(old_product_id, old_rating, product_id, rating):
+    if old_product_id != product_id:
+        review_removed(old_product_id, old_rating)
+        review_added(product_id, rating)
+    elif old_rating != rating:
+        buckets = {bucket(old_rating): -1}
+        buckets[bucket(rating)] = buckets.get(bucket(rating), 0) + 1
+        _apply(product_id, 0, rating - old_rating, buckets)
+
+
+def recompute(chunk_size=1000):
+    """Пересчитывает агрегаты всех товаров пачками, возвращает число товаров"""
+    ids = Product.objects.order_by('pk').values_list('pk', flat=True)
+    total = 0
+    chunk = []
+    for pk in ids.iterator(chunk_size=chunk_size):
+        chunk.append(pk)
+        if len(chunk) >= chunk_size:
+            total += _recompute_chunk(chunk)
+            chunk = []
+    if chunk:
+        total += _recompute_chunk(chunk)
+    return total
+
+
+def _recompute_chunk(product_ids):
+    histogram = {
+        field: Count('id', filter=_bucket_filter(number))
+        for number, field in enumerate(HISTOGRAM_FIELDS, start=1)
+    }
+    stats = {
+        row['product_id']: row
+        for row in Review.objects.filter(product_id__in=product_ids)
+        .order_by()
+        .values('product_id')
+        .annotate(review_count=Count('id'), rating_sum=Sum('rating'), **histogram)
+    }
+
+    now = timezone.now()
+    products = []
+    for pk in product_ids:
+        row = stats.get(pk, {})
+        product = Product(pk=pk)
+        product.review_count = row.get('review_count', 0)
+        product.rating_sum = row.get('rating_sum') or 0.0
+        product.avg_rating = product.rating_sum / product.review_count if product.review_count else 0.0
+        for field in HISTOGRAM_FIELDS:
+            setattr(product, field, row.get(field, 0))
+        product.updated_at = now
+        products.append(product)
+    Product.objects.bulk_update(products, AGGREGATE_FIELDS + ['updated_at'])
+    return len(products)
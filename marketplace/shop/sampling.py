@@ -0,0 +1,129 @@
+"""
+Случайные выборки строк без ORDER BY RANDOM().
+
+RandomPool - пул (до size строк) из queryset, хранится в кеше вместе с
+данными для отображения. Выборка k элементов - k случайных индексов по
+пулу, без обращения к БД. Пул поддерживается точечно (add / discard из
+сигналов) и целиком пересобирается раз в ttl секунд.
+
+Вместе с пулом хранится число подходящих строк (seen). Когда пул полон,
+новая строка заменяет случайную с вероятностью size / seen (reservoir
+sampling), поэтому новые строки попадают в выборку так же, как старые, а
+не ждут пересборки. add / discard меняют пул под блокировкой в кеше
+(cache.add атомарна), чтобы параллельные сигналы не теряли изменения; если
+блокировку не дождаться, пул сбрасывается и пересобирается при следующей
+выборке.
+"""
+import random
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+
+from . import cache_metrics
+
+# Блокировка изменения пула: сколько живет (секунды) и сколько ее ждать
+LOCK_TIMEOUT = 5
+LOCK_WAIT = 1.0
+POLL_INTERVAL = 0.01
+
+
+class RandomPool:
+    def __init__(self, name, queryset, fields, size=500, ttl=60 * 60):
+        self.key = f'sampling:{name}'
+        self.queryset = queryset
+        self.fields = tuple(fields)
+        self.size = size
+        self.ttl = ttl
+
+    def _payloads(self, pks):
+        return [
+            (row['pk'], row)
+            for row in self.queryset.filter(pk__in=pks).values('pk', *self.fields)
+        ]
+
+    def build(self):
+        # Читаются только id (index-only scan), данные - для попавших в пул
+        with cache_metrics.recompute('sampling'):
+            pks = list(self.queryset.order_by().values_list('pk', flat=True))
+            seen = len(pks)
+            if seen > self.size:
+                pks = random.sample(pks, self.size)
+            items = self._payloads(pks)
+        cache.set(self.key, (seen, items), self.ttl)
+        return items
+
+    def items(self):
+        pool = cache.get(self.key)
+        if pool is None:
+            return self.build()
+        return pool[1]
+
+    def sample(self, k):
+        items = self.items()
+        return [row for _, row in random.sample(items, min(k, len(items)))]
+
+    @contextmanager
+    def _locked(self):
+        """True - блокировка пула взята, False - не дождались"""
+        lock_key = f'{self.key}:lock'
+        deadline = time.monotonic() + LOCK_WAIT
+        while not cache.add(lock_key, 1, LOCK_TIMEOUT):
+            if time.monotonic() >= deadline:
+                yield False
+                return
+            time.sleep(POLL_INTERVAL)
+        try:
+            yield True
+        finally:
+            cache.delete(lock_key)
+
+    def _update(self, change):
+        """change(seen, items) -> новый (seen, items) или None - без изменений"""
+        if cache.get(self.key) is None:
+            return
+        with self._locked() as locked:
+            if not locked:
+                self.invalidate()
+                return
+            pool = cache.get(self.key)
+            if pool is None:
+                return
+            pool = change(*pool)
+            if pool is not None:
+                cache.set(self.key, pool, self.ttl)
+
+    def add(self, *pks):
+        if cache.get(self.key) is None:
+            return
+        # Строка попадет в пул, только если подходит под условие queryset
+        payloads = self._payloads(list(dict.fromkeys(pks)))
+        if not payloads:
+            return
+
+        def change(seen, items):
+            known = {item[0] for item in items}
+            items = list(items)
+            for item in payloads:
+                if item[0] in known:
+                    continue
+                seen += 1
+                if len(items) < self.size:
+                    items.append(item)
+                else:
+                    position = random.randrange(seen)
+                    if position < self.size:
+                        items[position] = item
+            return seen, items
+        self._update(change)
+
+    def discard(self, pk):
+        def change(seen, items):
+            remaining = [item for item in items if item[0] != pk]
+            if len(remaining) == len(items):
+                return None
+            return max(seen - 1, len(remaining)), remaining
+        self._update(change)
+
+    def invalidate(self):
+        cache.delete(self.key)
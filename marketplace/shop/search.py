@@ -0,0 +1,175 @@
+"""
+Полнотекстовый поиск по товарам.
+
+Индекс хранится в отдельной таблице shop_product_fts: в SQLite это
+виртуальная таблица FTS5, в PostgreSQL - таблица с колонкой tsvector и
+GIN-индексом. Индексируются название, описание, бренд и категория товара.
+Для остальных СУБД используется старый поиск через icontains.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q, Value, FloatField
+
+from .models import Product
+
+INDEX_TABLE = 'shop_product_fts'
+
+# Максимум слов в поисковом запросе
+MAX_TERMS = 8
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+# Веса колонок для bm25: name, description, brand, category
+_SQLITE_RANK = f'-bm25({INDEX_TABLE}, 10.0, 1.0, 4.0, 4.0)'
+
+_PG_DOCUMENT = (
+    "setweight(to_tsvector('simple', %s), 'A') || "
+    "setweight(to_tsvector('simple', %s), 'B') || "
+    "setweight(to_tsvector('simple', %s), 'C')"
+)
+
+
+def is_supported():
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def _terms(query):
+    return _TERM_RE.findall(query.lower())[:MAX_TERMS]
+
+
+def _match_expression(terms):
+    """Префиксный запрос: все слова должны встретиться в документе"""
+    if connection.vendor == 'sqlite':
+        return ' '.join(f'"{term}"*' for term in terms)
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+def _fallback_filter(queryset, query):
+    # ProductCard хранит название бренда у себя, Product - через связь
+    brand_lookup = 'brand__name__icontains' if queryset.model is Product else 'brand_name__icontains'
+    return queryset.filter(
+        Q(name__icontains=query) |
+        Q(description__icontains=query) |
+        Q(**{brand_lookup: query})
+    ).distinct().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def filter_products(queryset, query):
+    """
+    Фильтрует queryset товаров (Product или ProductCard) по поисковому запросу.
+
+    В результат добавляется поле search_rank (чем больше, тем релевантнее),
+    по которому можно сортировать: queryset.order_by('-search_rank').
+    """
+    if not is_supported():
+        return _fallback_filter(queryset, query)
+
+    terms = _terms(query)
+    if not terms:
+        return queryset.none()
+
+    match = _match_expression(terms)
+    table = queryset.model._meta.db_table
+    pk_column = queryset.model._meta.pk.column
+
+    if connection.vendor == 'sqlite':
+        return queryset.extra(
+            select={'search_rank': _SQLITE_RANK},
+            tables=[INDEX_TABLE],
+            where=[
+                f'{INDEX_TABLE}.rowid = {table}.{pk_column}',
+                f'{INDEX_TABLE} MATCH %s',
+            ],
+            params=[match],
+        )
+
+    return queryset.extra(
+        select={'search_rank': f"ts_rank_cd({INDEX_TABLE}.document, to_tsquery('simple', %s))"},
+        select_params=[match],
+        tables=[INDEX_TABLE],
+        where=[
+            f'{INDEX_TABLE}.product_id = {table}.{pk_column}',
+            f"{INDEX_TABLE}.document @@ to_tsquery('simple', %s)",
+        ],
+        params=[match],
+    )
+
+
+def _document_rows(products):
+    for product in products:
+        yield (
+            product.pk,
+            product.name,
+            product.description,
+            product.brand.name,
+            product.category.name,
+        )
+
+
+def _write_rows(cursor, rows):
+    if connection.vendor == 'sqlite':
+        cursor.executemany(
+            f'DELETE FROM {INDEX_TABLE} WHERE rowid = %s',
+            [(row[0],) for row in rows]
+        )
+        cursor.executemany(
+            f'INSERT INTO {INDEX_TABLE} (rowid, name, description, brand, category) '
+            f'VALUES (%s, %s, %s, %s, %s)',
+            rows
+        )
+    else:
+        cursor.executemany(
+            f'INSERT INTO {INDEX_TABLE} (product_id, document) VALUES (%s, {_PG_DOCUMENT}) '
+            f'ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document',
+            [(pk, name, f'{brand} {category}', description)
+             for pk, name, description, brand, category in rows]
+        )
+
+
+def index_products(products):
+    """Добавляет или обновляет товары в индексе"""
+    if not is_supported():
+        return
+    rows = list(_document_rows(products))
+    if rows:
+        with connection.cursor() as cursor:
+            _write_rows(cursor, rows)
+
+
+def remove_products(product_ids):
+    if not is_supported():
+        return
+    column = 'rowid' if connection.vendor == 'sqlite' else 'product_id'
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {INDEX_TABLE} WHERE {column} = %s',
+            [(pk,) for pk in product_ids]
+        )
+
+
+def rebuild_index(chunk_size=1000):
+    """Полностью перестраивает индекс, возвращает число проиндексированных товаров"""
+    if not is_supported():
+        return 0
+
+    products = (
+        Product.objects
+        .select_related('brand', 'category')
+        .only('id', 'name', 'description', 'brand__name', 'category__name')
+        .order_by('id')
+    )
+    total = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {INDEX_TABLE}')
+        chunk = []
+        for row in _document_rows(products.iterator(chunk_size=chunk_size)):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                _write_rows(cursor, chunk)
+                total += len(chunk)
+                chunk = []
+        if chunk:
+            _write_rows(cursor, chunk)
+            total += len(chunk)
+    return total
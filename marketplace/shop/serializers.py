@@ -1,30 +1,69 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
-from .models import Product, Category, Brand, ProductVariant, Review
+from .models import Product, Category, Brand, ProductVariant, Review, Color, ProductColor
+
+class SparseFieldsMixin:
+    """
+    Сокращенное представление для ?fields= / ?expand= (shop/sparse.py):
+    context['fields'] оставляет только перечисленные поля, context['expand']
+    заменяет id связанного объекта вложенным сериализатором из expandable_fields.
+    """
+    expandable_fields = {}
+    field_columns = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        expand = self.context.get('expand') or ()
+        for name in expand:
+            self.fields[name] = self.expandable_fields[name](read_only=True)
+        fields = self.context.get('fields')
+        if fields:
+            for name in set(self.fields) - set(fields) - set(expand):
+                self.fields.pop(name)
+
+class CategorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = '__all__'
+
+class BrandSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Brand
+        fields = '__all__'
+
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'category': CategorySerializer, 'brand': BrandSerializer}
 
-class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = '__all__'
         extra_kwargs = {
             'default_price': {'min_value': 0.01}
         }
+        # Агрегаты отзывов считаются автоматически
+        read_only_fields = [
+            'avg_rating', 'review_count', 'rating_sum',
+            'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5',
+        ]
     
     def validate_name(self, value):
         if len(value) < 3:
             raise serializers.ValidationError("Название должно содержать минимум 3 символа")
         return value
 
-class CategorySerializer(serializers.ModelSerializer):
+class ColorSerializer(serializers.ModelSerializer):
     class Meta:
-        model = Category
+        model = Color
         fields = '__all__'
 
-class BrandSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Brand
-        fields = '__all__'
+class ProductVariantSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'product': ProductSerializer,
+        'color': ColorSerializer,
+        'category': CategorySerializer,
+        'brand': BrandSerializer,
+    }
 
-class ProductVariantSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductVariant
         fields = '__all__'
@@ -36,7 +75,9 @@ class ProductVariantSerializer(serializers.ModelSerializer):
             )
         ]
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'product': ProductSerializer}
+
     class Meta:
         model = Review
         fields = '__all__'
@@ -44,4 +85,74 @@ class ReviewSerializer(serializers.ModelSerializer):
     def validate_rating(self, value):
         if not 1 <= value <= 5:
             raise serializers.ValidationError("Рейтинг должен быть от 1 до 5")
-        return value
\ No newline at end of file
+        return value
+
+class ProductColorSerializer(serializers.ModelSerializer):
+    color = ColorSerializer(read_only=True)
+
+    class Meta:
+        model = ProductColor
+        fields = ['id', 'color']
+
+class NestedVariantSerializer(serializers.ModelSerializer):
+    color = ColorSerializer(read_only=True)
+
+    class Meta:
+        model = ProductVariant
+        exclude = ['product']
+
+# Сколько последних отзывов входит в сводку
+RECENT_REVIEWS = 5
+
+class ProductDetailSerializer(ProductSerializer):
+    """
+    Товар целиком: варианты с цветами, цвета товара и сводка отзывов.
+    Число запросов не зависит от количества вариантов и отзывов, если
+    queryset подготовлен через setup_eager_loading().
+    """
+    variants = NestedVariantSerializer(source='productvariant_set', many=True, read_only=True)
+    colors = ProductColorSerializer(source='productcolor_set', many=True, read_only=True)
+    review_summary = serializers.SerializerMethodField()
+    # Колонки товара для ?fields=review_summary (shop/sparse.py)
+    field_columns = {
+        'review_summary': ['review_count', 'avg_rating', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5'],
+    }
+
+    class Meta(ProductSerializer.Meta):
+        pass
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.prefetch_related(
+            Prefetch('productvariant_set', queryset=ProductVariant.objects.select_related('color').order_by('pk')),
+            Prefetch('productcolor_set', queryset=ProductColor.objects.select_related('color').order_by('pk')),
+            # Срез в Prefetch - последние отзывы каждого товара одним запросом (оконная функция)
+            Prefetch(
+                'review_set',
+                queryset=Review.objects.order_by('-created_at', '-pk')[:RECENT_REVIEWS],
+                to_attr='recent_reviews',
+            ),
+        )
+
+    @staticmethod
+    def related_objects(product):
+        """Вложенные объекты - для ETag (shop/conditional.py)"""
+        for variant in product.productvariant_set.all():
+            yield variant
+            yield variant.color
+        for product_color in product.productcolor_set.all():
+            yield product_color
+            yield product_color.color
+        yield from product.recent_reviews
+
+    def get_review_summary(self, product):
+        # Агрегаты денормализованы на товаре (shop/ratings.py)
+        return {
+            'count': product.review_count,
+            'avg_rating': product.avg_rating,
+            'distribution': {str(stars): getattr(product, f'rating_{stars}') for stars in range(1, 6)},
+            # ?fields= / ?expand= относятся к товару, отзывы - в полном виде
+            'recent': ReviewSerializer(
+                product.recent_reviews, many=True, context=dict(self.context, fields=(), expand=()),
+            ).data,
+        }
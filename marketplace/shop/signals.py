@@ -1,8 +1,272 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from .models import User, UserProfile
+from .models import User, UserProfile, Product, Brand, Category, Color, ProductVariant, Review
+from . import search, typeahead, cards, ratings, rankings, variants, catalog_cache
+from .homepage import REVIEWLESS_PRODUCTS
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.create(user=instance)
+
+
+# Синхронизация полнотекстового индекса товаров
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_products([instance])
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.remove_products([instance.pk])
+
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Category)
+def reindex_related_products(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if created or raw:
+        return
+    if update_fields is not None and 'name' not in update_fields:
+        return
+    field = 'brand' if sender is Brand else 'category'
+    search.index_products(
+        Product.objects.filter(**{field: instance}).select_related('brand', 'category')
+    )
+
+
+# Инвалидация индекса подсказок поиска
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Product)
+def update_typeahead(sender, instance, **kwargs):
+    typeahead.update_instance(instance)
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Product)
+def remove_from_typeahead(sender, instance, **kwargs):
+    typeahead.remove_instance(instance)
+
+
+# Агрегаты отзывов на товаре (и в его карточке)
+
+@receiver(pre_save, sender=Review)
+def remember_review_rating(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._previous_rating = (
+            Review.objects.filter(pk=instance.pk).values_list('product_id', 'rating').first()
+        )
+
+@receiver(post_save, sender=Review)
+def update_rating_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_rating', None)
+    if created or previous is None:
+        ratings.review_added(instance.product_id, instance.rating)
+    else:
+        old_product_id, old_rating = previous
+        ratings.review_changed(old_product_id, old_rating, instance.product_id, instance.rating)
+        if old_product_id != instance.product_id:
+            cards.refresh_review_summary(old_product_id)
+    cards.refresh_review_summary(instance.product_id)
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_delete(sender, instance, **kwargs):
+    ratings.review_removed(instance.product_id, instance.rating)
+    cards.refresh_review_summary(instance.product_id)
+
+
+# Байесовский рейтинг товаров (shop/rankings.py), после агрегатов отзывов
+
+@receiver(post_save, sender=Review)
+def refresh_review_ranking(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    product_ids = {instance.product_id}
+    previous = getattr(instance, '_previous_rating', None)
+    if previous is not None:
+        product_ids.add(previous[0])
+    rankings.refresh(product_ids)
+
+@receiver(post_delete, sender=Review)
+def refresh_removed_review_ranking(sender, instance, **kwargs):
+    rankings.refresh([instance.product_id])
+
+@receiver(post_save, sender=Product)
+def move_product_ranking(sender, instance, created, raw=False, **kwargs):
+    # Новый товар без отзывов в рейтинг не попадает, у старого может смениться категория
+    previous = getattr(instance, '_previous_owners', None)
+    if not created and not raw and previous is not None and previous[0] != instance.category_id:
+        rankings.refresh([instance.pk])
+
+
+# Поддержка денормализованных карточек товаров
+
+@receiver(post_save, sender=Product)
+def refresh_product_card(sender, instance, raw=False, **kwargs):
+    if not raw:
+        cards.refresh_cards([instance.pk])
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def refresh_card_variants(sender, instance, raw=False, **kwargs):
+    if not raw:
+        cards.refresh_variant_summary(instance.product_id)
+
+@receiver(post_save, sender=Category)
+def rename_card_category(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        cards.rename_category(instance)
+
+@receiver(post_save, sender=Brand)
+def rename_card_brand(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        cards.rename_brand(instance)
+
+@receiver(post_save, sender=Color)
+def rename_card_color(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        cards.rename_color(instance)
+
+
+# Сброс кешированных групп вариантов (страница товара)
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_variants(sender, instance, **kwargs):
+    variants.invalidate(instance.pk)
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_delete, sender=Review)
+def invalidate_variant_group(sender, instance, **kwargs):
+    variants.invalidate(instance.product_id)
+
+@receiver(post_save, sender=Review)
+def invalidate_reviewed_variants(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_rating', None)
+    if previous is not None and previous[0] != instance.product_id:
+        variants.invalidate(previous[0], instance.product_id)
+    else:
+        variants.invalidate(instance.product_id)
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Brand)
+@receiver(post_save, sender=Color)
+def invalidate_renamed_variants(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        variants.invalidate_related(**{sender._meta.model_name: instance})
+
+
+# Версии кеша страниц каталога (shop/catalog_cache.py)
+
+@receiver(pre_save, sender=Product)
+def remember_product_owners(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._previous_owners = (
+            Product.objects.filter(pk=instance.pk).values_list('category_id', 'brand_id').first()
+        )
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def bump_product_versions(sender, instance, **kwargs):
+    category_ids, brand_ids = {instance.category_id}, {instance.brand_id}
+    previous = getattr(instance, '_previous_owners', None)
+    if previous is not None:
+        category_ids.add(previous[0])
+        brand_ids.add(previous[1])
+    catalog_cache.bump('product', instance.pk)
+    catalog_cache.bump('category', *category_ids)
+    catalog_cache.bump('brand', *brand_ids)
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def bump_card_version(sender, instance, **kwargs):
+    # Меняются цены / рейтинг в карточке товара
+    product_ids = {instance.product_id}
+    previous = getattr(instance, '_previous_rating', None)
+    if previous is not None:
+        product_ids.add(previous[0])
+    catalog_cache.bump('product', *product_ids)
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+def bump_owner_version(sender, instance, **kwargs):
+    catalog_cache.bump(sender._meta.model_name, instance.pk)
+
+@receiver(post_save, sender=Color)
+def bump_product_list_version(sender, instance, **kwargs):
+    # Цвета есть только в карточках товаров
+    catalog_cache.bump('product')
+
+
+# Пул товаров без отзывов для случайного блока на главной
+
+@receiver(post_save, sender=Product)
+def add_reviewless_product(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        REVIEWLESS_PRODUCTS.add(instance.pk)
+
+@receiver(post_delete, sender=Product)
+def discard_reviewless_product(sender, instance, **kwargs):
+    REVIEWLESS_PRODUCTS.discard(instance.pk)
+
+@receiver(post_save, sender=Review)
+def discard_reviewed_product(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        REVIEWLESS_PRODUCTS.discard(instance.product_id)
+
+@receiver(post_delete, sender=Review)
+def restore_reviewless_product(sender, instance, **kwargs):
+    # Карточка уже пересчитана выше, add проверит, что отзывов не осталось
+    REVIEWLESS_PRODUCTS.add(instance.product_id)
+
+
+# Пакетная запись из API (shop/bulk.py): bulk_create / bulk_update не шлют
+# post_save, поэтому те же обновления выполняются здесь один раз на пакет.
+# Таблицы (поисковый индекс, карточки, рейтинг) пишутся в транзакции пакета,
+# кеши сбрасываются только после ее фиксации: иначе запрос между сбросом и
+# фиксацией снова положил бы в кеш прежние данные, а откат - незаписанные
+
+def products_bulk_saved(products, created, previous=None):
+    """previous - {pk: {'category': id, 'brand': id}} до обновления"""
+    product_ids = [product.pk for product in products]
+    category_ids = {product.category_id for product in products}
+    brand_ids = {product.brand_id for product in products}
+    for owners in (previous or {}).values():
+        category_ids.add(owners['category'])
+        brand_ids.add(owners['brand'])
+
+    search.index_products(Product.objects.filter(pk__in=product_ids).select_related('brand', 'category'))
+    typeahead.update_instances(products)
+    cards.refresh_cards(product_ids)
+    if not created:
+        rankings.refresh(product_ids)
+
+    def invalidate_caches():
+        variants.invalidate(*product_ids)
+        catalog_cache.bump('product', *product_ids)
+        catalog_cache.bump('category', *category_ids)
+        catalog_cache.bump('brand', *brand_ids)
+        if created:
+            REVIEWLESS_PRODUCTS.add(*product_ids)
+    transaction.on_commit(invalidate_caches)
+
+def variants_bulk_saved(product_variants, previous=None):
+    """previous - {pk: {'product': id, ...}} до обновления"""
+    product_ids = {variant.product_id for variant in product_variants}
+    product_ids.update(owners['product'] for owners in (previous or {}).values())
+
+    cards.refresh_variant_summaries(product_ids)
+
+    def invalidate_caches():
+        variants.invalidate(*product_ids)
+        catalog_cache.bump('product', *product_ids)
+    transaction.on_commit(invalidate_caches)
@@ -0,0 +1,71 @@
+"""
+Защита дорогих вычислений от "стампеда" при истечении кеша.
+
+Значение хранится вместе с моментом, до которого оно свежее, а сам ключ
+живет дольше (ttl + stale_ttl). Когда значение устарело, пересчитывает
+его только тот процесс, которому удалось взять блокировку cache.add()
+(атомарна в Redis, Memcached, файловом и locmem-кешах); остальные в это
+время отдают прежнее значение; если пересчет упал, прежнее значение
+отдает и он сам. Если значения нет совсем (холодный кеш), не взявшие
+блокировку ждут результата до wait секунд, а потом считают сами.
+"""
+import logging
+import time
+
+from django.core.cache import cache
+
+from . import cache_metrics
+
+LOCK_TIMEOUT = 30
+POLL_INTERVAL = 0.05
+
+logger = logging.getLogger(__name__)
+
+
+def _lock_key(key):
+    return f'{key}:lock'
+
+
+def set_value(key, value, ttl, stale_ttl=None):
+    stale_ttl = ttl if stale_ttl is None else stale_ttl
+    cache.set(key, (value, time.time() + ttl), ttl + stale_ttl)
+
+
+def _compute(key, compute, ttl, stale_ttl):
+    try:
+        with cache_metrics.recompute(cache_metrics.namespace(key)):
+            value = compute()
+        set_value(key, value, ttl, stale_ttl)
+        return value
+    finally:
+        cache.delete(_lock_key(key))
+
+
+def get_or_compute(key, compute, ttl, stale_ttl=None, lock_timeout=LOCK_TIMEOUT, wait=5):
+    """
+    Значение по ключу; compute() вызывается не более чем одним процессом
+    одновременно (пока блокировка не истечет через lock_timeout секунд).
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        value, fresh_until = entry
+        if time.time() < fresh_until:
+            return value
+        if cache.add(_lock_key(key), 1, lock_timeout):
+            try:
+                return _compute(key, compute, ttl, stale_ttl)
+            except Exception:
+                # Блокировку _compute уже снял - следующий запрос попробует снова
+                logger.exception('Не удалось пересчитать %s, отдаем прежнее значение', key)
+        return value
+
+    if cache.add(_lock_key(key), 1, lock_timeout):
+        return _compute(key, compute, ttl, stale_ttl)
+
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+    return compute()
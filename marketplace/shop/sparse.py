@@ -0,0 +1,96 @@
+"""
+Сокращенные ответы API: ?fields=id,name,default_price и ?expand=category,brand.
+
+fields урезает и представление (SparseFieldsMixin в shop/serializers.py), и
+список колонок запроса (.only(), SparseFieldsViewMixin ниже); expand заменяет id связанного объекта его
+вложенным представлением и добавляет связь в select_related, чтобы не было
+запроса на каждый объект. Параметры действуют только на чтение - запись
+всегда идет через полный сериализатор.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+from . import conditional
+
+# Колонки, нужные кешу фрагментов и валидаторам (shop/fragments.py, shop/conditional.py)
+ALWAYS_LOADED = ('updated_at',)
+
+
+def parse_list(value):
+    """'id, name,,id' -> ('id', 'name')"""
+    return tuple(dict.fromkeys(part.strip() for part in (value or '').split(',') if part.strip()))
+
+
+def columns(model, fields, expand, field_columns=None):
+    """
+    Аргументы .only() для выбранных полей сериализатора. field_columns -
+    колонки модели для вычисляемых полей ({'review_summary': [...]}).
+    """
+    names = {model._meta.pk.name, *ALWAYS_LOADED, *expand}
+    for name in fields:
+        names.update((field_columns or {}).get(name, ()))
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if field.concrete and not field.many_to_many:
+            names.add(name)
+    return sorted(names)
+
+
+class SparseFieldsViewMixin:
+    """?fields= / ?expand= для ModelViewSet с сериализатором на serializers.SparseFieldsMixin"""
+
+    def get_sparse_fields(self):
+        """(fields, expand) текущего запроса; пустые кортежи - полное представление"""
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = self._parse_sparse_fields()
+        return self._sparse_fields
+
+    def _parse_sparse_fields(self):
+        request = getattr(self, 'request', None)
+        if request is None or request.method not in SAFE_METHODS:
+            return (), ()
+        fields = parse_list(request.query_params.get('fields'))
+        expand = parse_list(request.query_params.get('expand'))
+
+        serializer_class = self.get_serializer_class()
+        errors = {}
+        unknown = [name for name in fields if name not in serializer_class().fields]
+        if unknown:
+            errors['fields'] = [f"Неизвестные поля: {', '.join(unknown)}"]
+        unknown = [name for name in expand if name not in serializer_class.expandable_fields]
+        if unknown:
+            errors['expand'] = [f"Нельзя развернуть: {', '.join(unknown)}"]
+        if errors:
+            raise ValidationError(errors)
+        return fields, expand
+
+    def shape_queryset(self, queryset):
+        fields, expand = self.get_sparse_fields()
+        if expand:
+            queryset = queryset.select_related(*expand)
+        if fields:
+            field_columns = getattr(self.get_serializer_class(), 'field_columns', None)
+            queryset = queryset.only(*columns(queryset.model, fields, expand, field_columns))
+        return queryset
+
+    def get_queryset(self):
+        return self.shape_queryset(super().get_queryset())
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'], context['expand'] = self.get_sparse_fields()
+        return context
+
+    # Вложенные объекты тоже влияют на ETag (shop/conditional.py)
+    def get_related_objects(self, instance):
+        return [getattr(instance, name) for name in self.get_sparse_fields()[1]]
+
+    def get_related_stats(self, queryset):
+        stats = []
+        for name in self.get_sparse_fields()[1]:
+            related = queryset.model._meta.get_field(name).related_model
+            stats.append(conditional.queryset_stats(related.objects.filter(pk__in=queryset.values(name))))
+        return stats
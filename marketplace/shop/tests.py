@@ -1,3 +1,1319 @@
-from django.test import TestCase
+import json
+import random
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+from io import StringIO
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from django.core import signing
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import LiveServerTestCase, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from rest_framework import mixins
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+
+from . import cache_metrics, cards, catalog_cache, facets, fragments, rankings, ratings, renderers, singleflight, typeahead
+from .management.commands import check_query_plans, warm_cache
+from .pagination import KEYSET_ORDERINGS, KeysetCursorPagination, KeysetPaginator
+from .sampling import RandomPool
+from .models import (
+    Category, Brand, Color, Product, ProductCard, ProductColor, ProductRanking, ProductVariant, Review,
+)
+from .multiget import MAX_IDS
+from .serializers import RECENT_REVIEWS, ProductSerializer
+from .views import PRODUCT_REVIEWS_SHOWN, ProductViewSet, ProductVariantViewSet
+
+# Без кеша фрагментов: иначе второй путь отдал бы фрагменты, собранные первым
+NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests'}}
+
+METRICS_CACHE = {'default': {'BACKEND': 'shop.cache_metrics.MetricsLocMemCache', 'LOCATION': 'metrics-tests'}}
+
+
+@override_settings(CACHES=NO_CACHE)
+class FastListTests(TestCase):
+    """Списки через values() (shop/fastpath.py) совпадают с ответом сериализатора байт в байт"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Обувь', photo='categories/shoes.png', slug='shoes')
+        brand = Brand.objects.create(name='Бренд', photo='brands/b.png', description='Описание')
+        color = Color.objects.create(name='Черный', color='#000000')
+        products = [
+            Product.objects.create(
+                name='Кеды "классика"', photo='products/кеды 1.png', slug='kedy', category=category,
+                brand=brand, description='Текст <b>с разметкой</b>', default_price=Decimal('1999.90'),
+            ),
+            Product.objects.create(
+                name='Ботинки', photo='', slug='botinki', category=category, brand=brand, description='',
+                default_price=Decimal('10'), avg_rating=4.25, manual='product_manuals/m.pdf',
+                video_url='https://example.com/v',
+            ),
+        ]
+        for index, product in enumerate(products):
+            ProductVariant.objects.create(
+                name=f'{product.name} {index}', photo='variants/v.png', product=product,
+                slug=f'variant-{index}', color=color, category=category, brand=brand, description='',
+                images=[{'url': 'variants/1.png', 'alt': 'вид сбоку'}, None, 1.5] if index else {},
+                price=Decimal('0.10') * index, technical_drawing='' if index else None,
+            )
+
+    def _get(self, viewset, params, fast_list):
+        view = viewset.as_view({'get': 'list'}, fast_list=fast_list)
+        response = view(APIRequestFactory().get('/', params))
+        self.assertEqual(response.status_code, 200)
+        return response.content
+
+    def assertSameContent(self, viewset, params):
+        self.assertEqual(self._get(viewset, params, True), self._get(viewset, params, False))
+
+    def test_products(self):
+        for params in ({}, {'ordering': '-default_price'}, {'ordering': 'avg_rating', 'page_size': 1},
+                       {'fields': 'id,name,photo,manual'}, {'search': 'Кеды'}):
+            with self.subTest(params=params):
+                self.assertSameContent(ProductViewSet, params)
+
+    def test_variants(self):
+        for params in ({}, {'product': Product.objects.get(slug='kedy').pk}, {'fields': 'images,price'}):
+            with self.subTest(params=params):
+                self.assertSameContent(ProductVariantViewSet, params)
+
+    def test_cursor_pages(self):
+        params = {'ordering': '-created_at', 'page_size': 1}
+        body = self._get(ProductViewSet, params, True)
+        cursor = parse_qs(urlsplit(json.loads(body)['next']).query)['cursor'][0]
+        self.assertSameContent(ProductViewSet, params)
+        self.assertSameContent(ProductViewSet, dict(params, cursor=cursor))
+
+    def test_rows_instead_of_models(self):
+        view = ProductViewSet(action_map={'get': 'list'}, format_kwarg=None, args=(), kwargs={}, headers={})
+        view.request = view.initialize_request(APIRequestFactory().get('/', {'fields': 'id,name'}))
+        view.initial(view.request)
+        row = view.get_queryset().order_by('pk').first()
+        self.assertNotIsInstance(row, Product)
+        self.assertEqual((row.pk, row.name), Product.objects.values_list('pk', 'name').order_by('pk')[0])
+
+    def test_expand_uses_serializer(self):
+        self.assertSameContent(ProductViewSet, {'expand': 'category,brand'})
+
+
+@override_settings(CACHES=NO_CACHE)
+class BulkWriteTests(TestCase):
+    """Пакетная запись (shop/bulk.py): ошибки по строкам и ничего не пишется при ошибке"""
+
+    @classmethod
+    def setUpClass(cls):
+        # Файлы в пакете передаются именами уже загруженных файлов
+        media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, media_root)
+        cls.enterClassContext(override_settings(MEDIA_ROOT=media_root))
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.photo = default_storage.save('variants/v.png', ContentFile(b'png'))
+        cls.category = Category.objects.create(name='Обувь', photo='categories/shoes.png', slug='shoes')
+        cls.brand = Brand.objects.create(name='Бренд', photo='brands/b.png', description='')
+        cls.black = Color.objects.create(name='Черный', color='#000000')
+        cls.white = Color.objects.create(name='Белый', color='#ffffff')
+        cls.product = Product.objects.create(
+            name='Кеды', photo='products/k.png', slug='kedy', category=cls.category, brand=cls.brand,
+            description='', default_price=Decimal('1999.90'),
+        )
+        cls.variant = ProductVariant.objects.create(
+            name='Кеды черные', photo=cls.photo, product=cls.product, slug='kedy-black', color=cls.black,
+            category=cls.category, brand=cls.brand, description='', images=[], price=Decimal('1999.90'),
+        )
+
+    def _row(self, slug, **fields):
+        row = {
+            'name': slug, 'photo': self.photo, 'product': self.product.pk, 'slug': slug,
+            'color': self.white.pk, 'category': self.category.pk, 'brand': self.brand.pk,
+            'description': 'Описание', 'images': [], 'price': '10.00',
+        }
+        row.update(fields)
+        return row
+
+    def _bulk(self, method, rows):
+        view = ProductVariantViewSet.as_view({'post': 'bulk', 'patch': 'bulk'})
+        request = getattr(APIRequestFactory(), method)('/', rows, format='json')
+        return view(request)
+
+    def test_create(self):
+        response = self._bulk('post', [self._row('kedy-white')])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ProductVariant.objects.get(slug='kedy-white').color, self.white)
+
+    @override_settings(CACHES=LOCMEM_CACHE)
+    def test_caches_after_commit(self):
+        dependencies = [('product', self.product.pk)]
+        versions = catalog_cache.get_versions(dependencies)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(self._bulk('post', [self._row('kedy-white')]).status_code, 201)
+        self.assertEqual(catalog_cache.get_versions(dependencies), versions)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(catalog_cache.get_versions(dependencies), versions)
+
+    def test_mixed_batch(self):
+        response = self._bulk('post', [self._row('kedy-white'), self._row('kedy-red', price='цена')])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('price', response.data[1])
+        self.assertFalse(ProductVariant.objects.filter(slug='kedy-white').exists())
+
+    def test_duplicate_in_batch(self):
+        response = self._bulk('post', [self._row('kedy-white'), self._row('kedy-white-2')])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('non_field_errors', response.data[1])
+        self.assertEqual(ProductVariant.objects.count(), 1)
+
+    def test_duplicate_in_database(self):
+        response = self._bulk('post', [self._row('kedy-black-2', color=self.black.pk)])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('non_field_errors', response.data[0])
+
+    def test_missing_foreign_key(self):
+        response = self._bulk('post', [self._row('kedy-white', product=self.product.pk + 1000)])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0]['product'][0].code, 'does_not_exist')
+        self.assertEqual(ProductVariant.objects.count(), 1)
+
+    def test_partial_update(self):
+        response = self._bulk('patch', [{'id': self.variant.pk, 'price': '1500.00'}])
+        self.assertEqual(response.status_code, 200)
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.price, Decimal('1500.00'))
+        self.assertEqual(self.variant.color, self.black)
+
+    def test_partial_update_unknown_id(self):
+        response = self._bulk('patch', [
+            {'id': self.variant.pk, 'price': '1500.00'}, {'id': self.variant.pk + 1000, 'price': '1.00'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('id', response.data[1])
+        self.variant.refresh_from_db()
+        self.assertEqual(self.variant.price, Decimal('1999.90'))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class FragmentListTests(TestCase):
+    """Список из кешированных фрагментов совпадает с ответом стандартного list() байт в байт"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Обувь', photo='categories/shoes.png', slug='shoes')
+        brand = Brand.objects.create(name='Бренд', photo='brands/b.png', description='Описание')
+        color = Color.objects.create(name='Черный', color='#000000')
+        for index in range(4):
+            product = Product.objects.create(
+                name=f'Кеды "{index}"', photo='products/k.png', slug=f'kedy-{index}', category=category,
+                brand=brand, description='Текст', default_price=Decimal(500 * (index + 1)),
+            )
+            ProductVariant.objects.create(
+                name=product.name, photo='variants/v.png', product=product, slug=f'kedy-{index}-1',
+                color=color, category=category, brand=brand, description='', images=[], price=product.default_price,
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def _view(self, viewset, params, fast_list=True):
+        view = viewset(
+            action_map={'get': 'list'}, format_kwarg=None, args=(), kwargs={}, headers={}, fast_list=fast_list,
+        )
+        view.request = view.initialize_request(APIRequestFactory().get('/', params))
+        view.initial(view.request)
+        return view
+
+    def _response(self, viewset, params, stock=False):
+        view = self._view(viewset, params, fast_list=not stock)
+        if stock:
+            # ListModelMixin.list - сериализация всей страницы без кеша фрагментов
+            response = view.finalize_response(view.request, mixins.ListModelMixin.list(view, view.request))
+            return response.render().content
+        response = fragments.FragmentListMixin.list(view, view.request)
+        self.assertNotIsInstance(response, Response)
+        return response.content
+
+    def assertSameAsStock(self, viewset, params):
+        self.assertEqual(self._response(viewset, params), self._response(viewset, params, stock=True))
+
+    def test_cold_and_warm(self):
+        for params in ({}, {'ordering': '-default_price'}, {'fields': 'id,name', 'expand': 'brand'}):
+            with self.subTest(params=params):
+                cache.clear()
+                self.assertSameAsStock(ProductViewSet, params)
+                self.assertSameAsStock(ProductViewSet, params)
+        self.assertSameAsStock(ProductVariantViewSet, {})
+
+    def test_partially_warm(self):
+        # Первая страница из двух товаров в кеше, остальные сериализуются при следующем запросе
+        self._response(ProductViewSet, {'ordering': 'default_price', 'page_size': 2})
+        self.assertSameAsStock(ProductViewSet, {'ordering': 'default_price', 'page_size': 4})
+
+    def test_updated_object(self):
+        self.assertSameAsStock(ProductViewSet, {})
+        product = Product.objects.order_by('pk').first()
+        product.name = 'Новое название'
+        product.save()
+        body = self._response(ProductViewSet, {})
+        self.assertIn('Новое название'.encode(), body)
+        self.assertEqual(body, self._response(ProductViewSet, {}, stock=True))
+
+    def test_expanded_object_updated(self):
+        params = {'expand': 'brand'}
+        self.assertSameAsStock(ProductViewSet, params)
+        Brand.objects.update(name='Другой бренд', updated_at=datetime(2030, 1, 1, tzinfo=timezone.utc))
+        self.assertIn('Другой бренд'.encode(), self._response(ProductViewSet, params))
+        self.assertSameAsStock(ProductViewSet, params)
+
+    def test_paginated_envelope(self):
+        params = {'ordering': '-created_at', 'page_size': 1}
+        self.assertSameAsStock(ProductViewSet, params)
+        cursor = parse_qs(urlsplit(json.loads(self._response(ProductViewSet, params))['next']).query)['cursor'][0]
+        body = json.loads(self._response(ProductViewSet, dict(params, cursor=cursor)))
+        self.assertIsNotNone(body['previous'])
+        self.assertSameAsStock(ProductViewSet, dict(params, cursor=cursor))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class SparseFieldsTests(TestCase):
+    """?fields= / ?expand=: колонки запроса, JOIN вместо запроса на объект и отдельные фрагменты"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Обувь', photo='categories/shoes.png', slug='shoes')
+        brand = Brand.objects.create(name='Бренд', photo='brands/b.png', description='Описание')
+        for index in range(3):
+            Product.objects.create(
+                name=f'Кеды {index}', photo='products/k.png', slug=f'kedy-{index}', category=category,
+                brand=brand, description='Длинное описание', default_price=Decimal(500 * (index + 1)),
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def _list(self, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('product-list'), params)
+        self.assertEqual(response.status_code, 200)
+        table = f'FROM "{Product._meta.db_table}"'
+        selects = [query['sql'] for query in queries if query['sql'].startswith('SELECT') and table in query['sql']]
+        return json.loads(response.content)['results'], selects
+
+    def test_fields_narrow_columns(self):
+        results, selects = self._list({'fields': 'id,name'})
+        self.assertEqual([set(item) for item in results], [{'id', 'name'}] * 3)
+        (sql,) = selects
+        self.assertIn('"name"', sql)
+        self.assertIn('"updated_at"', sql)
+        self.assertNotIn('"description"', sql)
+        self.assertNotIn('"default_price"', sql)
+
+    def test_expand_joins(self):
+        results, selects = self._list({'fields': 'id,category,brand', 'expand': 'category,brand'})
+        self.assertEqual(results[0]['category']['slug'], 'shoes')
+        self.assertEqual(results[0]['brand']['name'], 'Бренд')
+        (sql,) = selects
+        self.assertIn(f'JOIN "{Category._meta.db_table}"', sql)
+        self.assertIn(f'JOIN "{Brand._meta.db_table}"', sql)
+
+    def test_fragments_per_shape(self):
+        # Полные фрагменты в кеше не подменяют урезанные и наоборот
+        full, _ = self._list({})
+        narrow, _ = self._list({'fields': 'id,name'})
+        expanded, _ = self._list({'fields': 'id,brand', 'expand': 'brand'})
+        self.assertIn('description', full[0])
+        self.assertEqual(set(narrow[0]), {'id', 'name'})
+        self.assertIsInstance(expanded[0]['brand'], dict)
+        self.assertEqual(self._list({})[0], full)
+        self.assertEqual(len({
+            fragments._prefix(ProductSerializer, {'fields': fields, 'expand': expand})
+            for fields, expand in [((), ()), (('id', 'name'), ()), (('id', 'brand'), ('brand',))]
+        }), 3)
+
+    def test_unknown_fields(self):
+        response = self.client.get(reverse('product-list'), {'fields': 'id,secret', 'expand': 'owner'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(json.loads(response.content)), {'fields', 'expand'})
+
+
+@override_settings(CACHES=NO_CACHE)
+class KeysetPaginationTests(TestCase):
+    """KeysetPaginator: страницы без пропусков и повторов при одинаковых значениях ключа сортировки"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Обувь', photo='categories/shoes.png', slug='shoes')
+        brand = Brand.objects.create(name='Бренд', photo='brands/b.png', description='')
+        color = Color.objects.create(name='Черный', color='#000000')
+        prices = [500, 500, 500, 1000, 1000, 1500, 2000]
+        for index, price in enumerate(prices):
+            product = Product.objects.create(
+                name=f'Кеды {index}', photo='products/k.png', slug=f'kedy-{index}', category=category,
+                brand=brand, description='', default_price=Decimal(price),
+            )
+            ProductVariant.objects.create(
+                name=product.name, photo='variants/v.png', product=product, slug=f'kedy-{index}-1',
+                color=color, category=category, brand=brand, description='', images=[], price=product.default_price,
+            )
+        # Повторы во всех ключах сортировки, чтобы границы страниц попадали внутрь групп
+        pks = list(ProductCard.objects.order_by('pk').values_list('pk', flat=True))
+        ProductCard.objects.filter(pk__in=pks[:4]).update(created_at=datetime(2024, 1, 1, tzinfo=timezone.utc))
+        ProductCard.objects.filter(pk__in=pks[2:5]).update(avg_rating=4.5)
+        cls.category = category
+
+    def _walk(self, ordering, per_page=2):
+        paginator = KeysetPaginator(ProductCard.objects.all(), ordering, per_page)
+        forward, page = [], paginator.get_page()
+        self.assertFalse(page.has_previous)
+        while True:
+            self.assertLessEqual(len(page), per_page)
+            forward += [card.pk for card in page]
+            if not page.has_next:
+                break
+            page = paginator.get_page(page.next_cursor)
+        backward = []
+        while page.has_previous:
+            page = paginator.get_page(page.previous_cursor)
+            backward = [card.pk for card in page] + backward
+        return forward, backward
+
+    def test_all_orderings(self):
+        cards = list(ProductCard.objects.all())
+        for ordering in KEYSET_ORDERINGS:
+            with self.subTest(ordering=ordering):
+                field = ordering.lstrip('-')
+                expected = [card.pk for card in sorted(
+                    cards, key=lambda card: (getattr(card, field), card.pk), reverse=ordering.startswith('-')
+                )]
+                forward, backward = self._walk(ordering)
+                self.assertEqual(forward, expected)
+                # Назад от последней страницы (одна строка из семи) - все остальные в том же порядке
+                self.assertEqual(backward, expected[:-1])
+
+    def test_ties_broken_by_id(self):
+        cards = ProductCard.objects.filter(default_price=500).order_by('pk')
+        first, second, third = cards
+        paginator = KeysetPaginator(ProductCard.objects.all(), 'default_price', 1)
+        self.assertEqual(list(cards.filter(paginator._after(Decimal(500), second.pk, False))), [third])
+        self.assertEqual(list(cards.filter(paginator._after(Decimal(500), second.pk, True))), [first])
+
+    def test_cursor_is_deterministic(self):
+        card = ProductCard.objects.order_by('pk').first()
+        token = KeysetPaginator(ProductCard.objects.all(), '-created_at', 2).encode_cursor(card)
+        self.assertEqual(token, KeysetPaginator(ProductCard.objects.all(), '-created_at', 2).encode_cursor(card))
+        self.assertEqual(
+            signing.Signer(salt='shop.pagination.cursor').unsign_object(token)[3], card.pk
+        )
+
+    def test_cursor_of_other_ordering(self):
+        card = ProductCard.objects.order_by('pk').first()
+        token = KeysetPaginator(ProductCard.objects.all(), 'created_at', 2).encode_cursor(card)
+        self.assertIsNone(KeysetPaginator(ProductCard.objects.all(), '-created_at', 2).decode_cursor(token))
+
+    def test_tampered_cursor(self):
+        card = ProductCard.objects.order_by('pk').first()
+        token = KeysetPaginator(ProductCard.objects.all(), 'default_price', 2).encode_cursor(card)
+        for url, params in [
+            (reverse('product_list'), {'sort': 'default_price'}),
+            (reverse('category_detail', args=[self.category.slug]), {}),
+            (reverse('product-list'), {'ordering': 'default_price'}),
+        ]:
+            for cursor in (token[:-1] + ('A' if token[-1] != 'A' else 'B'), 'garbage', token + ':x'):
+                with self.subTest(url=url, cursor=cursor):
+                    self.assertEqual(self.client.get(url, dict(params, cursor=cursor)).status_code, 404)
+
+    def test_page_number_fallback(self):
+        response = self.client.get(reverse('product_list'), {'sort': 'default_price', 'page': '1'})
+        self.assertFalse(response.context['is_keyset'])
+        self.assertEqual(response.context['products'].number, 1)
+        self.assertEqual(len(response.context['products']), ProductCard.objects.count())
+
+    def test_relevance_fallback(self):
+        response = self.client.get(reverse('product_list'), {'q': 'Кеды'})
+        self.assertEqual(response.context['sort_by'], 'relevance')
+        self.assertFalse(response.context['is_keyset'])
+        self.assertEqual(response.context['products'].paginator.count, ProductCard.objects.count())
+
+
+@override_settings(CACHES=NO_CACHE)
+class CursorPaginationTests(TestCase):
+    """KeysetCursorPagination: потолок page_size и сортировки только из ordering_fields"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Обувь', photo='categories/shoes.png', slug='shoes')
+        brand = Brand.objects.create(name='Бренд', photo='brands/b.png', description='')
+        # bulk_create без сигналов: списку API нужны только строки товаров
+        Product.objects.bulk_create([
+            Product(
+                name=f'Кеды {index:03}', photo='products/k.png', slug=f'kedy-{index}', category=category,
+                brand=brand, description='', default_price=Decimal(1000 + index % 7),
+            )
+            for index in range(KeysetCursorPagination.max_page_size + 5)
+        ])
+
+    def _get(self, params):
+        response = self.client.get(reverse('product-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def _walk(self, params):
+        body = self._get(params)
+        ids = [item['id'] for item in body['results']]
+        while body['next']:
+            body = self._get(dict(params, cursor=parse_qs(urlsplit(body['next']).query)['cursor'][0]))
+            ids += [item['id'] for item in body['results']]
+        return ids
+
+    def test_page_size_cap(self):
+        body = self._get({'page_size': 1000})
+        self.assertEqual(len(body['results']), KeysetCursorPagination.max_page_size)
+        self.assertIsNotNone(body['next'])
+        for page_size, expected in (('0', 1), ('-5', 1), ('abc', KeysetCursorPagination.page_size), ('7', 7)):
+            with self.subTest(page_size=page_size):
+                self.assertEqual(len(self._get({'page_size': page_size})['results']), expected)
+
+    def test_ordering_whitelist(self):
+        by_price = list(Product.objects.order_by('-default_price', '-pk').values_list('pk', flat=True))
+        self.assertEqual(self._walk({'ordering': '-default_price', 'page_size': 30}), by_price)
+        by_id = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+        # Поле не из ordering_fields (и второе поле сортировки) игнорируется - сортировка по id
+        for ordering in ('name', '-description', 'id,-default_price', 'default_price;drop'):
+            with self.subTest(ordering=ordering):
+                self.assertEqual(self._walk({'ordering': ordering, 'page_size': 50}), by_id)
+
+
+@override_settings(CACHES=NO_CACHE)
+class FacetTests(TestCase):
+    """compute_facets: дизъюнктивные счетчики, ценовые диапазоны и игнорирование неверных параметров"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categories = [
+            Category.objects.create(name=name, photo='categories/c.png', slug=slug)
+            for name, slug in [('Обувь', 'shoes'), ('Сумки', 'bags')]
+        ]
+        cls.brands = [
+            Brand.objects.create(name=name, photo='brands/b.png', description='') for name in ('Альфа', 'Бета')
+        ]
+        # (категория, бренд, цена): цены на границах диапазонов попадают в верхний
+        catalog = [
+            (0, 0, 500), (0, 0, 1000), (0, 1, 2999), (0, 1, 3000),
+            (1, 0, 5000), (1, 0, 9999.99), (1, 1, 10000), (1, 1, 25000), (1, 1, 700),
+        ]
+        for index, (category, brand, price) in enumerate(catalog):
+            Product.objects.create(
+                name=f'Товар {index}', photo='products/p.png', slug=f'tovar-{index}',
+                category=cls.categories[category], brand=cls.brands[brand], description='',
+                default_price=Decimal(str(price)),
+            )
+
+    def _expected(self, cards, category_id=None, brand_id=None):
+        def counts(rows, field):
+            result = {}
+            for card in rows:
+                result[getattr(card, field)] = result.get(getattr(card, field), 0) + 1
+            return result
+
+        in_brand = [card for card in cards if brand_id is None or card.brand_id == brand_id]
+        in_category = [card for card in cards if category_id is None or card.category_id == category_id]
+        selected = [card for card in in_brand if card in in_category]
+        prices = [
+            sum(1 for card in selected if (lower is None or card.default_price >= lower)
+                and (upper is None or card.default_price < upper))
+            for lower, upper in facets.PRICE_BUCKETS
+        ]
+        return counts(in_brand, 'category_id'), counts(in_category, 'brand_id'), prices, len(selected)
+
+    def _actual(self, result):
+        return (
+            {row['id']: row['count'] for row in result['categories']},
+            {row['id']: row['count'] for row in result['brands']},
+            [bucket['count'] for bucket in result['prices']],
+            result['total'],
+        )
+
+    def test_disjunctive_counts(self):
+        cards = list(ProductCard.objects.all())
+        for category_id in (None, *(category.pk for category in self.categories)):
+            for brand_id in (None, *(brand.pk for brand in self.brands)):
+                with self.subTest(category=category_id, brand=brand_id):
+                    result = facets.compute_facets(ProductCard.objects.all(), category_id, brand_id)
+                    self.assertEqual(self._actual(result), self._expected(cards, category_id, brand_id))
+
+    def test_selected_category_keeps_others(self):
+        shoes, bags = self.categories
+        result = facets.compute_facets(ProductCard.objects.all(), category_id=shoes.pk)
+        self.assertEqual({row['id']: row['count'] for row in result['categories']}, {shoes.pk: 4, bags.pk: 5})
+        self.assertEqual(result['total'], 4)
+
+    def test_price_buckets(self):
+        result = facets.compute_facets(ProductCard.objects.all())
+        self.assertEqual(
+            [(bucket['min'], bucket['max'], bucket['count']) for bucket in result['prices']],
+            [(None, 1000, 2), (1000, 3000, 2), (3000, 5000, 1), (5000, 10000, 2), (10000, None, 2)],
+        )
+
+    def test_price_filter_view(self):
+        response = self.client.get(reverse('product_list'), {'min_price': 1000, 'max_price': 5000})
+        self.assertEqual(response.context['total_count'], 4)
+        self.assertEqual([bucket['count'] for bucket in response.context['price_facets']], [0, 2, 1, 1, 0])
+
+    def test_malformed_params_ignored(self):
+        expected = self.client.get(reverse('product_list')).context['total_count']
+        for params in (
+            {'category': 'обувь'}, {'brand': '1.5'}, {'category': ''}, {'min_price': 'дешево'},
+            {'max_price': '1,5'}, {'min_price': '', 'max_price': ''}, {'min_price': 'NaN'}, {'max_price': 'Infinity'}, {'category': '10**9', 'brand': 'x'},
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('product_list'), params)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context['total_count'], expected)
+
+
+@override_settings(CACHES=NO_CACHE)
+class QueryPlanTests(TestCase):
+    """check_query_plans: планы настоящих запросов страниц и API"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Обувь', photo='categories/shoes.png', slug='shoes')
+        brand = Brand.objects.create(name='Бренд', photo='brands/b.png', description='')
+        color = Color.objects.create(name='Черный', color='#000000')
+        for index in range(3):
+            product = Product.objects.create(
+                name=f'Кеды {index}', photo='products/k.png', slug=f'kedy-{index}', category=category,
+                brand=brand, description='', default_price=Decimal(500 * (index + 1)),
+            )
+            ProductVariant.objects.create(
+                name=product.name, photo='variants/v.png', product=product, slug=f'kedy-{index}-1',
+                color=color, category=category, brand=brand, description='', images=[], price=product.default_price,
+            )
+
+    def test_hot_paths(self):
+        stdout = StringIO()
+        call_command('check_query_plans', stdout=stdout)
+        self.assertIn('ok         api products: discounted', stdout.getvalue())
+        self.assertNotIn('FULL SCAN', stdout.getvalue())
+
+    def test_filtered_scan(self):
+        queries = check_query_plans.capture(lambda: list(Product.objects.filter(description='x')[:20]))
+        (sql, params), = queries.items()
+        plan = check_query_plans.explain(sql, params)
+        self.assertEqual(check_query_plans.full_scans(plan, sql), [Product._meta.db_table])
+
+
+@override_settings(CACHES=NO_CACHE)
+class ProductReviewsTests(TestCase):
+    """Блок отзывов страницы товара: только последние отзывы, версия - количество и max(updated_at)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Обувь', photo='categories/shoes.png', slug='shoes')
+        brand = Brand.objects.create(name='Бренд', photo='brands/b.png', description='')
+        color = Color.objects.create(name='Черный', color='#000000')
+        cls.product = Product.objects.create(
+            name='Кеды', photo='products/k.png', slug='kedy', category=category, brand=brand,
+            description='', default_price=Decimal('1999.90'),
+        )
+        ProductVariant.objects.create(
+            name='Кеды', photo='variants/v.png', product=cls.product, slug='kedy-1', color=color,
+            category=category, brand=brand, description='', images=[], price=Decimal('1999.90'),
+        )
+        cls.reviews = [
+            Review.objects.create(product=cls.product, rating=5, name=f'Автор {index}', description='Текст')
+            for index in range(PRODUCT_REVIEWS_SHOWN + 2)
+        ]
+
+    def _get(self):
+        response = self.client.get(reverse('product_detail', args=[self.product.slug]))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_latest_reviews_only(self):
+        response = self._get()
+        shown = list(response.context['reviews'])
+        self.assertEqual(shown, self.reviews[::-1][:PRODUCT_REVIEWS_SHOWN])
+        self.assertContains(response, f'из {len(self.reviews)} отзывов')
+
+    def test_version_follows_reviews(self):
+        versions = [self._get().context['reviews_version']]
+        review = self.reviews[0]
+        review.description = 'Новый текст'
+        review.save()
+        versions.append(self._get().context['reviews_version'])
+        review.delete()
+        versions.append(self._get().context['reviews_version'])
+        self.assertEqual(len(set(versions)), 3)
+
+    def test_etag_follows_reviews(self):
+        etag = self._get()['ETag']
+        self.assertEqual(self.client.get(
+            reverse('product_detail', args=[self.product.slug]), HTTP_IF_NONE_MATCH=etag
+        ).status_code, 304)
+        review = self.reviews[0]
+        review.description = 'Новый текст'
+        review.save()
+        self.assertNotEqual(self._get()['ETag'], etag)
+
+
+@override_settings(CACHES=NO_CACHE)
+class ProductCardTests(TestCase):
+    """Карточка после точечных обновлений совпадает с пересобранной с нуля (cards.refresh_cards)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Обувь', photo='categories/shoes.png', slug='shoes')
+        cls.brand = Brand.objects.create(name='Бренд', photo='brands/b.png', description='')
+        cls.black = Color.objects.create(name='Черный', color='#000000')
+        cls.white = Color.objects.create(name='Белый', color='#ffffff')
+        cls.products = []
+        for index, colors in enumerate([(cls.black, cls.white), (cls.black,), (cls.white,)]):
+            product = Product.objects.create(
+                name=f'Кеды {index}', photo='products/k.png', slug=f'kedy-{index}', category=cls.category,
+                brand=cls.brand, description='', default_price=Decimal('1999.90'),
+            )
+            for number, color in enumerate(colors, start=1):
+                ProductVariant.objects.create(
+                    name=f'{product.name} {color.name}', photo='variants/v.png', product=product,
+                    slug=f'kedy-{index}-{number}', color=color, category=cls.category, brand=cls.brand,
+                    description='', images=[], price=Decimal(1000 * number),
+                )
+            cls.products.append(product)
+
+    def _cards(self):
+        return list(ProductCard.objects.order_by('pk').values())
+
+    def assertCardsFresh(self):
+        cards_before = self._cards()
+        cards.rebuild()
+        self.assertEqual(cards_before, self._cards())
+
+    def test_variant_changes(self):
+        variant = ProductVariant.objects.get(slug='kedy-0-2')
+        variant.price = Decimal('500')
+        variant.save()
+        self.assertCardsFresh()
+        self.assertEqual(ProductCard.objects.get(pk=self.products[0].pk).min_price, Decimal('500'))
+        variant.color = self.black
+        variant.save()
+        self.assertCardsFresh()
+        variant.delete()
+        self.assertCardsFresh()
+
+    def test_review_changes(self):
+        review = Review.objects.create(product=self.products[1], rating=4, name='Автор', description='Текст')
+        self.assertCardsFresh()
+        review.rating = 2
+        review.save()
+        self.assertCardsFresh()
+        review.delete()
+        self.assertCardsFresh()
+
+    def test_renames(self):
+        self.black.name = 'Графит'
+        self.black.save()
+        self.assertCardsFresh()
+        self.assertIn({'name': 'Графит', 'color': '#000000'}, ProductCard.objects.get(pk=self.products[1].pk).colors)
+        self.category.name = 'Кеды и кроссовки'
+        self.category.save()
+        self.assertCardsFresh()
+        self.brand.name = 'Другой бренд'
+        self.brand.save()
+        self.assertCardsFresh()
+
+    def test_rename_color_queries(self):
+        Color.objects.filter(pk=self.white.pk).update(name='Молочный')
+        # Цвета затронутых товаров и одно UPDATE карточек, независимо от их числа
+        with self.assertNumQueries(2):
+            cards.rename_color(self.white)
+        milky = {'name': 'Молочный', 'color': '#ffffff'}
+        renamed = [card.pk for card in ProductCard.objects.order_by('pk') if milky in card.colors]
+        self.assertEqual(renamed, [self.products[0].pk, self.products[2].pk])
+        self.assertCardsFresh()
+
+
+@override_settings(CACHES=NO_CACHE)
+class RatingAggregateTests(TestCase):
+    """Агрегаты отзывов после точечных UPDATE совпадают с пересчетом с нуля (ratings.recompute)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Обувь', photo='categories/shoes.png', slug='shoes')
+        brand = Brand.objects.create(name='Бренд', photo='brands/b.png', description='')
+        cls.products = [
+            Product.objects.create(
+                name=f'Кеды {index}', photo='products/k.png', slug=f'kedy-{index}', category=category,
+                brand=brand, description='', default_price=Decimal('1999.90'),
+            )
+            for index in range(2)
+        ]
+
+    def _aggregates(self):
+        return {
+            row.pop('pk'): row
+            for row in Product.objects.order_by('pk').values('pk', *ratings.AGGREGATE_FIELDS)
+        }
+
+    def assertMatchesRecompute(self):
+        incremental = self._aggregates()
+        ratings.recompute()
+        recomputed = self._aggregates()
+        for pk, row in recomputed.items():
+            for field, value in row.items():
+                with self.subTest(product=pk, field=field):
+                    self.assertAlmostEqual(incremental[pk][field], value)
+
+    def test_review_lifecycle(self):
+        first, second = self.products
+        reviews = [
+            Review.objects.create(product=first, rating=rating, name='Автор', description='Текст')
+            for rating in (5, 4.6, 1.2, 3)
+        ]
+        self.assertMatchesRecompute()
+        self.assertEqual(Product.objects.get(pk=first.pk).rating_5, 2)
+
+        # Изменение оценки с переходом в другой столбец гистограммы
+        reviews[0].rating = 2
+        reviews[0].save()
+        self.assertMatchesRecompute()
+
+        # Перенос отзыва на другой товар вместе со сменой оценки
+        reviews[1].product = second
+        reviews[1].rating = 4
+        reviews[1].save()
+        self.assertMatchesRecompute()
+        self.assertEqual(Product.objects.get(pk=second.pk).review_count, 1)
+
+        for review in reviews:
+            review.delete()
+            self.assertMatchesRecompute()
+        self.assertEqual(
+            self._aggregates()[first.pk],
+            dict.fromkeys(ratings.AGGREGATE_FIELDS, 0) | {'rating_sum': 0.0, 'avg_rating': 0.0},
+        )
+
+    def test_updated_at_bumped(self):
+        product = self.products[0]
+        before = Product.objects.get(pk=product.pk).updated_at
+        Review.objects.create(product=product, rating=5, name='Автор', description='Текст')
+        self.assertGreater(Product.objects.get(pk=product.pk).updated_at, before)
+
+
+@override_settings(CACHES=NO_CACHE)
+class ConditionalGetTests(TestCase):
+    """ETag страниц и API: повторный запрос с If-None-Match - 304, правка вложенных объектов меняет ETag"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Обувь', photo='categories/shoes.png', slug='shoes')
+        brand = Brand.objects.create(name='Бренд', photo='brands/b.png', description='')
+        cls.color = Color.objects.create(name='Черный', color='#000000')
+        cls.product = Product.objects.create(
+            name='Кеды', photo='products/k.png', slug='kedy', category=cls.category, brand=brand,
+            description='', default_price=Decimal('1999.90'),
+        )
+        cls.variant = ProductVariant.objects.create(
+            name='Кеды', photo='variants/v.png', product=cls.product, slug='kedy-1', color=cls.color,
+            category=cls.category, brand=brand, description='', images=[], price=Decimal('1999.90'),
+        )
+        cls.review = Review.objects.create(product=cls.product, rating=5, name='Автор', description='Текст')
+
+    def _urls(self):
+        return {
+            'product_detail': reverse('product_detail', args=[self.product.slug]),
+            'product_variant_detail': reverse('product_variant_detail', args=[self.variant.slug]),
+            'category_detail': reverse('category_detail', args=[self.category.slug]),
+            'product-list': reverse('product-list'),
+            'product-detail': reverse('product-detail', args=[self.product.pk]),
+            'product-full': reverse('product-full', args=[self.product.pk]),
+            'productvariant-list': reverse('productvariant-list'),
+            'productvariant-list expand': reverse('productvariant-list') + '?expand=color',
+            'review-list': reverse('review-list'),
+        }
+
+    def _etags(self):
+        etags = {}
+        for name, url in self._urls().items():
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, name)
+            etags[name] = response['ETag']
+        return etags
+
+    def assertChanged(self, before, names):
+        after = self._etags()
+        for name in names:
+            with self.subTest(changed=name):
+                self.assertNotEqual(after[name], before[name])
+
+    def test_not_modified(self):
+        for name, url in self._urls().items():
+            with self.subTest(name=name):
+                etag = self.client.get(url)['ETag']
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+
+    def test_review_edit(self):
+        before = self._etags()
+        self.review.rating = 3
+        self.review.save()
+        # Оценка меняет агрегаты товара и его updated_at (shop/ratings.py)
+        self.assertChanged(before, ['product_detail', 'product-list', 'product-detail', 'product-full', 'review-list'])
+
+    def test_variant_edit(self):
+        before = self._etags()
+        self.variant.price = Decimal('1499.90')
+        self.variant.save()
+        self.assertChanged(before, ['product_detail', 'product_variant_detail', 'product-full', 'productvariant-list'])
+
+    def test_color_edit(self):
+        before = self._etags()
+        self.color.name = 'Графит'
+        self.color.save()
+        self.assertChanged(before, [
+            'product_detail', 'product_variant_detail', 'product-full', 'productvariant-list expand',
+        ])
+
+
+@override_settings(CACHES=NO_CACHE)
+class MultiGetTests(TestCase):
+    """GET .../multi/?ids=: объекты в порядке ids, отсутствующие id, ограничение MAX_IDS"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Обувь', photo='categories/shoes.png', slug='shoes')
+        brand = Brand.objects.create(name='Бренд', photo='brands/b.png', description='')
+        color = Color.objects.create(name='Черный', color='#000000')
+        cls.products = []
+        for index in range(3):
+            product = Product.objects.create(
+                name=f'Кеды {index}', photo='products/k.png', slug=f'kedy-{index}', category=category,
+                brand=brand, description='', default_price=Decimal(500 * (index + 1)),
+            )
+            ProductVariant.objects.create(
+                name=product.name, photo='variants/v.png', product=product, slug=f'kedy-{index}-1',
+                color=color, category=category, brand=brand, description='', images=[], price=product.default_price,
+            )
+            cls.products.append(product)
+
+    def _get(self, name, ids):
+        return self.client.get(reverse(name), {'ids': ids})
+
+    def test_requested_order(self):
+        first, second, third = (product.pk for product in self.products)
+        missing = third + 100
+        response = self._get('product-multi-get', f'{third},{missing},{first},{third}')
+        self.assertEqual(response.status_code, 200)
+        body = json.loads(response.content)
+        self.assertEqual([item['id'] for item in body['results']], [third, first])
+        self.assertEqual(body['missing'], [missing])
+
+    def test_variants(self):
+        variants = list(ProductVariant.objects.order_by('-pk'))
+        body = json.loads(self._get('productvariant-multi-get', ','.join(str(v.pk) for v in variants)).content)
+        self.assertEqual([item['id'] for item in body['results']], [variant.pk for variant in variants])
+        self.assertEqual(body['missing'], [])
+
+    def test_fields(self):
+        response = self.client.get(reverse('product-multi-get'), {'ids': self.products[0].pk, 'fields': 'id,name'})
+        self.assertEqual(json.loads(response.content)['results'], [{'id': self.products[0].pk, 'name': 'Кеды 0'}])
+
+    def test_limit(self):
+        self.assertEqual(self._get('product-multi-get', ','.join(map(str, range(1, MAX_IDS + 1)))).status_code, 200)
+        response = self._get('product-multi-get', ','.join(map(str, range(1, MAX_IDS + 2))))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ids', json.loads(response.content))
+
+    def test_invalid_ids(self):
+        for ids in ('', ',', 'abc', '1,x'):
+            with self.subTest(ids=ids):
+                self.assertEqual(self._get('product-multi-get', ids).status_code, 400)
+
+
+@override_settings(CACHES=NO_CACHE)
+class ProductFullTests(TestCase):
+    """/api/products/<pk>/full/: фиксированное число запросов и только последние отзывы в сводке"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Обувь', photo='categories/shoes.png', slug='shoes')
+        brand = Brand.objects.create(name='Бренд', photo='brands/b.png', description='')
+        cls.product = Product.objects.create(
+            name='Кеды', photo='products/k.png', slug='kedy', category=category, brand=brand,
+            description='', default_price=Decimal('1999.90'),
+        )
+        for index, name in enumerate(['Черный', 'Белый', 'Красный']):
+            color = Color.objects.create(name=name, color=f'#00000{index}')
+            ProductColor.objects.create(product=cls.product, color=color)
+            ProductVariant.objects.create(
+                name=f'Кеды {name}', photo='variants/v.png', product=cls.product, slug=f'kedy-{index + 1}',
+                color=color, category=category, brand=brand, description='', images=[], price=Decimal('1999.90'),
+            )
+        cls.reviews = [
+            Review.objects.create(product=cls.product, rating=index % 5 + 1, name=f'Автор {index}', description='Текст')
+            for index in range(RECENT_REVIEWS + 3)
+        ]
+
+    def test_queries(self):
+        url = reverse('product-full', args=[self.product.pk])
+        # Товар, варианты с цветами, цвета товара, последние отзывы
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['variants']), 3)
+        self.assertEqual(len(response.data['colors']), 3)
+
+    def test_recent_reviews(self):
+        summary = self.client.get(reverse('product-full', args=[self.product.pk])).data['review_summary']
+        self.assertEqual(summary['count'], len(self.reviews))
+        self.assertEqual(
+            [review['id'] for review in summary['recent']],
+            [review.pk for review in self.reviews[::-1][:RECENT_REVIEWS]],
+        )
+        self.assertEqual(sum(summary['distribution'].values()), len(self.reviews))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class TypeaheadTests(TestCase):
+    """Подсказки (shop/typeahead.py) видят изменения только зафиксированных транзакций"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Обувь', photo='categories/shoes.png', slug='shoes')
+        cls.brand = Brand.objects.create(name='Бренд', photo='brands/b.png', description='')
+
+    def setUp(self):
+        cache.clear()
+        typeahead._index = None
+        self.addCleanup(setattr, typeahead, '_index', None)
+        typeahead.get_index()
+
+    def _create(self, name):
+        return Product.objects.create(
+            name=name, photo='products/k.png', slug='kedy', category=self.category, brand=self.brand,
+            description='', default_price=Decimal('10'),
+        )
+
+    def _names(self, query):
+        return [product['name'] for product in typeahead.lookup(query)['products']]
+
+    def test_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = self._create('Кеды')
+        self.assertEqual(self._names('кед'), ['Кеды'])
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        self.assertEqual(self._names('кед'), [])
+
+    def test_rollback(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self._create('Кеды')
+            raise RuntimeError
+        self.assertEqual(self._names('кед'), [])
+
+
+class RankingTests(TestCase):
+    """Средняя оценка m (shop/rankings.py) хранится в БД и меняется только перестройкой"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Обувь', photo='categories/shoes.png', slug='shoes')
+        brand = Brand.objects.create(name='Бренд', photo='brands/b.png', description='')
+        cls.product = Product.objects.create(
+            name='Кеды', photo='products/k.png', slug='kedy', category=category, brand=brand,
+            description='', default_price=Decimal('1999.90'),
+        )
+        Product.objects.filter(pk=cls.product.pk).update(review_count=2, rating_sum=10.0)
+
+    def assertScore(self, mean, review_count, rating_sum):
+        self.assertAlmostEqual(
+            ProductRanking.objects.get(pk=self.product.pk).score,
+            rankings.bayesian_score(review_count, rating_sum, mean),
+        )
+
+    def test_refresh_keeps_prior_mean(self):
+        rankings.rebuild()
+        self.assertEqual(rankings.prior_mean(), 5.0)
+        Product.objects.filter(pk=self.product.pk).update(review_count=4, rating_sum=12.0)
+
+        rankings.refresh([self.product.pk])
+        self.assertEqual(rankings.prior_mean(), 5.0)
+        self.assertScore(5.0, 4, 12.0)
+
+        rankings.rebuild()
+        self.assertEqual(rankings.prior_mean(), 3.0)
+        self.assertScore(3.0, 4, 12.0)
+
+
+@override_settings(CACHES=METRICS_CACHE)
+class CacheMetricsTests(SimpleTestCase):
+    """Счетчики бэкенда кеша по пространствам имен (shop/cache_metrics.py)"""
+
+    def setUp(self):
+        cache.clear()
+        cache_metrics.reset()
+
+    def _delta(self, run):
+        """Изменившиеся за run() счетчики процесса: {пространство имен: {событие: прирост}}"""
+        before = cache_metrics.local_totals()
+        run()
+        delta = {}
+        for name, counts in cache_metrics.local_totals().items():
+            previous = before.get(name, {})
+            changed = {event: count - previous.get(event, 0) for event, count in counts.items()}
+            changed = {event: count for event, count in changed.items() if count}
+            if changed:
+                delta[name] = changed
+        return delta
+
+    def test_namespace(self):
+        self.assertEqual(cache_metrics.namespace('facets:0a1b'), 'facets')
+        self.assertEqual(cache_metrics.namespace('fragment:abc:shop.product:1:2024'), 'fragment')
+        self.assertEqual(cache_metrics.namespace('template.cache.product_reviews.0a1b'), 'template.product_reviews')
+
+    def test_counts_per_namespace(self):
+        def run():
+            cache.get('facets:a')
+            cache.set('facets:a', 1)
+            cache.get('facets:a')
+            cache.set_many({'fragment:a': b'{}', 'fragment:b': b'{}'})
+            cache.get_many(['fragment:a', 'fragment:b', 'fragment:c'])
+            cache.delete('fragment:a')
+            with cache_metrics.recompute('facets'):
+                pass
+
+        delta = self._delta(run)
+        self.assertEqual(delta['facets'], {'hits': 1, 'misses': 1, 'sets': 1, 'recomputes': 1})
+        # get_many и set_many считаются по ключам, без вложенных get / set бэкенда
+        self.assertEqual(delta['fragment'], {'hits': 2, 'misses': 1, 'sets': 2, 'evictions': 1})
+        self.assertEqual(set(delta), {'facets', 'fragment'})
+
+    def test_snapshot(self):
+        cache.set('homepage:snapshot', 1)
+        cache.get('homepage:snapshot')
+        cache.get('homepage:snapshot')
+        cache.get('homepage:other')
+        counts = cache_metrics.snapshot()['homepage']
+        self.assertEqual((counts['hits'], counts['misses'], counts['sets']), (2, 1, 1))
+        self.assertEqual(counts['hit_ratio'], round(2 / 3, 4))
+        # Собственные ключи метрик в статистику не попадают
+        self.assertNotIn('metrics', cache_metrics.snapshot())
+
+    def test_request_counters(self):
+        cache_metrics.start_request()
+        cache.get('variants:1')
+        cache.set('variants:1', 1)
+        cache.get('variants:1')
+        counters = cache_metrics.finish_request()
+        self.assertEqual((counters['variants']['hits'], counters['variants']['misses']), (1, 1))
+        cache.get('variants:1')
+        self.assertEqual(cache_metrics.finish_request(), {})
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class SingleflightTests(SimpleTestCase):
+    """Пересчет устаревшего значения (shop/singleflight.py)"""
+
+    key = 'tests:singleflight'
+
+    def setUp(self):
+        cache.clear()
+
+    def _in_threads(self, count, target):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(target())) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_one_compute_on_miss(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = self._in_threads(5, lambda: singleflight.get_or_compute(self.key, compute, 60))
+        self.assertEqual(results, ['value'] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_stale_value_during_rebuild(self):
+        singleflight.set_value(self.key, 'old', -1, 60)
+        started, release = threading.Event(), threading.Event()
+
+        def compute():
+            started.set()
+            release.wait(5)
+            return 'new'
+
+        rebuild = threading.Thread(target=singleflight.get_or_compute, args=(self.key, compute, 60))
+        rebuild.start()
+        self.assertTrue(started.wait(5))
+        self.assertEqual(singleflight.get_or_compute(self.key, self.fail, 60), 'old')
+        release.set()
+        rebuild.join(5)
+        self.assertEqual(singleflight.get_or_compute(self.key, self.fail, 60), 'new')
+
+    def test_compute_failure(self):
+        def compute():
+            raise ValueError('compute failed')
+
+        with self.assertRaises(ValueError):
+            singleflight.get_or_compute(self.key, compute, 60)
+
+        singleflight.set_value(self.key, 'old', -1, 60)
+        with self.assertLogs('shop.singleflight', 'ERROR'):
+            self.assertEqual(singleflight.get_or_compute(self.key, compute, 60), 'old')
+        # Блокировка снята: следующий запрос пересчитывает значение
+        self.assertEqual(singleflight.get_or_compute(self.key, lambda: 'new', 60), 'new')
+
+
+class StubPool(RandomPool):
+    """Пул без БД: строка - просто id"""
+
+    def __init__(self, pks, size):
+        super().__init__('tests', None, fields=(), size=size)
+        self.pks = pks
+
+    def build(self):
+        items = [(pk, {'pk': pk}) for pk in self.pks[:self.size]]
+        cache.set(self.key, (len(self.pks), items), self.ttl)
+        return items
+
+    def _payloads(self, pks):
+        return [(pk, {'pk': pk}) for pk in pks]
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class RandomPoolTests(SimpleTestCase):
+    """Пул случайных строк (shop/sampling.py)"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_new_rows_replace_when_full(self):
+        random.seed(0)
+        self.addCleanup(random.seed)
+        pool = StubPool(list(range(10)), size=10)
+        pool.build()
+        pool.add(*range(10, 1000))
+        pks = {pk for pk, _ in pool.items()}
+        self.assertEqual(len(pks), 10)
+        # Каждая из 1000 строк в пуле с вероятностью 1/100: старых почти не остается
+        self.assertLess(len(pks & set(range(10))), 3)
+        self.assertEqual(cache.get(pool.key)[0], 1000)
+
+    def test_discard(self):
+        pool = StubPool([1, 2, 3], size=10)
+        pool.build()
+        pool.discard(2)
+        self.assertEqual(sorted(pk for pk, _ in pool.items()), [1, 3])
+        pool.add(2)
+        self.assertEqual(sorted(pk for pk, _ in pool.items()), [1, 2, 3])
+
+    def test_concurrent_updates(self):
+        pool = StubPool([], size=1000)
+        pool.build()
+        threads = [threading.Thread(target=pool.add, args=(pk,)) for pk in range(50)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(sorted(pk for pk, _ in pool.items()), list(range(50)))
+
+
+class RendererTests(SimpleTestCase):
+    """FastJSONRenderer (shop/renderers.py) совпадает с JSONRenderer DRF байт в байт"""
+
+    data = {
+        'price': Decimal('1999.90'),
+        'created_at': datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+        'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'label': gettext_lazy('Обувь'),
+        'items': [{'price': Decimal('0.10'), 'text': 'строка \u2028 с разделителем'}],
+    }
+
+    def test_parity(self):
+        for media_type in ('application/json', 'application/json; indent=2'):
+            with self.subTest(media_type=media_type):
+                self.assertEqual(
+                    renderers.FastJSONRenderer().render(self.data, media_type),
+                    JSONRenderer().render(self.data, media_type),
+                )
+
+
+class BrokenLinkWarmCache(warm_cache.Command):
+    def urls(self, products):
+        yield '/shop/no-such-page/'
+        yield from super().urls(products)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class WarmCacheTests(LiveServerTestCase):
+    """warm_cache: страницы запрашиваются у работающего сайта, ошибка одного URL не прерывает прогрев"""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Обувь', photo='categories/shoes.png', slug='shoes')
+        brand = Brand.objects.create(name='Бренд', photo='brands/b.png', description='')
+        color = Color.objects.create(name='Черный', color='#000000')
+        product = Product.objects.create(
+            name='Кеды', photo='products/k.png', slug='kedy', category=category, brand=brand,
+            description='', default_price=Decimal('1999.90'),
+        )
+        ProductVariant.objects.create(
+            name='Кеды', photo='variants/v.png', product=product, slug='kedy-1', color=color,
+            category=category, brand=brand, description='', images=[], price=Decimal('1999.90'),
+        )
+
+    def _warm(self, command='warm_cache', base_url=None):
+        stdout = StringIO()
+        call_command(command, base_url=base_url or self.live_server_url, concurrency=2, timeout=5, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_warms_through_http(self):
+        output = self._warm()
+        total = len(list(warm_cache.Command().urls(100)))
+        self.assertIn(f'Прогрето {total} из {total} страниц', output)
+        self.assertIn('ошибок: 0', output)
+        # Сервер работает в этом же процессе, поэтому его LocMemCache виден тесту
+        self.assertTrue(any(key.startswith(':1:fragment:') for key in cache._cache))
+
+    def test_failed_url_counted(self):
+        output = self._warm(BrokenLinkWarmCache())
+        total = len(list(warm_cache.Command().urls(100)))
+        self.assertIn('404 /shop/no-such-page/', output)
+        self.assertIn(f'Прогрето {total} из {total + 1} страниц', output)
+        self.assertIn('ошибок: 1', output)
+
+    def test_unreachable_site(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        output = self._warm(base_url=f'http://127.0.0.1:{port}')
+        total = len(list(warm_cache.Command().urls(100)))
+        self.assertIn(f'Прогрето 0 из {total} страниц', output)
+        self.assertIn(f'ошибок: {total}', output)
@@ -0,0 +1,337 @@
+"""
+Префиксный индекс для подсказок поиска (/search/).
+
+Индекс живет в памяти процесса и отвечает без обращений к БД. Для каждой
+сущности (категории, бренды, товары) хранится отсортированный список ключей
+(слово названия, id), поиск по префиксу - бинарный поиск по этому списку.
+
+Изменения моделей (сигналы) после фиксации транзакции записываются в
+журнал в общем кеше: номер последнего изменения - счетчик, каждое
+изменение - отдельный ключ; откаченное изменение не попадает ни в один
+индекс. Процесс, в котором изменилась модель, применяет изменение к своему
+индексу сразу, остальные раз в VERSION_CHECK_INTERVAL дочитывают журнал и
+применяют пропущенные изменения. Если журнал потерян (вытеснен из кеша,
+сменилась эпоха) или отставание больше MAX_DELTAS, индекс перестраивается
+в фоновом потоке, а до замены запросы обслуживает прежний индекс. Синхронно
+индекс строится только один раз - при первом запросе процесса.
+"""
+import re
+import threading
+import logging
+import time
+import uuid
+from bisect import bisect_left, insort
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from . import cache_metrics
+from .models import Category, Brand, Product
+
+EPOCH_KEY = 'typeahead:epoch'
+
+# Изменения журнала хранятся столько (секунды); пропустивший их процесс перестраивает индекс
+DELTA_TTL = 60 * 60
+
+# При большем отставании от журнала индекс дешевле перестроить
+MAX_DELTAS = 1000
+
+# Как часто процесс сверяет свою позицию в журнале с общей (секунды)
+VERSION_CHECK_INTERVAL = 1.0
+
+# Сколько кандидатов просматривать на один запрос при фильтрации по нескольким словам
+MAX_CANDIDATES = 1000
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+logger = logging.getLogger(__name__)
+
+
+def _tokens(text):
+    return _TERM_RE.findall(text.lower())
+
+
+class PrefixIndex:
+    """Индекс одной сущности: отсортированные ключи + полезная нагрузка по id"""
+
+    def __init__(self):
+        self.keys = []
+        self.payloads = {}
+        self.tokens = {}
+
+    def add(self, pk, name, payload):
+        if pk in self.payloads:
+            self.remove(pk)
+        tokens = set(_tokens(name))
+        self.payloads[pk] = payload
+        self.tokens[pk] = tokens
+        for token in tokens:
+            insort(self.keys, (token, pk))
+
+    def remove(self, pk):
+        self.payloads.pop(pk, None)
+        for token in self.tokens.pop(pk, ()):
+            position = bisect_left(self.keys, (token, pk))
+            if position < len(self.keys) and self.keys[position] == (token, pk):
+                del self.keys[position]
+
+    @classmethod
+    def build(cls, rows):
+        """Построение за один проход: rows - пары (name, payload)"""
+        index = cls()
+        for name, payload in rows:
+            pk = payload['id']
+            tokens = set(_tokens(name))
+            index.payloads[pk] = payload
+            index.tokens[pk] = tokens
+            index.keys.extend((token, pk) for token in tokens)
+        index.keys.sort()
+        return index
+
+    def lookup(self, terms, limit):
+        # Ищем по самому длинному слову - у него меньше всего совпадений
+        prefix = max(terms, key=len)
+        others = [term for term in terms if term is not prefix]
+
+        results = []
+        seen = set()
+        position = bisect_left(self.keys, (prefix,))
+        end = min(len(self.keys), position + MAX_CANDIDATES)
+        while position < end and len(results) < limit:
+            token, pk = self.keys[position]
+            position += 1
+            if not token.startswith(prefix):
+                break
+            if pk in seen:
+                continue
+            seen.add(pk)
+            tokens = self.tokens[pk]
+            if all(any(token.startswith(term) for token in tokens) for term in others):
+                results.append(dict(self.payloads[pk]))
+        return results
+
+
+def _category_payload(pk, name, slug, photo):
+    return {'id': pk, 'name': name, 'slug': slug, 'photo': photo}
+
+
+def _brand_payload(pk, name, photo):
+    return {'id': pk, 'name': name, 'photo': photo}
+
+
+def _product_payload(pk, name, slug, photo, default_price):
+    return {'id': pk, 'name': name, 'slug': slug, 'photo': photo, 'default_price': default_price}
+
+
+def _price(value):
+    # После save() в экземпляре может остаться float или строка - приводим к виду из БД
+    places = Product._meta.get_field('default_price').decimal_places
+    return Decimal(str(value)).quantize(Decimal(1).scaleb(-places))
+
+
+class TypeaheadIndex:
+    def __init__(self, epoch, sequence):
+        # Позиция в журнале изменений, по которую изменения уже в индексе
+        self.epoch = epoch
+        self.sequence = sequence
+        # Изменения (add / remove) идут по месту, поэтому поиск их не должен видеть наполовину
+        self.lock = threading.Lock()
+        self.categories = PrefixIndex.build(
+            (row[1], _category_payload(*row))
+            for row in Category.objects.values_list('id', 'name', 'slug', 'photo').iterator()
+        )
+        self.brands = PrefixIndex.build(
+            (row[1], _brand_payload(*row))
+            for row in Brand.objects.values_list('id', 'name', 'photo').iterator()
+        )
+        self.products = PrefixIndex.build(
+            (row[1], _product_payload(*row))
+            for row in Product.objects.values_list(
+                'id', 'name', 'slug', 'photo', 'default_price'
+            ).iterator(chunk_size=5000)
+        )
+
+    def lookup(self, query, limit):
+        terms = _tokens(query)
+        if not terms:
+            return {'categories': [], 'brands': [], 'products': []}
+
+        with self.lock:
+            categories = self.categories.lookup(terms, limit)
+            brands = self.brands.lookup(terms, limit)
+            products = self.products.lookup(terms, limit)
+        for product in products:
+            # Ссылка ведет на первый вариант товара
+            product['slug'] = f"{product['slug']}-1"
+        return {'categories': categories, 'brands': brands, 'products': products}
+
+    def apply(self, changes, sequence=None):
+        """
+        changes - изменения (сущность, pk, название, payload), payload None -
+        удаление. Повторное применение безопасно, поэтому журнал можно
+        дочитывать с любой позиции не дальше текущей.
+        """
+        with self.lock:
+            for entity, pk, name, payload in changes:
+                if payload is None:
+                    getattr(self, entity).remove(pk)
+                else:
+                    getattr(self, entity).add(pk, name, payload)
+            if sequence is not None:
+                self.sequence = sequence
+
+
+_lock = threading.Lock()
+_index = None
+_checked_at = 0.0
+_rebuilding = False
+
+
+def _sequence_key(epoch):
+    return f'typeahead:{epoch}:sequence'
+
+
+def _delta_key(epoch, sequence):
+    return f'typeahead:{epoch}:delta:{sequence}'
+
+
+def _new_epoch():
+    """Новый журнал: все процессы перестроят индекс"""
+    epoch = uuid.uuid4().hex
+    cache.set(_sequence_key(epoch), 0, None)
+    cache.set(EPOCH_KEY, epoch, None)
+    return epoch, 0
+
+
+def _shared_position():
+    """(эпоха, номер последнего изменения) общего журнала"""
+    epoch = cache.get(EPOCH_KEY)
+    if epoch is None:
+        epoch = uuid.uuid4().hex
+        cache.add(_sequence_key(epoch), 0, None)
+        if not cache.add(EPOCH_KEY, epoch, None):
+            epoch = cache.get(EPOCH_KEY, epoch)
+    sequence = cache.get(_sequence_key(epoch))
+    if sequence is None:
+        # Счетчик вытеснен - номера изменений нельзя продолжить
+        return _new_epoch()
+    return epoch, sequence
+
+
+def _catch_up(index, epoch, sequence):
+    """Дочитывает журнал в индекс; False - журнал не годится, нужна перестройка"""
+    if index.epoch != epoch or not index.sequence <= sequence <= index.sequence + MAX_DELTAS:
+        return False
+    if index.sequence == sequence:
+        return True
+    keys = [_delta_key(epoch, number) for number in range(index.sequence + 1, sequence + 1)]
+    deltas = cache.get_many(keys)
+    if len(deltas) != len(keys):
+        return False
+    index.apply([change for key in keys for change in deltas[key]], sequence)
+    return True
+
+
+def _rebuild(epoch, sequence):
+    global _index, _rebuilding
+    try:
+        with cache_metrics.recompute('typeahead'):
+            index = TypeaheadIndex(epoch, sequence)
+        with _lock:
+            _index = index
+    except Exception:
+        logger.exception('Не удалось перестроить индекс подсказок')
+    finally:
+        with _lock:
+            _rebuilding = False
+        # Соединение с БД этого потока больше не понадобится
+        connection.close()
+
+
+def _rebuild_in_background(epoch, sequence):
+    global _rebuilding
+    with _lock:
+        if _rebuilding:
+            return
+        _rebuilding = True
+    threading.Thread(target=_rebuild, args=(epoch, sequence), name='typeahead-rebuild', daemon=True).start()
+
+
+def get_index():
+    global _index, _checked_at
+    now = time.monotonic()
+    index = _index
+    if index is not None and now - _checked_at < VERSION_CHECK_INTERVAL:
+        return index
+
+    _checked_at = now
+    epoch, sequence = _shared_position()
+    if index is None:
+        with _lock:
+            if _index is None:
+                with cache_metrics.recompute('typeahead'):
+                    _index = TypeaheadIndex(epoch, sequence)
+            return _index
+    if not _catch_up(index, epoch, sequence):
+        _rebuild_in_background(epoch, sequence)
+    return index
+
+
+def lookup(query, limit=5):
+    return get_index().lookup(query, limit)
+
+
+def _publish(changes):
+    """Применяет изменения к индексу процесса и записывает их в журнал для остальных"""
+    epoch, _ = _shared_position()
+    try:
+        sequence = cache.incr(_sequence_key(epoch))
+    except ValueError:
+        # Счетчик вытеснен между чтением и incr - начинаем новый журнал
+        _new_epoch()
+        return
+    cache.set(_delta_key(epoch, sequence), changes, DELTA_TTL)
+
+    index = _index
+    if index is not None and index.epoch == epoch:
+        # Позиция сдвигается, только если до этого изменения индекс был полон;
+        # иначе пропущенное дочитается из журнала вместе с этим изменением
+        index.apply(changes, sequence if index.sequence == sequence - 1 else None)
+
+
+def _change(instance):
+    if isinstance(instance, Category):
+        payload = _category_payload(instance.pk, instance.name, instance.slug, instance.photo.name)
+        return 'categories', instance.pk, instance.name, payload
+    if isinstance(instance, Brand):
+        return 'brands', instance.pk, instance.name, _brand_payload(instance.pk, instance.name, instance.photo.name)
+    payload = _product_payload(instance.pk, instance.name, instance.slug,
+                               instance.photo.name, _price(instance.default_price))
+    return 'products', instance.pk, instance.name, payload
+
+
+def _publish_on_commit(changes):
+    # Изменения собираются сразу (после delete у экземпляра уже не будет pk),
+    # а публикуются, только если транзакция зафиксирована
+    transaction.on_commit(lambda: _publish(changes))
+
+
+def update_instances(instances):
+    """Несколько объектов одним изменением журнала (пакетная запись)"""
+    changes = [
+        _change(instance) for instance in instances if isinstance(instance, (Category, Brand, Product))
+    ]
+    if changes:
+        _publish_on_commit(changes)
+
+
+def update_instance(instance):
+    update_instances([instance])
+
+
+def remove_instance(instance):
+    entities = {Category: 'categories', Brand: 'brands', Product: 'products'}
+    entity = entities.get(type(instance))
+    if entity is not None:
+        _publish_on_commit([(entity, instance.pk, None, None)])
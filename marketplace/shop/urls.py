@@ -50,6 +50,8 @@ urlpatterns = [
     path('product/<slug:product_slug>/variant/create/', views.product_variant_create, name='product_variant_create'),
     path('variant/<slug:slug>/edit/', views.product_variant_update, name='product_variant_update'),
     path('variant/<slug:slug>/delete/', views.product_variant_delete, name='product_variant_delete'),
+
+    path('cache-metrics/', views.cache_metrics_view, name='cache_metrics'),
     
     # API URLs
     path('', include(router.urls)),
@@ -0,0 +1,67 @@
+"""
+Группы вариантов товара для страниц product_detail / product_variant_detail.
+
+Варианты товара выбираются по внешнему ключу ProductVariant.product (а не по
+префиксу slug) вместе с цветом, брендом, категорией и товаром. Отзывов в
+группе нет: страница показывает только последние из них.
+Собранная группа кешируется на товар, поэтому при прогретом кеше страница
+товара делает один запрос - поиск товара или варианта по slug.
+Группа сбрасывается сигналами при изменении товара, его вариантов, отзывов,
+а также при переименовании цвета, бренда или категории.
+
+signature() дает версию набора объектов для ключа {% cache %} блока выбора
+варианта в product_detail.html: он берется из кеша, пока не изменится хотя
+бы один объект в нем.
+"""
+import hashlib
+
+from django.core.cache import cache
+
+from . import cache_metrics
+from .models import ProductVariant
+
+GROUP_TTL = 60 * 60
+
+
+def group_key(product_id):
+    return f'variants:group:{product_id}'
+
+
+def build_group(product_id):
+    return list(
+        ProductVariant.objects.filter(product_id=product_id)
+        .select_related('color', 'product', 'brand', 'category')
+        .order_by('pk')
+    )
+
+
+def get_group(product_id):
+    variants = cache.get(group_key(product_id))
+    if variants is None:
+        with cache_metrics.recompute('variants'):
+            variants = build_group(product_id)
+        cache.set(group_key(product_id), variants, GROUP_TTL)
+    return variants
+
+
+def invalidate(*product_ids):
+    cache.delete_many([group_key(product_id) for product_id in product_ids])
+
+
+def invalidate_related(**filters):
+    """Сбрасывает группы товаров, у которых есть варианты с указанным цветом / брендом / категорией"""
+    product_ids = (
+        ProductVariant.objects.filter(**filters)
+        .order_by()
+        .values_list('product_id', flat=True)
+        .distinct()
+    )
+    invalidate(*product_ids)
+
+
+def signature(objects):
+    """Отпечаток набора объектов по модели, id и updated_at"""
+    payload = ';'.join(
+        f'{obj._meta.label_lower}:{obj.pk}:{obj.updated_at.isoformat()}' for obj in objects
+    )
+    return hashlib.md5(payload.encode()).hexdigest()
@@ -1,33 +1,40 @@
+from decimal import Decimal, InvalidOperation
 from django.shortcuts import get_object_or_404, render, redirect
 from django.core.paginator import Paginator
 from django.contrib.auth import authenticate, login, logout
-from django.http import HttpResponseForbidden, JsonResponse
+from django.http import Http404, HttpResponseForbidden, JsonResponse
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.models import User
-from django.db.models import Q, Count, Avg
+from django.db.models import Q, Count, Avg, Max
 from django.contrib import messages
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 from .models import (
     Category, Product, Brand, ProductVariant, Review, Basket,
-    Order, BasketOrder, ProductOrder, UserProfile, Address
+    Order, BasketOrder, ProductOrder, UserProfile, Address, ProductCard, ProductRanking
 )
 from .forms import ProductForm, ReviewForm, OrderForm, ProductVariantForm
+from . import (
+    search, typeahead, facets, homepage, variants, catalog_cache, conditional, fragments,
+    cache_metrics, sparse, bulk, multiget, renderers, signals, fastpath, rankings
+)
+from .pagination import KeysetPaginator, KEYSET_ORDERINGS
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from rest_framework import viewsets, status, filters
 from django_filters.rest_framework import DjangoFilterBackend
 from .serializers import (
     ProductSerializer, CategorySerializer, BrandSerializer,
-    ProductVariantSerializer, ReviewSerializer
+    ProductVariantSerializer, ReviewSerializer, ProductDetailSerializer
 )
 from simple_history.models import HistoricalRecords
 from import_export import resources
 from import_export.admin import ImportExportModelAdmin
 from import_export.fields import Field
 from django_filters import FilterSet, CharFilter, NumberFilter
-from rest_framework.pagination import PageNumberPagination
 
 
 # Дополнительные фильтры для Product
@@ -41,18 +48,31 @@ class ProductFilter(FilterSet):
         model = Product
         fields = ['category', 'brand', 'min_price', 'max_price']
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(fastpath.FastListMixin, sparse.SparseFieldsViewMixin, conditional.ConditionalGetMixin,
+                     fragments.FragmentListMixin, bulk.BulkWriteMixin, multiget.MultiGetMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    renderer_classes = renderers.FAST_RENDERERS
+    parser_classes = renderers.FAST_PARSERS
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['category', 'brand', 'default_price']
     search_fields = ['name', 'description']
     ordering_fields = ['default_price', 'created_at', 'avg_rating']
-    pagination_class = PageNumberPagination
     filter_class = ProductFilter
+    # Умолчания курсорной пагинации (действия переопределяют их в @action)
+    cursor_ordering = None
+    cursor_page_size = None
+    cursor_orderings = None
+
+    def get_serializer_class(self):
+        if self.action == 'full':
+            return ProductDetailSerializer
+        return super().get_serializer_class()
 
     def get_queryset(self):
         queryset = super().get_queryset()
+        if self.action == 'full':
+            queryset = ProductDetailSerializer.setup_eager_loading(queryset)
         
         user = self.request.user
         if user.is_authenticated:
@@ -62,15 +82,34 @@ class ProductViewSet(viewsets.ModelViewSet):
         
         return queryset
 
-    @action(detail=False, methods=['get'])
-    def discounted(self, request):
-        products = Product.objects.filter(
-            Q(default_price__lt=1000) & 
-            ~Q(category__name='Премиум') |
-            Q(brand__name__icontains='sale')
+    def bulk_saved(self, objects, created, previous):
+        signals.products_bulk_saved(objects, created, previous)
+
+    # Товар с вариантами, цветами и сводкой отзывов за один запрос клиента
+    @action(detail=True, methods=['get'])
+    def full(self, request, pk=None):
+        product = self.get_object()
+        validators = conditional.get_validators(
+            [product, *self.get_related_objects(product), *ProductDetailSerializer.related_objects(product)],
+            extra=(request.get_full_path(), self._render_format(request)),
         )
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        return conditional.respond(request, validators, lambda: Response(self.get_serializer(product).data))
+
+    @action(detail=False, methods=['get'], cursor_ordering='default_price')
+    def discounted(self, request):
+        # Условия по справочникам вычисляются заранее, а каждая ветка OR - отдельный
+        # подзапрос: так обе идут поиском по индексам default_price и brand_id,
+        # тогда как OR в одном WHERE дает перебор всей таблицы по индексу сортировки
+        premium_categories = list(Category.objects.filter(name='Премиум').values_list('pk', flat=True))
+        sale_brands = list(Brand.objects.filter(name__icontains='sale').values_list('pk', flat=True))
+        cheap = Product.objects.filter(default_price__lt=1000).exclude(category__in=premium_categories)
+        on_sale = Product.objects.filter(brand__in=sale_brands)
+        products = self.shape_queryset(Product.objects.filter(
+            pk__in=cheap.values('pk').union(on_sale.values('pk'))
+        ))
+        page = self.paginate_queryset(products)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['post'])
     def add_to_favorites(self, request, pk=None):
@@ -78,35 +117,50 @@ class ProductViewSet(viewsets.ModelViewSet):
         request.user.profile.favorites.add(product)
         return Response({'status': 'added to favorites'})
 
-    @action(detail=False, methods=['get'])
+    # Байесовский рейтинг из таблицы ProductRanking (shop/rankings.py): первая
+    # страница - десять лучших, дальше по курсору; ?category= - по категории
+    @action(detail=False, methods=['get'], cursor_ordering='-score', cursor_page_size=10,
+            cursor_orderings=rankings.ORDERINGS)
     def top_rated(self, request):
-        # Еще один комплексный запрос с Q, AND и OR
-        products = Product.objects.filter(
-            Q(avg_rating__gte=4) & 
-            (Q(review_count__gte=10) | Q(featured=True))
-        ).order_by('-avg_rating')[:10]
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
-
-class CategoryViewSet(viewsets.ModelViewSet):
+        queryset = ProductRanking.objects.all()
+        category = request.query_params.get('category')
+        if category is not None:
+            try:
+                queryset = queryset.filter(category_id=int(category))
+            except ValueError:
+                raise ValidationError({'category': ['Ожидается id категории.']})
+        page = self.paginate_queryset(queryset)
+        products = self.shape_queryset(Product.objects.all()).in_bulk([ranking.pk for ranking in page])
+        serializer = self.get_serializer(
+            [products[ranking.pk] for ranking in page if ranking.pk in products], many=True
+        )
+        return self.get_paginated_response(serializer.data)
+
+class CategoryViewSet(conditional.ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     filter_backends = [filters.SearchFilter]
     search_fields = ['name']
 
-class BrandViewSet(viewsets.ModelViewSet):
+class BrandViewSet(conditional.ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Brand.objects.all()
     serializer_class = BrandSerializer
     filter_backends = [filters.SearchFilter]
     search_fields = ['name']
 
-class ProductVariantViewSet(viewsets.ModelViewSet):
+class ProductVariantViewSet(fastpath.FastListMixin, sparse.SparseFieldsViewMixin, conditional.ConditionalGetMixin,
+                            fragments.FragmentListMixin, bulk.BulkWriteMixin, multiget.MultiGetMixin, viewsets.ModelViewSet):
     queryset = ProductVariant.objects.all()
     serializer_class = ProductVariantSerializer
+    renderer_classes = renderers.FAST_RENDERERS
+    parser_classes = renderers.FAST_PARSERS
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['product', 'color', 'price']
 
-class ReviewViewSet(viewsets.ModelViewSet):
+    def bulk_saved(self, objects, created, previous):
+        signals.variants_bulk_saved(objects, previous)
+
+class ReviewViewSet(sparse.SparseFieldsViewMixin, conditional.ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
     filter_backends = [DjangoFilterBackend]
@@ -126,147 +180,215 @@ class ReviewViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 # Standard Views
+PRODUCTS_PER_PAGE = 20
+
+# Последние отзывы на странице товара (все - в /api/reviews/?product=)
+PRODUCT_REVIEWS_SHOWN = 10
+
+def _parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _parse_price(value):
+    try:
+        price = Decimal(value)
+    except (TypeError, ValueError, InvalidOperation):
+        return None
+    # NaN и Infinity - тоже Decimal, но сравнивать с ними цену в запросе нельзя
+    return price if price.is_finite() else None
+
+# Зависимости страниц каталога в shop/catalog_cache.py
+CATALOG_DEPENDENCIES = [('product', None), ('category', None), ('brand', None)]
+
+def _sort_by(request):
+    return request.GET.get("sort", "relevance" if request.GET.get("q") else "default_price")
+
 def product_list(request):
-    products_list = Product.objects.all()
+    favorites_only = request.user.is_authenticated and request.GET.get("favorites")
+    # Кешируются только общие для всех keyset-страницы (без избранного и номера страницы)
+    if favorites_only or request.GET.get('page') or _sort_by(request) not in KEYSET_ORDERINGS:
+        context = _product_list_context(request, favorites_only)
+    else:
+        context = catalog_cache.cached(
+            'product_list',
+            CATALOG_DEPENDENCIES,
+            lambda: _product_list_context(request, False),
+            params=sorted(request.GET.lists()),
+        )
+    return render(request, "shop/product_list.html", context)
+
+def _product_list_context(request, favorites_only):
+    # Список строится только по денормализованным карточкам, без JOIN
+    products_list = ProductCard.objects.all()
     
     # Фильтрация
-    category_id = request.GET.get("category")
-    brand_id = request.GET.get("brand")
-    min_price = request.GET.get("min_price")
-    max_price = request.GET.get("max_price")
+    category_id = _parse_int(request.GET.get("category"))
+    brand_id = _parse_int(request.GET.get("brand"))
+    min_price = _parse_price(request.GET.get("min_price"))
+    max_price = _parse_price(request.GET.get("max_price"))
     
-    if category_id:
-        products_list = products_list.filter(category_id=category_id)
-    if brand_id:
-        products_list = products_list.filter(brand_id=brand_id)
-    if min_price:
+    if min_price is not None:
         products_list = products_list.filter(default_price__gte=min_price)
-    if max_price:
+    if max_price is not None:
         products_list = products_list.filter(default_price__lte=max_price)
 
     search_query = request.GET.get("q")
     if search_query:
-        products_list = products_list.filter(
-            Q(name__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(brand__name__icontains=search_query)
-        ).distinct()
-
-    if request.user.is_authenticated:
-        favorites_only = request.GET.get("favorites")
-        if favorites_only:
-            products_list = products_list.filter(favorited_by=request.user.profile)
+        products_list = search.filter_products(products_list, search_query)
+
+    if favorites_only:
+        products_list = products_list.filter(product__favorited_by=request.user.profile)
+
+    # Счетчики фасетов считаются до фильтров по категории и бренду
+    facet_filters = {
+        'q': (search_query or '').strip().lower(),
+        'min_price': min_price,
+        'max_price': max_price,
+        'version': catalog_cache.get_versions(CATALOG_DEPENDENCIES),
+    }
+    if favorites_only:
+        facet_counts = facets.compute_facets(products_list, category_id, brand_id)
+    else:
+        facet_counts = facets.get_facets(products_list, facet_filters, category_id, brand_id)
+
+    if category_id:
+        products_list = products_list.filter(category_id=category_id)
+    if brand_id:
+        products_list = products_list.filter(brand_id=brand_id)
     
     # Сортировка
-    sort_by = request.GET.get("sort", "default_price")
-    if sort_by in ["default_price", "-default_price", "created_at", "-created_at", "avg_rating", "-avg_rating"]:
+    sort_by = _sort_by(request)
+    if sort_by == "relevance" and search_query:
+        products_list = products_list.order_by("-search_rank", "pk")
+    elif sort_by in ["default_price", "-default_price", "created_at", "-created_at", "avg_rating", "-avg_rating"]:
         products_list = products_list.order_by(sort_by)
     
-    # Пагинация
-    paginator = Paginator(products_list, 20)
+    # Пагинация: по умолчанию keyset по курсору, номер страницы - запасной вариант
     page_number = request.GET.get('page')
-    products = paginator.get_page(page_number)
-
-    categories = Category.objects.all()
-    brands = Brand.objects.all()
+    is_keyset = not page_number and sort_by in KEYSET_ORDERINGS
+    if is_keyset:
+        paginator = KeysetPaginator(products_list, sort_by, PRODUCTS_PER_PAGE)
+        products = paginator.get_page(request.GET.get('cursor'))
+    else:
+        paginator = Paginator(products_list, PRODUCTS_PER_PAGE)
+        products = paginator.get_page(page_number)
+
+    querystring = request.GET.copy()
+    querystring.pop('page', None)
+    querystring.pop('cursor', None)
+
+    # Ссылки на ценовые диапазоны с сохранением остальных фильтров
+    price_facets = []
+    for bucket in facet_counts['prices']:
+        params = querystring.copy()
+        params.pop('min_price', None)
+        params.pop('max_price', None)
+        if bucket['min'] is not None:
+            params['min_price'] = bucket['min']
+        if bucket['max'] is not None:
+            params['max_price'] = bucket['max']
+        price_facets.append(dict(bucket, querystring=params.urlencode()))
 
-    return render(request, "shop/product_list.html", {
+    return {
         "products": products,
-        "categories": categories,
-        "brands": brands,
-        "selected_category": category_id,
-        "selected_brand": brand_id,
+        "categories": facet_counts['categories'],
+        "brands": facet_counts['brands'],
+        "price_facets": price_facets,
+        "total_count": facet_counts['total'],
+        "selected_category": request.GET.get("category"),
+        "selected_brand": request.GET.get("brand"),
         "sort_by": sort_by,
-    })
+        "search_query": search_query,
+        "is_keyset": is_keyset,
+        "querystring": querystring.urlencode(),
+    }
 
 
 def brand_list(request):
-    brands = Brand.objects.all()
-    return render(request, 'shop/brand_list.html', {'brands': brands})
+    brands = catalog_cache.cached('brand_list', [('brand', None)], lambda: list(Brand.objects.all()))
+    validators = conditional.get_validators(brands, extra=(conditional.viewer(request),))
+    return conditional.respond(request, validators, lambda: render(request, 'shop/brand_list.html', {'brands': brands}))
 
 from django.shortcuts import render
 from django.db.models import Count, Avg, Q
 from .models import Category, Product, Brand, Review
 
 def index(request):
-    total_categories = Category.objects.count()
-    total_products = Product.objects.count()
-    total_brands = Brand.objects.count()
-    
-    categories = Category.objects.annotate(
-        product_count=Count('product')
-    ).order_by('-product_count')[:12]
-    
-    popular_products = Product.objects.filter(
-        avg_rating__gt=3
-    ).order_by('-avg_rating')[:8]
-    
-    top_brands = Brand.objects.annotate(
-        product_count=Count('product')
-    ).filter(
-        product_count__gt=0
-    ).order_by('-product_count')[:6]
-    
-    average_rating = Product.objects.aggregate(
-        avg_rating=Avg('avg_rating')
-    )['avg_rating'] or 0
-    
-    products_without_reviews = Product.objects.annotate(
-        review_count=Count('review')
-    ).filter(
-        review_count=0
-    ).order_by('?')[:4]
-    
-    featured_categories = Category.objects.distinct()[:3]
-    
-    try:
-        featured_product = Product.objects.get(
-            Q(name__icontains='новинка') | Q(name__icontains='хит'),
-            avg_rating__gte=4
-        )
-    except Product.DoesNotExist:
-        featured_product = None
-    
-    return render(request, 'shop/index.html', {
-        'total_categories': total_categories,
-        'total_products': total_products,
-        'total_brands': total_brands,
-        'categories': categories,
-        'popular_products': popular_products,
-        'top_brands': top_brands,
-        'average_rating': round(average_rating, 1),
-        'products_without_reviews': products_without_reviews,
-        'featured_categories': featured_categories,
-        'featured_product': featured_product,
-    })
+    # Все агрегаты берутся из снимка в кеше (см. shop/homepage.py)
+    snapshot = homepage.get_snapshot()
+    return render(request, 'shop/index.html', homepage.get_context(snapshot))
  
-def product_detail(request, slug):
-    product_variant = get_object_or_404(ProductVariant, slug=f"{slug}-{1}")
-    all_product_variants = ProductVariant.objects.filter(slug__startswith=f"{slug}-").select_related('color')
-
-    return render(request, 'shop/product_detail.html', {
+def _render_variant(request, product_id, variant_slug):
+    all_product_variants = variants.get_group(product_id)
+    product_variant = next((v for v in all_product_variants if v.slug == variant_slug), None)
+    if product_variant is None:
+        # Основного варианта (slug-1) может не быть - показываем первый из группы
+        if not all_product_variants:
+            raise Http404("Вариант товара не найден")
+        product_variant = all_product_variants[0]
+
+    product = product_variant.product
+    # Версия блока отзывов - количество (поле товара) и max(updated_at) поиском по
+    # индексу; сами последние отзывы читаются только при промахе {% cache %}
+    reviews_updated = product.review_set.aggregate(last=Max('updated_at'))['last']
+    reviews_version = f"{product.review_count}:{reviews_updated.isoformat() if reviews_updated else ''}"
+    reviews = product.review_set.order_by('-created_at', '-pk')[:PRODUCT_REVIEWS_SHOWN]
+    picker = [related for variant in all_product_variants for related in (variant, variant.color)]
+    validators = conditional.get_validators(
+        [product, *picker] +
+        [related for variant in all_product_variants for related in (variant.brand, variant.category)],
+        extra=(product_variant.pk, reviews_version, conditional.viewer(request)),
+    )
+    return conditional.respond(request, validators, lambda: render(request, 'shop/product_detail.html', {
         'product_variant': product_variant,
         'all_product_variants': all_product_variants,
-    })
+        'reviews': reviews,
+        # Версии для ключей {% cache %} блоков отзывов и выбора варианта
+        'reviews_version': reviews_version,
+        'picker_version': variants.signature(picker),
+        'can_moderate': request.user.is_authenticated and request.user.profile.role == 'admin',
+    }))
 
-def category_products(request, slug):
-    category = get_object_or_404(Category, slug=slug)
-    products = Product.objects.filter(category=category)
 
-    return render(request, 'shop/category_products.html', {
+def product_detail(request, slug):
+    product_id = get_object_or_404(Product.objects.values_list('pk', flat=True), slug=slug)
+    return _render_variant(request, product_id, f"{slug}-1")
+
+def category_products(request, slug):
+    category = catalog_cache.cached(
+        'category_by_slug', [('category', None)],
+        lambda: Category.objects.filter(slug=slug).first(),
+        params={'slug': slug},
+    )
+    if category is None:
+        raise Http404("Категория не найдена")
+
+    cursor = request.GET.get('cursor')
+    paginator = KeysetPaginator(
+        ProductCard.objects.filter(category=category), '-created_at', PRODUCTS_PER_PAGE
+    )
+    stats = catalog_cache.cached(
+        'category_stats', [('category', category.pk)],
+        lambda: conditional.queryset_stats(Product.objects.filter(category=category)),
+    )
+    validators = conditional.get_validators(
+        [category], stats, extra=(cursor, conditional.viewer(request))
+    )
+    return conditional.respond(request, validators, lambda: render(request, 'shop/category_products.html', {
         'category': category,
-        'products': products
-    })
+        'products': catalog_cache.cached(
+            'category_products', [('category', category.pk)],
+            lambda: paginator.get_page(cursor),
+            params={'cursor': cursor},
+        ),
+    }))
     
     
 def product_variant_detail(request, slug):
-    product_variant = get_object_or_404(ProductVariant, slug=slug)
-    all_product_variants = ProductVariant.objects.filter(slug__startswith=slug[0:-1])
-
-    return render(request, 'shop/product_detail.html', {
-        'product_variant': product_variant,
-        'all_product_variants': all_product_variants,
-    })
+    product_id = get_object_or_404(ProductVariant.objects.values_list('product_id', flat=True), slug=slug)
+    return _render_variant(request, product_id, slug)
     
 
 
@@ -353,9 +475,21 @@ def remove_from_cart(request, item_id):
     return redirect("cart_view")
 
 
+def _brand_with_products(brand_id):
+    brand = Brand.objects.filter(id=brand_id).first()
+    return brand, list(brand.product_set.all()) if brand else []
+
 def brand_detail(request, brand_id):
-    brand = get_object_or_404(Brand, id=brand_id)
-    return render(request, 'shop/brand_detail.html', {'brand': brand})
+    brand, products = catalog_cache.cached(
+        'brand_detail', [('brand', brand_id)], lambda: _brand_with_products(brand_id)
+    )
+    if brand is None:
+        raise Http404("Бренд не найден")
+    validators = conditional.get_validators([brand, *products], extra=(conditional.viewer(request),))
+    return conditional.respond(request, validators, lambda: render(request, 'shop/brand_detail.html', {
+        'brand': brand,
+        'products': products,
+    }))
 
 
 
@@ -447,33 +581,14 @@ from .models import Category, Brand, Product
 
 def search_view(request):
     query = request.GET.get('q', '').strip()
-    results = {
-        'categories': [],
-        'brands': [],
-        'products': []
-    }
+    # Подсказки отдаются из индекса в памяти, без запросов к БД
+    return JsonResponse(typeahead.lookup(query, limit=5))
+
 
-    if query:
-        categories = Category.objects.filter(
-            Q(name__icontains=query)
-        ).values('id', 'name', 'slug', 'photo')[:5]
-        results['categories'] = list(categories)
-
-        brands = Brand.objects.filter(
-            Q(name__icontains=query)
-        ).values('id', 'name', 'photo')[:5]
-        results['brands'] = list(brands)
-
-        products = Product.objects.filter(
-            Q(name__icontains=query)
-        ).values('id', 'name', 'slug', 'photo', 'default_price')[:5]
-        # Добавляем '-1' к slug
-        product_list = list(products)
-        for product in product_list:
-            product['slug'] = f"{product['slug']}-1"
-        results['products'] = product_list
-
-    return JsonResponse(results)
+@staff_member_required
+def cache_metrics_view(request):
+    # Сумма счетчиков всех процессов по пространствам имен кеша
+    return JsonResponse({'namespaces': cache_metrics.snapshot()})
 
 
 @login_required